@@ -0,0 +1,38 @@
+# benchmark_normalize.py
+import time
+import numpy as np
+import pandas as pd
+from src.utils import normalize_text, normalize_series
+
+ROW_COUNT = 1_000_000
+
+# 実データに近い、繰り返しの多い列を作る (メーカー数十種類・型式数千種類)
+MAKERS = ["トヨタ", "ﾆｯｻﾝ", "ホンダ ", "ｽﾊﾞﾙ", "マツダ", "ダイハツ", "スズキ", "三菱", "ﾚｸｻｽ", "いすゞ"]
+MODEL_CODES = [f"ＺＶＷ{n}" if n % 3 == 0 else f"zvw{n} " for n in range(5000)]
+
+
+def _measure(label: str, func, series: pd.Series) -> pd.Series:
+    started = time.perf_counter()
+    result = func(series)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<32}: {elapsed:8.3f} 秒")
+    return result
+
+
+def run_benchmark():
+    rng = np.random.default_rng(0)
+    columns = {
+        "maker": pd.Series(rng.choice(MAKERS, ROW_COUNT), dtype=object),
+        "model_code": pd.Series(rng.choice(MODEL_CODES, ROW_COUNT), dtype=object),
+    }
+    print(f"--- {ROW_COUNT:,}行の列で normalize_text を比較します ---")
+    for name, series in columns.items():
+        print(f"列: {name} (ユニーク値 {series.nunique():,}種類)")
+        expected = _measure("series.apply(normalize_text)", lambda s: s.apply(normalize_text), series)
+        actual = _measure("normalize_series(series)", normalize_series, series)
+        assert expected.equals(actual), "結果が一致しません"
+    print("✅ すべての列で結果が一致しました。")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -1,52 +1,132 @@
 # enrich_database.py
+import json
+import time
+import argparse
 import pandas as pd
-from sqlalchemy import or_
+from datetime import datetime
+from sqlalchemy import and_, or_
+from src import config
 from src.db.database import SessionLocal, engine
 from src.db.models import VehicleMaster, SQLModel
-from src.data_processing.scraper import enrich_vehicle_data
+from src.data_processing.scraper import enrich_vehicle_data, SPEC_COLUMNS
+from src.data_processing.llm_cache import print_cache_stats, CACHE_STATS
 
+# 途中経過 (処理済みの最大ID) を保存するファイル
+CHECKPOINT_PATH = config.DATA_DIR / "enrich_checkpoint.json"
+# 1回の書き込み (コミット) で処理する車種数
+DEFAULT_CHUNK_SIZE = 50
 
-def run_full_enrichment():
+ENRICHED_COLUMNS = ['engine_model', 'drive_type', 'body_type', 'total_weight_kg', 'engine_weight_kg']
+
+
+def load_checkpoint() -> int:
+    """前回中断した位置 (処理済みの最大ID) を返す。チェックポイントが無ければ0"""
+    if not CHECKPOINT_PATH.exists():
+        return 0
+    with open(CHECKPOINT_PATH, encoding='utf-8') as f:
+        return json.load(f).get("last_id", 0)
+
+
+def save_checkpoint(last_id: int):
+    with open(CHECKPOINT_PATH, 'w', encoding='utf-8') as f:
+        json.dump({"last_id": last_id, "updated_at": datetime.utcnow().isoformat()}, f)
+
+
+def clear_checkpoint():
+    if CHECKPOINT_PATH.exists():
+        CHECKPOINT_PATH.unlink()
+
+
+def _to_db_value(value):
+    # DataFrame由来の NaN は DB には NULL として書き込む
+    return None if pd.isna(value) else value
+
+
+def run_full_enrichment(chunk_size: int = DEFAULT_CHUNK_SIZE, max_seconds: float = None, max_calls: int = None, restart: bool = False):
+    """
+    スペック情報が欠けている車種を、ID順にchunk_size件ずつAIで拡充してDBに書き戻す
+    チャンクごとにコミットとチェックポイント保存を行うため、中断しても次回は続きから再開する
+    max_seconds / max_calls を指定すると、その予算を使い切った時点 (チャンクの区切り) で停止する
+    """
     print("データベース全体のデータ拡充処理を開始します...")
     SQLModel.metadata.create_all(engine)
     session = SessionLocal()
 
+    if restart:
+        clear_checkpoint()
+    last_id = load_checkpoint()
+    if last_id:
+        print(f"--- 前回の続き (ID > {last_id}) から再開します ---")
+
+    started_at = time.monotonic()
+    calls_at_start = CACHE_STATS["network_calls"]
+
     try:
-        # --- 1. DBから、スペック情報が欠けている車種をすべて取得 ---
+        # --- 1. DBから、スペック情報が欠けている車種を対象とする ---
+        # enrich_vehicle_data が問い合わせる行 (scraper.needs_specs) と同じ条件にする
+        # (条件がずれると、拡充されない行がいつまでも残って完了しなくなる)
         query = session.query(VehicleMaster).filter(
-            or_(
-                VehicleMaster.engine_model == None,
-                VehicleMaster.total_weight_kg == None,
-                VehicleMaster.drive_type == None,
-                VehicleMaster.body_type == None
+            and_(
+                VehicleMaster.model_code != None,
+                VehicleMaster.model_code != '',
+                or_(*(getattr(VehicleMaster, col) == None for col in SPEC_COLUMNS)),
             )
         )
-        
-        incomplete_vehicles_df = pd.read_sql(query.statement, engine)
-        
-        if incomplete_vehicles_df.empty:
+
+        # 完了判定は、チェックポイントの位置ではなく「スペック情報が欠けている車種」全体で行う
+        total_missing = query.count()
+        if total_missing == 0:
+            clear_checkpoint()
             print("✅ すべての車種にスペック情報が登録済みです。処理の必要はありません。")
             return
 
-        print(f"--- スペック情報が不足している {len(incomplete_vehicles_df)} 件の車種を対象に処理を実行します ---")
+        remaining = query.filter(VehicleMaster.id > last_id).count()
+        if remaining == 0:
+            # 前回の続きに対象は無いが、それより前に取得できなかった車種が残っている → 最初から再試行する
+            print(f"--- チェックポイント (ID {last_id}) より前に未取得の車種が {total_missing} 件残っているため、最初から再試行します ---")
+            clear_checkpoint()
+            last_id = 0
+            remaining = total_missing
 
-        # --- 2. AIでデータ拡充を実行 ---
-        enriched_df = enrich_vehicle_data(incomplete_vehicles_df)
+        print(f"--- スペック情報が不足している {remaining} 件の車種を対象に処理を実行します ---")
 
-        # --- 3. データベースを更新 ---
-        print("--- データベースを更新中... ---")
         update_count = 0
-        for record in enriched_df.to_dict('records'):
-            vehicle = session.query(VehicleMaster).filter_by(id=record['id']).first()
-            if vehicle:
-                vehicle.engine_model = record.get('engine_model')
-                vehicle.drive_type = record.get('drive_type')
-                vehicle.body_type = record.get('body_type')
-                vehicle.total_weight_kg = record.get('total_weight_kg')
-                vehicle.engine_weight_kg = record.get('engine_weight_kg')
-                update_count += 1
-        
-        session.commit()
+        while True:
+            chunk_query = query.filter(VehicleMaster.id > last_id).order_by(VehicleMaster.id).limit(chunk_size)
+            chunk_df = pd.read_sql(chunk_query.statement, engine)
+            if chunk_df.empty:
+                # 最後まで処理できたらチェックポイントを消し、次回は最初から (未取得分を) 再試行する
+                clear_checkpoint()
+                break
+
+            # --- 2. AIでデータ拡充を実行 ---
+            enriched_df = enrich_vehicle_data(chunk_df)
+
+            # --- 3. チャンク単位でデータベースを一括更新 ---
+            now = datetime.utcnow()
+            mappings = [
+                {'id': int(record['id']), 'updated_at': now, **{col: _to_db_value(record.get(col)) for col in ENRICHED_COLUMNS}}
+                for record in enriched_df.to_dict('records')
+            ]
+            session.bulk_update_mappings(VehicleMaster, mappings)
+            session.commit()
+
+            last_id = int(chunk_df['id'].max())
+            save_checkpoint(last_id)
+            update_count += len(mappings)
+            print(f"--- {update_count}/{remaining}件を書き込みました (ID {last_id} まで) ---")
+
+            # --- 4. 予算の確認 ---
+            elapsed = time.monotonic() - started_at
+            calls = CACHE_STATS["network_calls"] - calls_at_start
+            if max_seconds is not None and elapsed >= max_seconds:
+                print(f"⏸ 時間の上限 ({max_seconds:.0f}秒) に達したため中断します。次回はID {last_id} の続きから再開します。")
+                break
+            if max_calls is not None and calls >= max_calls:
+                print(f"⏸ API呼び出し回数の上限 ({max_calls}回) に達したため中断します。次回はID {last_id} の続きから再開します。")
+                break
+
+        print_cache_stats()
         print(f"✅ {update_count}件の車種情報を更新しました。")
 
     finally:
@@ -54,4 +134,16 @@ def run_full_enrichment():
 
 
 if __name__ == "__main__":
-    run_full_enrichment()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="AIで車種マスターのスペック情報を拡充する")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1回のコミットで処理する車種数")
+    parser.add_argument("--max-minutes", type=float, default=None, help="この時間 (分) を超えたら中断する")
+    parser.add_argument("--max-calls", type=int, default=None, help="API呼び出しがこの回数を超えたら中断する")
+    parser.add_argument("--restart", action="store_true", help="チェックポイントを破棄して最初から処理する")
+    args = parser.parse_args()
+
+    run_full_enrichment(
+        chunk_size=args.chunk_size,
+        max_seconds=args.max_minutes * 60 if args.max_minutes is not None else None,
+        max_calls=args.max_calls,
+        restart=args.restart,
+    )
@@ -1,45 +1,179 @@
+import csv
+import gzip
+import argparse
 import pandas as pd
+from openpyxl import Workbook
 from sqlalchemy import text
 from src.db.database import engine
 from src.config import OUTPUT_DIR # configから出力先フォルダを取得
 
 # ★★★ 出力するExcelファイルの名前 ★★★
 OUTPUT_EXCEL_PATH = OUTPUT_DIR / "database_export.xlsx"
+# CSV (gzip) / Parquet はテーブルごとに1ファイルずつ、このフォルダに出力する
+OUTPUT_EXPORT_DIR = OUTPUT_DIR / "database_export"
 
-def export_database_to_excel():
+EXPORT_FORMATS = ("xlsx", "csv.gz", "parquet")
+# 1回に読み込んで書き出す行数 (メモリ使用量はこの行数で決まり、テーブルの大きさには依存しない)
+DEFAULT_CHUNK_SIZE = 5000
+# Excelの1シートに入る最大行数 (見出し行を除く)。超えた分は "テーブル名_2" のような続きのシートに書く
+EXCEL_MAX_ROWS = 1_048_575
+
+
+def get_table_names(connection) -> list:
+    sql_query = text("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
+    return [row[0] for row in connection.execute(sql_query)]
+
+
+def get_column_types(connection, table_name: str) -> list:
+    """テーブルの (列名, 宣言された型) の一覧"""
+    return [(row[1], (row[2] or "").upper()) for row in connection.execute(text(f'PRAGMA table_info("{table_name}")'))]
+
+
+def iter_table_chunks(connection, table_name: str, chunk_size: int):
+    """テーブルの行をサーバーサイドカーソルで chunk_size 行ずつ (タプルのリストとして) 返す"""
+    result = connection.execution_options(stream_results=True).execute(text(f'SELECT * FROM "{table_name}"'))
+    yield from result.partitions(chunk_size)
+
+
+def _print_progress(table_name: str, done: int, total: int):
+    percent = done / total * 100 if total else 100.0
+    print(f"    -> {table_name}: {done:,}/{total:,}件 ({percent:5.1f}%)")
+
+
+def _export_xlsx(connection, table_names: list, chunk_size: int):
+    # 書き込み専用モード: 行は追加した順にファイルへ流れ、ブック全体をメモリに保持しない
+    workbook = Workbook(write_only=True)
+    for table_name in table_names:
+        columns = [name for name, _ in get_column_types(connection, table_name)]
+        total = connection.execute(text(f'SELECT COUNT(*) FROM "{table_name}"')).scalar()
+        print(f"  - テーブル '{table_name}' ({total:,}件) を書き込み中...")
+
+        sheet_no, sheet_rows, done = 1, 0, 0
+        sheet = workbook.create_sheet(title=table_name[:31]) # シート名は31文字まで
+        sheet.append(columns)
+        for rows in iter_table_chunks(connection, table_name, chunk_size):
+            for row in rows:
+                if sheet_rows >= EXCEL_MAX_ROWS:
+                    sheet_no += 1
+                    sheet_rows = 0
+                    suffix = f"_{sheet_no}"
+                    sheet = workbook.create_sheet(title=table_name[:31 - len(suffix)] + suffix)
+                    sheet.append(columns)
+                sheet.append(list(row))
+                sheet_rows += 1
+            done += len(rows)
+            _print_progress(table_name, done, total)
+    workbook.save(OUTPUT_EXCEL_PATH)
+    return OUTPUT_EXCEL_PATH
+
+
+def _export_csv_gz(connection, table_names: list, chunk_size: int):
+    OUTPUT_EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    for table_name in table_names:
+        columns = [name for name, _ in get_column_types(connection, table_name)]
+        total = connection.execute(text(f'SELECT COUNT(*) FROM "{table_name}"')).scalar()
+        print(f"  - テーブル '{table_name}' ({total:,}件) を書き込み中...")
+
+        done = 0
+        with gzip.open(OUTPUT_EXPORT_DIR / f"{table_name}.csv.gz", 'wt', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for rows in iter_table_chunks(connection, table_name, chunk_size):
+                writer.writerows(rows)
+                done += len(rows)
+                _print_progress(table_name, done, total)
+    return OUTPUT_EXPORT_DIR
+
+
+def _arrow_type(pa, declared_type: str):
+    # SQLiteの宣言型からArrowの型を決める (日付・日時は文字列として保存されているので文字列のまま)
+    if "INT" in declared_type:
+        return pa.int64()
+    if any(t in declared_type for t in ("REAL", "FLOA", "DOUB", "NUMERIC")):
+        return pa.float64()
+    if "BOOL" in declared_type:
+        return pa.bool_()
+    return pa.string()
+
+
+def _to_arrow_array(pa, values, arrow_type):
+    try:
+        return pa.array(values, type=arrow_type, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        # SQLiteは宣言型と異なる値 (数値列の文字列など) も保存できるため、
+        # 文字列列は文字列化し、数値列は数値にできない値を欠損として扱う
+        if pa.types.is_string(arrow_type):
+            return pa.array([None if v is None else str(v) for v in values], type=arrow_type)
+        numeric = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+        if pa.types.is_integer(arrow_type):
+            numeric = numeric.round().astype("Int64")
+        elif pa.types.is_boolean(arrow_type):
+            numeric = numeric.astype("boolean")
+        return pa.array(numeric, type=arrow_type, from_pandas=True)
+
+
+def _export_parquet(connection, table_names: list, chunk_size: int):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet形式での出力には pyarrow が必要です。")
+
+    OUTPUT_EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    for table_name in table_names:
+        column_types = get_column_types(connection, table_name)
+        # チャンクごとに型推論が揺れないよう、スキーマはテーブル定義から決めておく
+        schema = pa.schema([(name, _arrow_type(pa, declared)) for name, declared in column_types])
+        total = connection.execute(text(f'SELECT COUNT(*) FROM "{table_name}"')).scalar()
+        print(f"  - テーブル '{table_name}' ({total:,}件) を書き込み中...")
+
+        done = 0
+        with pq.ParquetWriter(OUTPUT_EXPORT_DIR / f"{table_name}.parquet", schema) as writer:
+            for rows in iter_table_chunks(connection, table_name, chunk_size):
+                columns = list(zip(*rows))
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    [_to_arrow_array(pa, values, field.type) for values, field in zip(columns, schema)],
+                    schema=schema,
+                ))
+                done += len(rows)
+                _print_progress(table_name, done, total)
+    return OUTPUT_EXPORT_DIR
+
+
+EXPORTERS = {"xlsx": _export_xlsx, "csv.gz": _export_csv_gz, "parquet": _export_parquet}
+
+
+def export_database_to_excel(export_format: str = "xlsx", chunk_size: int = DEFAULT_CHUNK_SIZE, tables: list = None):
     """
-    データベース内の全テーブルを単一のExcelファイルに出力する
+    データベース内の全テーブルを出力する (既定は単一のExcelファイル)
+    各テーブルを chunk_size 行ずつ読んでは書き出すため、テーブルが大きくてもメモリ使用量は一定
+    export_format に "csv.gz" / "parquet" を指定すると、テーブルごとのファイルに出力する
     """
     print("データベースのエクスポート処理を開始します...")
 
     try:
-        # データベース内の全テーブル名を取得
         with engine.connect() as connection:
-            sql_query = text("SELECT name FROM sqlite_master WHERE type='table';")
-            result = connection.execute(sql_query)
-            table_names = [row[0] for row in result]
-        
-        if not table_names:
-            print("データベースにテーブルが見つかりません。")
-            return
-
-        # Excelファイルへの書き込みを開始
-        with pd.ExcelWriter(OUTPUT_EXCEL_PATH, engine='openpyxl') as writer:
-            print(f"'{OUTPUT_EXCEL_PATH}' への書き込みを開始します...")
-            
-            for table_name in table_names:
-                print(f"  - テーブル '{table_name}' を読み込み中...")
-                # 各テーブルのデータをすべてDataFrameとして読み込む
-                df = pd.read_sql(f"SELECT * FROM {table_name}", engine)
-                
-                # DataFrameを、テーブル名をシート名としてExcelに書き込む
-                df.to_excel(writer, sheet_name=table_name, index=False)
-                print(f"    -> '{table_name}' シートに {len(df)} 件のデータを書き込みました。")
-
-        print("\n✅ データベースのエクスポートが完了しました。")
+            # データベース内の全テーブル名を取得
+            table_names = get_table_names(connection)
+            if tables:
+                table_names = [name for name in table_names if name in tables]
+
+            if not table_names:
+                print("データベースにテーブルが見つかりません。")
+                return
+
+            print(f"形式 '{export_format}' で {len(table_names)} 個のテーブルを書き出します...")
+            output_path = EXPORTERS[export_format](connection, table_names, chunk_size)
+
+        print(f"\n✅ データベースのエクスポートが完了しました: {output_path}")
 
     except Exception as e:
         print(f"エラーが発生しました: {e}")
 
 if __name__ == "__main__":
-    export_database_to_excel()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="データベースの全テーブルをExcel / CSV(gzip) / Parquetに書き出す")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="xlsx", help="出力形式")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1回に読み込んで書き出す行数")
+    parser.add_argument("--table", action="append", help="出力するテーブルを限定する (複数指定可)")
+    args = parser.parse_args()
+    export_database_to_excel(args.format, chunk_size=args.chunk_size, tables=args.table)
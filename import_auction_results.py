@@ -0,0 +1,133 @@
+# import_auction_results.py
+import argparse
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from sqlalchemy import select, bindparam
+from src import config
+from src.db.database import engine, check_unique_constraints
+from src.db.models import AuctionResult, AuctionListing, SQLModel
+from src.db.bulk import insert_or_ignore, iter_batches
+from src.db.auction_price_stats import refresh_model_price_stats
+from src.utils import normalize_series
+
+INPUT_CSV_PATH = config.AUCTION_RESULTS_DIR / "auction_results.csv"
+
+# 落札結果CSVの列名 → テーブルの列名
+RESULT_COLUMNS = {
+    '開催日': 'auction_date', '会場': 'auction_venue', '出品番号': 'auction_no',
+    '型式': 'model_code', '落札価格': 'winning_price',
+}
+
+
+def prepare_results_df(df: pd.DataFrame) -> pd.DataFrame:
+    """落札結果CSVの列名を揃え、会場・型式を正規化する。流札 (落札価格なし・0円) の行は除く"""
+    df = df.rename(columns=RESULT_COLUMNS)
+    missing = [col for col in ('auction_date', 'auction_venue', 'auction_no', 'winning_price') if col not in df.columns]
+    if missing:
+        raise KeyError(f"CSVに必要な列が見つかりません: {', '.join(missing)}")
+    if 'model_code' not in df.columns:
+        df['model_code'] = None
+
+    df['auction_venue'] = normalize_series(df['auction_venue'])
+    df['auction_date'] = df['auction_date'].astype(str).str.strip()
+    df['auction_no'] = df['auction_no'].astype(str).str.strip()
+    df['model_code'] = normalize_series(df['model_code'])
+    df['winning_price'] = pd.to_numeric(df['winning_price'].astype(str).str.replace(',', ''), errors='coerce')
+    df = df[df['winning_price'] > 0]
+    return df.drop_duplicates(subset=['auction_venue', 'auction_date', 'auction_no'], keep='last')
+
+
+def backfill_model_codes(connection, since_id: int) -> int:
+    """
+    型式の無い落札結果 (id > since_id) に、同じ出品 (会場・開催日・出品番号) の出品リストから型式を補い、補った件数を返す
+    会場名は両側を同じ normalize_series で正規化してから突き合わせる
+    (会場名を正規化せずに保存していた頃の出品リストの行も対象にするため、SQLではなくここで正規化する)
+    """
+    result = AuctionResult.__table__.c
+    listing = AuctionListing.__table__.c
+    missing_df = pd.read_sql(
+        select(result.id, result.auction_venue, result.auction_date, result.auction_no)
+        .where(result.id > since_id, result.model_code.is_(None)),
+        connection
+    )
+    if missing_df.empty:
+        return 0
+
+    listing_frames = [
+        pd.read_sql(
+            select(listing.auction_venue, listing.auction_date, listing.auction_no, listing.model_code)
+            .where(listing.auction_date.in_(batch), listing.model_code.is_not(None)),
+            connection
+        )
+        for batch in iter_batches(sorted(missing_df['auction_date'].unique()), 500)
+    ]
+    listing_df = pd.concat(listing_frames, ignore_index=True)
+    if listing_df.empty:
+        return 0
+    listing_df['auction_venue'] = normalize_series(listing_df['auction_venue'])
+    listing_df = listing_df.drop_duplicates(subset=['auction_venue', 'auction_date', 'auction_no'], keep='last')
+
+    matched = missing_df.merge(listing_df, on=['auction_venue', 'auction_date', 'auction_no'])
+    if matched.empty:
+        return 0
+    connection.execute(
+        AuctionResult.__table__.update().where(result.id == bindparam('result_id')).values(model_code=bindparam('code')),
+        [{"result_id": int(row.id), "code": row.model_code} for row in matched.itertuples()]
+    )
+    return len(matched)
+
+
+def import_auction_results(csv_path: Path = INPUT_CSV_PATH):
+    """
+    過去の落札結果CSVを AuctionResult テーブルに取り込み、増えた型式の落札価格の統計を計算し直す
+    取り込んだ行数 (新規・既存を含む) を返す。エラー時は None
+    """
+    print(f"'{csv_path.name}' から落札結果のインポートを開始します...")
+    SQLModel.metadata.create_all(engine)
+
+    try:
+        df = prepare_results_df(pd.read_csv(csv_path, dtype=str, encoding='utf-8-sig'))
+        now = datetime.utcnow()
+        result_df = df[list(RESULT_COLUMNS.values())].astype(object)
+        result_df = result_df.where(result_df.notna(), None)
+        records = [
+            dict(record, model_code=record['model_code'] or None, source_file=csv_path.name, created_at=now)
+            for record in result_df.to_dict('records')
+        ]
+
+        with engine.begin() as connection:
+            check_unique_constraints(connection, ["auctionresult"])
+            since_id = connection.execute(select(AuctionResult.id).order_by(AuctionResult.id.desc()).limit(1)).scalar() or 0
+            inserted = insert_or_ignore(connection, AuctionResult.__table__, records)
+
+            # 型式の無い行は、同じ出品 (会場・開催日・出品番号) の出品リストから型式を補う
+            backfilled = backfill_model_codes(connection, since_id)
+
+            # 新しく増えた落札結果の型式だけ、統計を計算し直す
+            affected_codes = connection.execute(
+                select(AuctionResult.model_code).where(AuctionResult.id > since_id).distinct()
+            ).scalars().all()
+            refreshed = refresh_model_price_stats(connection, affected_codes)
+
+        print("\n--- 処理結果 ---")
+        print(f"新規の落札結果: {inserted}件")
+        print(f"スキップ（取り込み済み）: {len(records) - inserted}件")
+        print(f"出品リストから型式を補った落札結果: {backfilled}件")
+        print(f"統計を更新した型式: {refreshed}件")
+        print("----------------")
+        return len(records)
+
+    except FileNotFoundError:
+        print(f"エラー: ファイルが見つかりません: {csv_path}")
+    except KeyError as e:
+        print(f"エラー: {e.args[0]}")
+    except Exception as e:
+        print(f"予期せぬエラーが発生しました: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="過去の落札結果CSVを取り込み、型式ごとの落札価格の統計を更新する")
+    parser.add_argument("csv_path", nargs="?", type=Path, default=INPUT_CSV_PATH)
+    args = parser.parse_args()
+    import_auction_results(args.csv_path)
@@ -0,0 +1,109 @@
+# import_directory.py
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from src import config
+from src.db.database import engine
+from src.db.models import SQLModel
+from src.db.manifest import check_file, record_import
+from import_procurement_data import import_procurement_data
+from import_market_prices import run_import
+from import_auction_results import import_auction_results
+
+
+def _import_procurement_file(path: Path, chunksize: int = None):
+    result = import_procurement_data(path, chunksize=chunksize)
+    return None if result is None else sum(result)
+
+
+def _import_sales_file(path: Path, chunksize: int = None):
+    return run_import(path, chunksize=chunksize)
+
+
+def _import_auction_results_file(path: Path, chunksize: int = None):
+    return import_auction_results(path)
+
+
+# 取り込み対象の種類: (フォルダ, ファイルパターン, インポート関数)
+SOURCES = {
+    "procurement": (config.PROCUREMENT_RECORDS_DIR, "*.csv", _import_procurement_file),
+    "sales": (config.SALES_RECORDS_DIR, "*.xlsx", _import_sales_file),
+    "auction_results": (config.AUCTION_RESULTS_DIR, "*.csv", _import_auction_results_file),
+}
+
+
+def _run_job(job):
+    source_kind, path, chunksize = job
+    return SOURCES[source_kind][2](path, chunksize)
+
+
+def _init_worker():
+    # 親プロセスから引き継いだDB接続は使わず、ワーカーごとに接続し直す
+    engine.dispose(close=False)
+
+
+def import_new_files(source_kinds=tuple(SOURCES), workers: int = 1, chunksize: int = None, force: bool = False):
+    """
+    入力フォルダを走査し、マニフェストに無い (または内容が変わった) ファイルだけを取り込む
+    workers > 1 の場合はファイル単位で並列に取り込む
+    """
+    print("入力フォルダの差分インポートを開始します...")
+    SQLModel.metadata.create_all(engine)
+
+    # --- 1. 新規・変更ファイルを洗い出す ---
+    jobs, fingerprints = [], []
+    unchanged_count = 0
+    with engine.begin() as connection:
+        for source_kind in source_kinds:
+            directory, pattern, _ = SOURCES[source_kind]
+            for path in sorted(directory.glob(pattern)):
+                if path.name.startswith("~$"): # Excelの一時ファイルは除外
+                    continue
+                needed, fingerprint = check_file(connection, source_kind, path)
+                if needed or force:
+                    jobs.append((source_kind, path, chunksize))
+                    fingerprints.append(fingerprint)
+                else:
+                    unchanged_count += 1
+
+    print(f"--- 新規・変更ファイル: {len(jobs)}件 / 取り込み済みで変更なし: {unchanged_count}件 ---")
+    if not jobs:
+        print("✅ 取り込むべき新しいファイルはありません。")
+        return
+
+    # --- 2. 取り込みを実行 ---
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            row_counts = list(executor.map(_run_job, jobs))
+    else:
+        row_counts = [_run_job(job) for job in jobs]
+
+    # --- 3. 成功したファイルをマニフェストに記録 ---
+    imported_count, failed = 0, []
+    with engine.begin() as connection:
+        for (source_kind, path, _), fingerprint, row_count in zip(jobs, fingerprints, row_counts):
+            if row_count is None:
+                failed.append(path.name)
+                continue
+            record_import(connection, source_kind, path, fingerprint, row_count)
+            imported_count += 1
+
+    print("\n--- 差分インポート結果 ---")
+    print(f"取り込み成功: {imported_count}件")
+    print(f"変更なしでスキップ: {unchanged_count}件")
+    if failed:
+        print(f"失敗 (次回再試行): {len(failed)}件 -> {', '.join(failed)}")
+    print("--------------------------")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="仕入れ実績・販売実績・落札結果フォルダの新規ファイルだけを取り込む")
+    parser.add_argument("--only", choices=list(SOURCES), action="append", help="取り込む種類を限定する (複数指定可)")
+    parser.add_argument("--workers", type=int, default=1, help="並列に取り込むファイル数")
+    parser.add_argument("--chunksize", type=int, default=None, help="各ファイルをこの行数ずつストリーミングで読み込む")
+    parser.add_argument("--force", action="store_true", help="マニフェストを無視してすべて取り込み直す")
+    args = parser.parse_args()
+
+    import_new_files(
+        source_kinds=args.only or tuple(SOURCES), workers=args.workers, chunksize=args.chunksize, force=args.force
+    )
@@ -1,13 +1,28 @@
+import re
+import argparse
+import uuid
+import openpyxl
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
-from src.db.database import engine, SessionLocal
-from src.db.models import ComponentValue, SQLModel
-from src.data_processing.llm_client import get_full_engine_model_from_llm # 新しい関数をインポート
-import time
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.db.database import engine, SessionLocal, check_unique_constraints
+from src.db.price_history import record_price_observations, retract_source_observations
+from src.db.manifest import file_hash
+from src.db.models import EngineModelMapping, SQLModel
+from src.utils import normalize_series
+from src.data_processing.llm_client import get_full_engine_models_batch_from_llm
+from src.data_processing.llm_cache import print_cache_stats
 
 INPUT_XLSX_PATH = Path(__file__).parent / "data" / "input" / "sales_records" / "sales_2025_06.xlsx"
 
+# 見出し行の位置 (0始まり)
+SALES_HEADER_ROW = 3
+
+# エンジン型式の正規化に使う列と、その正規化済みキー列
+ENGINE_KEY_COLS = {'メ－カ－': 'eg_key_maker', '車輌型式': 'eg_key_model_code', 'E/G型式': 'eg_key_short'}
+
 def parse_details_to_tags(detail_string: str) -> str:
     # ... (この関数は変更なし) ...
     if not isinstance(detail_string, str): return "standard"
@@ -18,65 +33,213 @@ def parse_details_to_tags(detail_string: str) -> str:
     if "4wd" in detail_lower: tags.add("4wd")
     return ",".join(sorted(list(tags))) if tags else "standard"
 
-def run_import():
-    print(f"'{INPUT_XLSX_PATH.name}' から市場価格のインポートを開始します...")
+def normalize_engine_models(df: pd.DataFrame, session) -> pd.DataFrame:
+    """
+    (メーカー, 車両型式, E/G型式) のユニークな組み合わせごとに一度だけ正式なエンジン型式を求め、
+    'engine_model_normalized' 列として全行に付与する
+    過去の月に処理済みの組み合わせは EngineModelMapping テーブルから再利用し、AIには問い合わせない
+    AIで特定できなかった組み合わせ (失敗・UNKNOWN・スタブ応答で、元の短い型式がそのまま返ったもの) は対応表に保存せず、次回また問い合わせる
+    """
+    df = df.copy()
+    for source_col, key_col in ENGINE_KEY_COLS.items():
+        df[key_col] = normalize_series(df[source_col].fillna("").astype(str))
+    key_cols = list(ENGINE_KEY_COLS.values())
+
+    # 1. ユニークな組み合わせを求め、対応表に登録済みのものを引き当てる
+    unique_keys = df[key_cols].drop_duplicates()
+    known_df = pd.read_sql(
+        select(
+            EngineModelMapping.maker.label('eg_key_maker'),
+            EngineModelMapping.vehicle_model_code.label('eg_key_model_code'),
+            EngineModelMapping.short_engine_model.label('eg_key_short'),
+            EngineModelMapping.full_engine_model.label('engine_model_normalized'),
+        ),
+        session.connection()
+    )
+    # 以前の版で保存された「短い型式 → 同じ短い型式」の行は、正式名称が分かっていないので新規として扱う
+    known_df = known_df[known_df['engine_model_normalized'] != known_df['eg_key_short']]
+    mapping_df = unique_keys.merge(known_df, on=key_cols, how='left')
+    is_new = mapping_df['engine_model_normalized'].isna()
+    print(f"  - {len(df)}行 / {len(unique_keys)}種類の組み合わせ (うち新規 {int(is_new.sum())}種類)")
+
+    # 2. 新規の組み合わせだけをAIで正規化し、対応表に保存する
+    if is_new.any():
+        new_keys = list(mapping_df.loc[is_new, key_cols].itertuples(index=False, name=None))
+        items = [tuple(value or None for value in key) for key in new_keys]
+        normalized_by_item = get_full_engine_models_batch_from_llm(items)
+        mapping_df.loc[is_new, 'engine_model_normalized'] = [normalized_by_item[item] for item in items]
+
+        now = datetime.utcnow()
+        resolved_rows = [
+            {
+                "maker": maker, "vehicle_model_code": model_code, "short_engine_model": short,
+                "full_engine_model": normalized_by_item[item], "created_at": now,
+            }
+            for (maker, model_code, short), item in zip(new_keys, items)
+            if short and normalized_by_item[item] != short
+        ]
+        print(f"  - 正式名称を特定できた {len(resolved_rows)}種類を対応表に保存します")
+        if resolved_rows:
+            stmt = sqlite_insert(EngineModelMapping)
+            # 既存の行は、正式名称が分かっていない (短い型式のまま保存された) ものだけを上書きする
+            session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["maker", "vehicle_model_code", "short_engine_model"],
+                    set_={"full_engine_model": stmt.excluded.full_engine_model, "created_at": stmt.excluded.created_at},
+                    where=EngineModelMapping.full_engine_model == EngineModelMapping.short_engine_model,
+                ),
+                resolved_rows,
+            )
+            session.commit()
+
+    # 3. 結果を全行にマージで展開する
+    df = df.merge(mapping_df, on=key_cols, how='left')
+    return df.drop(columns=key_cols)
+
+def iter_sales_chunks(xlsx_path: Path, chunksize: int = None):
+    """
+    販売実績XLSXをDataFrameとして返すジェネレータ
+    chunksizeを指定すると、読み取り専用モードで行を順に読み、chunksize行ずつ返す (メモリ使用量が一定)
+    """
+    if chunksize is None:
+        yield pd.read_excel(xlsx_path, header=SALES_HEADER_ROW)
+        return
+
+    workbook = openpyxl.load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        for _ in range(SALES_HEADER_ROW):
+            next(rows, None)
+        header = next(rows, None) or ()
+
+        # 見出しのある列だけを使う (重複した見出しは pandas と同じく ".1" を付けて区別する)
+        columns, positions, seen = [], [], {}
+        for position, name in enumerate(header):
+            if name is None:
+                continue
+            name = str(name)
+            columns.append(f"{name}.{seen[name]}" if name in seen else name)
+            seen[name] = seen.get(name, 0) + 1
+            positions.append(position)
+
+        batch = []
+        for row in rows:
+            batch.append([row[p] if p < len(row) else None for p in positions])
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def parse_sale_dates(values: pd.Series, xlsx_path: Path) -> pd.Series:
+    """
+    '日付' 列を日付に変換する。月次ファイルの '日付' は日にちだけ (2 → 2日) のことが多いため、
+    その場合はファイル名 (sales_2025_06.xlsx) の年月と組み合わせる。変換できない値は NaT
+    """
+    numeric = pd.to_numeric(values, errors='coerce')
+    if numeric.notna().any() and numeric.dropna().between(1, 31).all():
+        match = re.search(r"(\d{4})\D?(\d{2})", xlsx_path.stem)
+        if not match:
+            return pd.Series(pd.NaT, index=values.index)
+        month_start = pd.Timestamp(year=int(match.group(1)), month=int(match.group(2)), day=1)
+        return month_start + pd.to_timedelta(numeric - 1, unit='D')
+    return pd.to_datetime(values, errors='coerce')
+
+
+def build_observation_records(df: pd.DataFrame, xlsx_path: Path, source_hash: str) -> list:
+    """正規化済みの販売実績を、部品単価の観測値 (1行 = 1件) に変換する"""
+    prices = pd.to_numeric(df['単価'], errors='coerce')
+    dates = parse_sale_dates(df['日付'], xlsx_path)
+    # エンジン型式を正規化できなかった行は、部品グループに属さないため記録しない
+    valid = prices.notna() & df['engine_model_normalized'].notna()
+    return [
+        {
+            "item_name": str(item_name),
+            "engine_model": str(engine_model),
+            "details_tags": details_tags,
+            "price": float(price),
+            "observed_date": None if pd.isna(observed) else observed.date(),
+            "source_file": xlsx_path.name,
+            "source_hash": source_hash,
+            "source_row": int(source_row),
+        }
+        for item_name, engine_model, details_tags, price, observed, source_row in zip(
+            df.loc[valid, '品名'], df.loc[valid, 'engine_model_normalized'], df.loc[valid, 'details_tags'],
+            prices[valid], dates[valid], df.loc[valid, 'source_row'],
+        )
+    ]
+
+
+def run_import(xlsx_path: Path = INPUT_XLSX_PATH, chunksize: int = None):
+    """
+    販売実績XLSXから部品グループごとの市場価格を集計してDBを更新し、取り込んだ行数を返す
+    chunksizeを指定するとストリーミングモードになり、正規化と集計をチャンクごとに行う
+    """
+    print(f"'{xlsx_path.name}' から市場価格のインポートを開始します...")
     SQLModel.metadata.create_all(engine)
     session = SessionLocal()
+    run_id = uuid.uuid4().hex
+    # 同じ内容のファイルは名前を変えても二重に数えないよう、観測値はファイルのハッシュと行番号で識別する
+    source_hash = file_hash(xlsx_path)
+    retracted = False
 
     try:
-        df = pd.read_excel(INPUT_XLSX_PATH, header=3)
-        df.columns = df.columns.str.strip()
-        df.dropna(subset=['E/G型式', '単価'], inplace=True)
-
-        # --- ▼▼▼ AIによるエンジン型式の正規化処理を追加 ▼▼▼ ---
-        print("\n--- AIを使ってエンジン型式の正規化を開始します ---")
-        normalized_engines = []
-        for index, row in df.iterrows():
-            print(f"  - 処理中 ({index + 1}/{len(df)}): {row.get('メ－カ－')} {row.get('車輌型式')} ({row.get('E/G型式')})")
-            full_engine_model = get_full_engine_model_from_llm(
-                row.get('メ－カ－'), row.get('車輌型式'), row.get('E/G型式')
-            )
-            normalized_engines.append(full_engine_model)
-            time.sleep(0.1) # レートリミット対策
-
-        df['engine_model_normalized'] = normalized_engines
-        print("--- エンジン型式の正規化が完了しました ---\n")
-        # --- ▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲ ---
-
-        df['details_tags'] = df['詳細'].apply(parse_details_to_tags)
-        
-        # グループ化のキーを正規化後のエンジン型式に変更
-        key_cols = ['品名', 'engine_model_normalized', 'details_tags']
-        grouped = df.groupby(key_cols)
-
-        print(f"{len(grouped)}種類の部品グループが見つかりました。データベースを更新します...")
-
-        for name, group in grouped:
-            item_name, engine_model, tags = name
-            
-            latest_row = group.sort_values(by='日付', ascending=False).iloc[0]
-            avg_price = group['単価'].mean()
-            latest_price = latest_row['単価']
-            sample_size = len(group)
-
-            existing_value = session.query(ComponentValue).filter_by(
-                item_name=str(item_name), engine_model=str(engine_model), details_tags=tags
-            ).first()
-
-            if existing_value:
-                existing_value.latest_price = latest_price
-                existing_value.average_price = avg_price
-                existing_value.sample_size = sample_size
-                existing_value.updated_at = datetime.utcnow()
-            else:
-                existing_value = ComponentValue(
-                    item_name=str(item_name), engine_model=str(engine_model), details_tags=tags,
-                    latest_price=latest_price, average_price=avg_price, sample_size=sample_size
+        row_count = 0
+        observed_count = 0
+        group_count = 0
+        next_row = 0
+        for chunk_no, df in enumerate(iter_sales_chunks(xlsx_path, chunksize), start=1):
+            df.columns = df.columns.str.strip()
+            # ファイル内の行番号 (見出しの次の行を0とする)。同じ行を二度記録しないためのキーになる
+            df['source_row'] = range(next_row, next_row + len(df))
+            next_row += len(df)
+            df = df.dropna(subset=['E/G型式', '単価'])
+            if df.empty:
+                continue
+            row_count += len(df)
+            if chunksize:
+                print(f"\n--- チャンク {chunk_no} ({len(df)}行) を処理中 ---")
+
+            # --- ▼▼▼ AIによるエンジン型式の正規化処理を追加 ▼▼▼ ---
+            print("\n--- AIを使ってエンジン型式の正規化を開始します ---")
+            df = normalize_engine_models(df, session)
+            print("--- エンジン型式の正規化が完了しました ---\n")
+            # --- ▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲ ---
+
+            df['details_tags'] = df['詳細'].apply(parse_details_to_tags)
+
+            # 観測値の追記と累計の更新は、チャンクごとに1つのトランザクションで行う
+            # (途中で失敗しても、記録済みの行と累計が食い違わない)
+            with engine.begin() as connection:
+                check_unique_constraints(connection, [
+                    "componentpriceobservation", "componentpriceaggregate", "componentpricemonthly",
+                    "componentvalue", "enginemodelmapping",
+                ])
+                if not retracted:
+                    # 同じ名前で取り込んだ、内容の違う (編集前の) ファイルの観測値を取り消してから記録し直す
+                    retracted_count = retract_source_observations(connection, xlsx_path.name, source_hash)
+                    if retracted_count:
+                        print(f"  - 以前に取り込んだ '{xlsx_path.name}' の単価 {retracted_count}件を取り消しました")
+                    retracted = True
+                inserted, groups = record_price_observations(
+                    connection, build_observation_records(df, xlsx_path, source_hash), import_id=f"{run_id}-{chunk_no}"
                 )
-            session.add(existing_value)
-        
-        session.commit()
+            observed_count += inserted
+            group_count += groups
+
+        print_cache_stats()
+        if row_count == 0:
+            print("有効な行が見つかりませんでした。")
+            return 0
+
+        print(f"{observed_count}件の新しい単価を記録し、延べ{group_count}件の部品グループの累計を更新しました。")
+        if observed_count < row_count:
+            print(f"  - 記録済み、またはエンジン型式を特定できなかった行: {row_count - observed_count}件")
         print("\n✅ 市場価格データベースの更新が完了しました。")
+        return row_count
 
     except Exception as e:
         print(f"エラーが発生しました: {e}")
@@ -85,4 +248,8 @@ def run_import():
         session.close()
 
 if __name__ == "__main__":
-    run_import()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="販売実績XLSXから市場価格をインポートする")
+    parser.add_argument("xlsx_path", nargs="?", type=Path, default=INPUT_XLSX_PATH)
+    parser.add_argument("--chunksize", type=int, default=None, help="指定すると、この行数ずつストリーミングで読み込む")
+    args = parser.parse_args()
+    run_import(args.xlsx_path, chunksize=args.chunksize)
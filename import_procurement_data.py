@@ -1,68 +1,118 @@
+import argparse
 import pandas as pd
 from pathlib import Path
-from src.db.database import engine, SessionLocal
+from datetime import datetime
+from sqlalchemy import select
+from src.db.database import engine
 from src.db.models import SalesHistory, SQLModel
-from src.utils import normalize_text
+from src.db.bulk import insert_on_conflict_do_nothing
+from src.db.sales_rollup import get_max_sales_id, refresh_sales_rollup
+from src.utils import normalize_series
 
 # インプットとなる「仕入れ実績」ファイルへのパス
 INPUT_CSV_PATH = Path(__file__).parent / "data" / "input" / "procurement_records" / "procurement_2025_06.csv"
 
-def import_procurement_data():
-    print(f"'{INPUT_CSV_PATH.name}' を SalesHistory テーブルにインポートします...")
+SALES_HISTORY_COLUMNS = [c.name for c in SalesHistory.__table__.columns if c.name != 'id']
+
+
+def prepare_procurement_df(df: pd.DataFrame) -> pd.DataFrame:
+    """仕入れ実績CSVの列名を揃え、型式・メーカー・車台番号を正規化する"""
+    # --- 列名をリネーム ---
+    df = df.rename(columns={
+        '引渡報告日': 'sale_date', '車台番号': 'chassis_number',
+        '型式': 'model_code', '車名': 'maker',
+        '引渡先事業者／事業所名称': 'buyer_name', '引渡先事業所所在地': 'buyer_location'
+    })
+    if 'chassis_number' not in df.columns:
+        raise KeyError("CSVに'車台番号'列が見つかりません。")
+
+    # --- データをクリーニング・正規化 ---
+    df['model_code'] = normalize_series(df['model_code'].str.split('-').str[-1].str.strip())
+    df['maker'] = normalize_series(df['maker'])
+    df['chassis_number'] = normalize_series(df['chassis_number'].str.strip())
+    df['sale_date'] = pd.to_datetime(df['sale_date']).dt.date
+    return df.dropna(subset=['chassis_number'])
+
+
+def insert_procurement_records(connection, df: pd.DataFrame, existing_chassis: set) -> tuple:
+    """
+    既存の車台番号集合と突き合わせて新規分だけを一括挿入し、(挿入件数, スキップ件数) を返す
+    挿入した車台番号は existing_chassis に追加する
+    """
+    new_df = df[~df['chassis_number'].isin(existing_chassis)].drop_duplicates(subset=['chassis_number'])
+    new_df = new_df.assign(created_at=datetime.utcnow())
+    records = new_df[[c for c in SALES_HISTORY_COLUMNS if c in new_df.columns]].astype(object)
+    records = records.where(records.notna(), None).to_dict('records')
+
+    # 集合との突き合わせ後も、車台番号の重複は ON CONFLICT で安全にスキップする
+    # (必須の列が欠けている行などは、黙って捨てずにエラーにする)
+    inserted = insert_on_conflict_do_nothing(connection, SalesHistory.__table__, records, conflict_cols=['chassis_number'])
+    existing_chassis.update(new_df['chassis_number'])
+    return inserted, len(df) - inserted
+
+
+def load_existing_chassis_numbers(connection) -> set:
+    """登録済みの車台番号を1回のクエリで集合として読み込む"""
+    return set(connection.execute(select(SalesHistory.chassis_number)).scalars())
+
+
+def import_procurement_data(csv_path: Path = INPUT_CSV_PATH, chunksize: int = None):
+    """
+    仕入れ実績CSVを SalesHistory テーブルにインポートし、(挿入件数, スキップ件数) を返す
+    chunksizeを指定するとストリーミングモードになり、chunksize行ずつ正規化・挿入・コミットする
+    """
+    print(f"'{csv_path.name}' を SalesHistory テーブルにインポートします...")
     SQLModel.metadata.create_all(engine)
-    session = SessionLocal()
 
     try:
-        # --- 1. CSVを読み込み、データフレーム 'df' を作成 ---
-        df = pd.read_csv(INPUT_CSV_PATH, sep=',', encoding='cp932')
-        print(f"--- CSVから {len(df)} 件の行を読み込みました。 ---")
-        
-        # --- 2. 列名をリネーム ---
-        df.rename(columns={
-            '引渡報告日': 'sale_date', '車台番号': 'chassis_number',
-            '型式': 'model_code', '車名': 'maker',
-            '引渡先事業者／事業所名称': 'buyer_name', '引渡先事業所所在地': 'buyer_location'
-        }, inplace=True)
-
-        if 'chassis_number' not in df.columns:
-            print("エラー: CSVに'車台番号'列が見つかりません。")
-            return
-            
-        # --- 3. データをクリーニング・正規化 ---
-        df['model_code'] = df['model_code'].str.split('-').str[-1].str.strip().apply(normalize_text)
-        df['maker'] = df['maker'].apply(normalize_text)
-        df['chassis_number'] = df['chassis_number'].str.strip().apply(normalize_text)
-        df['sale_date'] = pd.to_datetime(df['sale_date']).dt.date
-        df.dropna(subset=['chassis_number'], inplace=True)
-        print(f"--- クリーニング後、 {len(df)} 件の有効なデータが残りました。 ---")
+        # --- 1. CSVを読み込む (ストリーミングモードではチャンクごとのイテレータになる) ---
+        # チャンクごとに型推論が揺れないよう、すべての列を文字列として読む
+        reader = pd.read_csv(csv_path, sep=',', encoding='cp932', dtype=str, chunksize=chunksize)
+        chunks = reader if chunksize else [reader]
+
+        with engine.connect() as connection:
+            existing_chassis = load_existing_chassis_numbers(connection)
 
         imported_count = 0
         skipped_count = 0
-        
-        # --- 4. SalesHistoryテーブルにデータを登録 ---
-        for record in df.to_dict('records'):
-            exists = session.query(SalesHistory).filter_by(chassis_number=record['chassis_number']).first()
-            if not exists:
-                new_record = SalesHistory(**record)
-                session.add(new_record)
-                imported_count += 1
-            else:
-                skipped_count += 1
-        
-        session.commit()
+        for chunk_no, df in enumerate(chunks, start=1):
+            print(f"--- CSVから {len(df)} 件の行を読み込みました。 ---" if not chunksize
+                  else f"--- チャンク {chunk_no}: {len(df)} 件の行を読み込みました。 ---")
+
+            # --- 2. 列名のリネームとクリーニング・正規化 ---
+            try:
+                df = prepare_procurement_df(df)
+            except KeyError as e:
+                print(f"エラー: {e.args[0]}")
+                return
+            if not chunksize:
+                print(f"--- クリーニング後、 {len(df)} 件の有効なデータが残りました。 ---")
+
+            # --- 3. 既存の車台番号と突き合わせ、新規分だけを一括登録 ---
+            # 挿入と、増えた行の属する (型式, メーカー, 月) の集計の更新は同じトランザクションで行う
+            with engine.begin() as connection:
+                since_id = get_max_sales_id(connection)
+                inserted, skipped = insert_procurement_records(connection, df, existing_chassis)
+                if inserted:
+                    refresh_sales_rollup(connection, since_id)
+            imported_count += inserted
+            skipped_count += skipped
         
         print("\n--- 処理結果 ---")
         print(f"SalesHistoryテーブルへのインポート成功: {imported_count}件")
         print(f"スキップ（重複）: {skipped_count}件")
         print("----------------")
+        return imported_count, skipped_count
     
     except FileNotFoundError:
-        print(f"エラー: ファイルが見つかりません: {INPUT_CSV_PATH}")
+        print(f"エラー: ファイルが見つかりません: {csv_path}")
     except Exception as e:
         print(f"予期せぬエラーが発生しました: {e}")
-    finally:
-        session.close()
 
 # スクリプト実行のきっかけ
 if __name__ == "__main__":
-    import_procurement_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="仕入れ実績CSVを SalesHistory テーブルにインポートする")
+    parser.add_argument("csv_path", nargs="?", type=Path, default=INPUT_CSV_PATH)
+    parser.add_argument("--chunksize", type=int, default=None, help="指定すると、この行数ずつストリーミングで読み込む")
+    args = parser.parse_args()
+    import_procurement_data(args.csv_path, chunksize=args.chunksize)
@@ -1,9 +1,11 @@
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
-from src.db.database import engine, SessionLocal
+from sqlalchemy import select
+from src.db.database import engine, check_unique_constraints
+from src.db.bulk import bulk_upsert
 from src.db.models import ComponentValue, SQLModel
-from src.utils import normalize_text
+from src.utils import normalize_series
 
 # ★★★ インプットとなる特別価格ファイルへのパス ★★★
 INPUT_CSV_PATH = Path(__file__).parent / "data" / "input" / "special_prices.csv"
@@ -14,7 +16,6 @@ def import_special_prices():
     """
     print(f"'{INPUT_CSV_PATH.name}' から特別価格のインポートを開始します...")
     SQLModel.metadata.create_all(engine)
-    session = SessionLocal()
 
     try:
         # 1. 特別価格CSVファイルを読み込む
@@ -23,12 +24,11 @@ def import_special_prices():
 
         # 型式を正規化して、データベースとの整合性を保つ
         if 'model_code' in df.columns:
-            df['model_code'] = df['model_code'].apply(normalize_text)
+            df['model_code'] = normalize_series(df['model_code'])
 
-        imported_count = 0
-        updated_count = 0
-
-        # 2. CSVの各行をループして、DBを更新（Upsert）する
+        # 2. 情報が揃っている行だけを登録対象にする (同じキーが複数あれば後の行を優先)
+        now = datetime.utcnow()
+        records = {}
         for record in df.to_dict('records'):
             model_code = record.get('model_code')
             item_name = record.get('item_name')
@@ -38,34 +38,31 @@ def import_special_prices():
                 print(f"  - スキップ: {record} -> 情報が不足しています。")
                 continue
 
-            # 車種と部品名で、既存の特別価格レコードがあるか検索
-            existing_value = session.query(ComponentValue).filter_by(
-                model_code=model_code,
-                item_name=item_name
-            ).first()
+            records[(model_code, item_name)] = {
+                "model_code": model_code,
+                "item_name": item_name,
+                "latest_price": price,
+                "average_price": price,
+                "sample_size": 1, # 固定価格なのでサンプル数は1
+                "details_tags": "special", # これが特別価格であることを示すタグ
+                "updated_at": now,
+            }
+
+        # 3. 車種と部品名をキーに一括でUpsertする
+        with engine.begin() as connection:
+            check_unique_constraints(connection, ["componentvalue"])
+            existing_keys = set(connection.execute(
+                select(ComponentValue.model_code, ComponentValue.item_name).where(ComponentValue.model_code != None)
+            ).tuples())
+            bulk_upsert(
+                connection, ComponentValue.__table__, list(records.values()),
+                conflict_cols=["model_code", "item_name"],
+                update_cols=["latest_price", "average_price", "sample_size", "updated_at"],
+            )
 
-            if existing_value:
-                # 存在すれば、価格を更新
-                existing_value.latest_price = price
-                existing_value.average_price = price
-                existing_value.sample_size = 1 # 固定価格なのでサンプル数は1
-                existing_value.updated_at = datetime.utcnow()
-                updated_count += 1
-            else:
-                # 存在しなければ、新しいレコードとして作成
-                existing_value = ComponentValue(
-                    model_code=model_code,
-                    item_name=item_name,
-                    latest_price=price,
-                    average_price=price,
-                    sample_size=1,
-                    details_tags="special" # これが特別価格であることを示すタグ
-                )
-                imported_count += 1
-            
-            session.add(existing_value)
+        updated_count = len(records.keys() & existing_keys)
+        imported_count = len(records) - updated_count
 
-        session.commit()
         print("\n--- 処理結果 ---")
         print(f"新規追加: {imported_count}件")
         print(f"更新: {updated_count}件")
@@ -75,9 +72,6 @@ def import_special_prices():
         print(f"エラー: ファイルが見つかりません: {INPUT_CSV_PATH}")
     except Exception as e:
         print(f"エラーが発生しました: {e}")
-        session.rollback()
-    finally:
-        session.close()
 
 if __name__ == "__main__":
     import_special_prices()
\ No newline at end of file
@@ -1,38 +1,50 @@
 # import_targets.py
 import pandas as pd
 from pathlib import Path
-from src.db.database import engine, SessionLocal
+from sqlalchemy import select, delete
+from src.db.database import engine
 from src.db.models import TargetModel, SQLModel
-from src.utils import normalize_text
+from src.db.bulk import insert_or_ignore, iter_batches
+from src.db.data_version import bump_data_version, TARGET_MODELS_VERSION
+from src.utils import normalize_series
 
 INPUT_CSV_PATH = Path(__file__).parent / "data" / "input" / "target_models.csv"
 
 def import_target_models():
+    """
+    注目車種リストをCSVと同期する
+    全削除して入れ直すのではなく、差分 (追加分・削除分) だけを1つのトランザクションで反映する
+    """
     print(f"'{INPUT_CSV_PATH.name}' から注目車種リストのインポートを開始します...")
     SQLModel.metadata.create_all(engine)
-    session = SessionLocal()
 
     try:
         df = pd.read_csv(INPUT_CSV_PATH)
-        df['model_code'] = df['model_code'].apply(normalize_text)
-
-        # 既存のリストを一度すべて削除
-        session.query(TargetModel).delete()
-        
-        imported_count = 0
-        for model_code in df['model_code'].unique():
-            new_target = TargetModel(model_code=model_code)
-            session.add(new_target)
-            imported_count += 1
-        
-        session.commit()
-        print(f"\n✅ {imported_count}件の注目車種をデータベースに登録しました。")
+        df['model_code'] = normalize_series(df['model_code'])
+        desired_codes = set(df['model_code'].dropna().unique())
+
+        with engine.begin() as connection:
+            current_codes = set(connection.execute(select(TargetModel.model_code)).scalars())
+            codes_to_add = sorted(desired_codes - current_codes)
+            codes_to_remove = sorted(current_codes - desired_codes)
+
+            insert_or_ignore(connection, TargetModel.__table__, [{"model_code": code} for code in codes_to_add])
+            for batch in iter_batches(codes_to_remove, 500): # IN句のバインド変数が多くなりすぎないように
+                connection.execute(delete(TargetModel).where(TargetModel.model_code.in_(batch)))
+
+            if codes_to_add or codes_to_remove:
+                version = bump_data_version(connection, TARGET_MODELS_VERSION)
+                print(f"--- 注目車種リストの更新番号を {version} に更新しました ---")
+
+        print("\n--- 処理結果 ---")
+        print(f"追加: {len(codes_to_add)}件")
+        print(f"削除: {len(codes_to_remove)}件")
+        print(f"変更なし: {len(desired_codes & current_codes)}件")
+        print("----------------")
+        print(f"\n✅ {len(desired_codes)}件の注目車種がデータベースに登録されています。")
 
     except Exception as e:
         print(f"エラーが発生しました: {e}")
-        session.rollback()
-    finally:
-        session.close()
 
 if __name__ == "__main__":
-    import_target_models()
\ No newline at end of file
+    import_target_models()
@@ -1,5 +1,7 @@
 from sqlalchemy import inspect, text
-from src.db.database import engine
+from src.db.database import engine, ensure_unique_constraints
+from src.db.sales_rollup import ensure_sales_rollup
+from src.db import models # 一意制約の定義を読み込むため
 
 def run_migration():
     """
@@ -39,6 +41,24 @@ def run_migration():
                 print("  - 'saleshistory' テーブルに 'buyer_location' 列を追加します...")
                 connection.execute(text('ALTER TABLE saleshistory ADD COLUMN buyer_location VARCHAR'))
 
+            # --- componentpriceobservation テーブルの列をチェック ---
+            # 観測値の重複判定を (ファイル名, 行) から (ファイルのハッシュ, 行) に変えたため、古いインデックスは削除する
+            if inspector.has_table("componentpriceobservation"):
+                po_columns = [c["name"] for c in inspector.get_columns("componentpriceobservation")]
+                if "source_hash" not in po_columns:
+                    print("  - 'componentpriceobservation' テーブルに 'source_hash' 列を追加します...")
+                    connection.execute(text('ALTER TABLE componentpriceobservation ADD COLUMN source_hash VARCHAR'))
+                connection.execute(text('DROP INDEX IF EXISTS uq_componentpriceobservation_source'))
+
+            # --- モデルで定義した複合一意制約を一意インデックスとして追加 ---
+            print("  - 複合一意制約 (重複行の整理を含む) を確認します...")
+            ensure_unique_constraints(connection)
+
+            # --- 落札実績の月別集計を、未作成なら落札実績全体から作る ---
+            built = ensure_sales_rollup(connection)
+            if built:
+                print(f"  - 落札実績の月別集計を作成しました ({built}件)")
+
             trans.commit()
         
         print("✅ マイグレーションが完了しました。")
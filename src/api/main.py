@@ -1,69 +1,59 @@
 import sys
+import traceback
 from pathlib import Path
+import io
 import json
 import tempfile
 import os
 import pandas as pd
 from datetime import datetime
-import japanize_matplotlib
-import random
+from typing import List
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+import pdfplumber
+from sqlalchemy.orm import configure_mappers
 
 # プロジェクトのルートディレクトリをPythonの検索パスに追加
 # これにより、'src'フォルダをトップレベルとして認識できるようになる
 sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
 
-from fastapi import FastAPI, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
-from fpdf import FPDF
 
 # --- ▼▼▼ インポートのパスをすべて src からに統一 ▼▼▼ ---
+from src import config
 from src.config import VALUATION_PRICES
 from src.data_processing.pdf_parser import extract_vehicles_from_pdf
-from src.utils import normalize_text
+from src.utils import normalize_series, normalize_text, month_window_start
 from src.estimate_value import estimate_scrap_value
-from src.db.database import SessionLocal
-from src.db.models import TargetModel # ★ TargetModelをインポート
+from src.db.models import TargetModel, VehicleMaster # ★ TargetModelをインポート
+from src.db.data_version import get_data_version, TARGET_MODELS_VERSION
+from src.db.database import engine, SessionLocal
+from src.db.sales_rollup import get_market_demand, ensure_sales_rollup
+from src.db.auction_price_stats import get_model_price_stats
+from src.model_code_resolver import get_model_code_index
+from src.api.report_pdf import (
+    build_report_row, render_report, render_sections, render_pages, layout_sections,
+    start_render_pool, warm_render_pool, shutdown_render_pool,
+)
+from src.api.report_table import iter_report_csv, write_report_xlsx
+from src.api.warmup import start_warmup, is_ready, get_warmup_status
 
-class PDF(FPDF):
-    def __init__(self, header_info=None, *args, **kwargs): # ← ★ 1. header_info を受け取る
-        super().__init__(*args, **kwargs)
-        self.header_info = header_info or {} # ← ★ 2. 受け取った情報をselfに保存
-        try:
-            # フォント設定は変更なし
-            font_dir = os.path.dirname(japanize_matplotlib.__file__)
-            font_path = os.path.join(font_dir, 'fonts', 'ipaexg.ttf')
-            self.add_font('ipaexg', '', font_path, uni=True)
-            self.add_font('ipaexg', 'B', font_path, uni=True)
-            self.set_font('ipaexg', '', 12)
-        except Exception as e:
-            print(f"フォントの読み込みに失敗しました: {e}")
-            self.set_font('Arial', '', 12)
-
-    def header(self):
-        # --- 受け取ったヘッダー情報を使って動的なタイトルを生成 ---
-        title = self.header_info.get("auction_venue", "車両価値算定レポート")
-        date = self.header_info.get("auction_date", "")
-        corner = self.header_info.get("auction_corner", "") # コーナー名を取得
-        
-        self.set_font('ipaexg', 'B', 15)
-        self.cell(0, 10, title, 0, 1, 'C')
-
-        # 日付とコーナー名をサブタイトルとして表示
-        subtitle = f"({date}開催分 / {corner}コーナー)" if date and corner else f"({date}開催分)" if date else ""
-        if subtitle:
-            self.set_font('ipaexg', '', 10)
-            self.cell(0, 7, subtitle, 0, 1, 'C')
-        
-        self.ln(5)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('ipaexg', '', 8)
-        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
-
-
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 最初のリクエストが遅くならないよう、起動直後にバックグラウンドで準備を済ませておく
+    # 準備が終わるまで /api/ready は 503 を返すので、ロードバランサーはまだリクエストを送らない
+    # レポートの並列描画用のプロセスプールは、リクエストごとではなくここで1度だけ作る (1コアでは作らない)
+    start_render_pool()
+    start_warmup(WARMUP_STEPS)
+    yield
+    shutdown_render_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 # --- ▼▼▼ このCORS設定ブロックを修正 ▼▼▼ ---
 origins = [
     "http://localhost:3000", # ローカル開発環境用
@@ -77,92 +67,125 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def generate_report_pdf(results: list, header_info: dict) -> str: # ← ★引数に header_info を追加
-    """算定結果のリストから「最終版」の表形式PDFレポートを生成する"""
-    pdf = PDF(header_info=header_info, orientation='L') # PDFクラスにヘッダー情報を渡す
-    pdf.add_page()
+# /api/analyze-sheet が返せるレポートの形式
+REPORT_FORMATS = ("pdf", "csv", "xlsx")
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# 注目車種リストのキャッシュ。更新番号が変わったときだけ読み直す
+_target_model_cache = {"version": None, "codes": frozenset()}
 
+def get_target_model_set() -> frozenset:
+    """注目車種の型式集合を返す (import_targets.py が更新番号を上げたときだけDBから読み直す)"""
     session = SessionLocal()
     try:
-        target_models_query = session.query(TargetModel.model_code).all()
-        target_model_set = {code for (code,) in target_models_query}
+        version = get_data_version(session.connection(), TARGET_MODELS_VERSION)
+        if _target_model_cache["version"] != version:
+            target_models_query = session.query(TargetModel.model_code).all()
+            _target_model_cache["codes"] = frozenset(code for (code,) in target_models_query)
+            _target_model_cache["version"] = version
     finally:
         session.close()
+    return _target_model_cache["codes"]
 
-    # ▼▼▼ headersリストの定義を修正 ▼▼▼
-    # 「色」を削除し、「総重量」「シフト」「評価点」を追加
-    headers = [
-        ("出品番号", 18), ("メーカー", 18), ("車名", 30), ("グレード", 30), 
-        ("年式", 10), ("型式", 22), ("排気量", 15), ("車検", 18), 
-        ("走行", 12), ("シフト", 12), ("評価点", 12), ("総重量", 12),
-        ("E/G販売", 12), ("E/G価値", 12), ("素材価値", 12), ("メモ", 28)
+
+def generate_report_pdf(results: list, header_info: dict) -> str: # ← ★引数に header_info を追加
+    """算定結果のリストから「最終版」の表形式PDFレポートを生成する (ページ数が多い場合は並列に描画する)"""
+    target_model_set = get_target_model_set()
+    rows = [build_report_row(res, target_model_set) for res in results if res and "error" not in res]
+
+    output_path = os.path.join(tempfile.gettempdir(), f"report_{datetime.now().strftime('%Y%m%d%H%M%S%f')}.pdf")
+    return render_report(rows, header_info, output_path)
+
+
+def generate_batch_report_pdf(sheets: list) -> str:
+    """シートごとの (header_info, 算定結果のリスト) から、シートごとのセクションを持つ1つのPDFレポートを生成する"""
+    target_model_set = get_target_model_set()
+    sections = [
+        (header_info, [build_report_row(res, target_model_set) for res in results if res and "error" not in res])
+        for header_info, results in sheets
     ]
-    
-    pdf.set_font('ipaexg', 'B', 7)
-    for header, width in headers:
-        pdf.cell(width, 7, header, border=1, align='C')
-    pdf.ln()
-
-    pdf.set_fill_color(220, 220, 220)
-    highlight_columns = ["損益分岐額", "入札対象"]
-
-    for i, res in enumerate(results):
-        if not res or "error" in res: continue
-        
-        info = res.get('vehicle_info', {})
-        breakdown = res.get('breakdown', {})
-        model_code = res.get('model_code', '')
-
-        material_value = (
-            breakdown.get('プレス材 (鉄)', 0) +
-            breakdown.get('甲山 (ミックスメタル)', 0) +
-            breakdown.get('ハーネス (銅)', 0)
-        )
-        
-        is_target = model_code in target_model_set
 
-        if is_target:
-            pdf.set_text_color(0, 0, 0)
-            should_fill = False
+    output_path = os.path.join(tempfile.gettempdir(), f"report_{datetime.now().strftime('%Y%m%d%H%M%S%f')}.pdf")
+    return render_sections(sections, output_path)
+
+
+def apply_bidding_recommendation(final_record: dict, stats: dict):
+    """
+    過去の落札価格の中央値と算定額を比べて、入札度 (〇/△/×) を付ける
+    過去の落札結果が無い型式、または算定額が0の場合は "?" とする
+    """
+    past_auction_price = stats["median_price"] if stats else None
+    final_record['past_auction_price'] = past_auction_price
+    final_record['past_auction_sample_size'] = stats["sample_size"] if stats else 0
+    total_value = final_record.get('total_value', 0)
+    if past_auction_price is None or total_value == 0:
+        bidding_recommendation = "?"
+    else:
+        diff = total_value - past_auction_price
+        if diff >= 10000:
+            bidding_recommendation = "〇"
+        elif diff > -10000:
+            bidding_recommendation = "△"
         else:
-            pdf.set_text_color(100, 100, 100)
-            should_fill = True
-        
-        # ▼▼▼ 2つの評価点を結合するロジックを追加 ▼▼▼
-        score = res.get('evaluation_score', '')
-        interior = res.get('evaluation_interior', '')
-        evaluation_text = f"{score} / {interior}" if score and interior else score or interior
-        
-        # ▼▼▼ row_dataリストの定義を修正 ▼▼▼
-        row_data = [
-            res.get('auction_no', ''),
-            res.get('maker', ''),
-            res.get('car_name', ''),
-            res.get('grade', ''),
-            res.get('year', ''),
-            res.get('model_code', ''),
-            str(res.get('displacement_cc', '')),
-            str(res.get('inspection_date', '')),
-            str(res.get('mileage_km', '')),
-            res.get('shift', ''),
-            evaluation_text,
-            str(res.get('total_weight_kg', '')),
-            breakdown.get('エンジン部品販売', '×'),
-            f"{breakdown.get('エンジン/ミッション', 0):,.0f}",
-            f"{material_value:,.0f}",
-            '' # メモ欄
-        ]
-        
-        for col_idx, (data, width) in enumerate(zip(row_data, [w for h, w in headers])):
-            pdf.cell(width, 6, str(data), border=1, fill=should_fill, align='C')
-        
-        pdf.ln()
+            bidding_recommendation = "×"
+    final_record['bidding_recommendation'] = bidding_recommendation
+
+
+def _warm_report_rendering():
+    """空のレポートを1回描画し (日本語フォントの読み込みを含む)、それをpdfplumberで読み取っておく"""
+    pdf_bytes = render_pages(layout_sections([({}, [])]))
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for page in pdf.pages:
+            page.extract_text()
+            page.extract_tables()
+
+
+def _warm_valuation_data():
+    """型式の検索インデックスと、車種・部品単価・過去相場のデータを読み込み、1台分の算定を通しておく"""
+    session = SessionLocal()
+    try:
+        get_model_code_index(session)
+        target_codes = get_target_model_set()
+        sample_code = next(iter(sorted(target_codes)), None) or session.query(VehicleMaster.model_code).limit(1).scalar()
+        get_model_price_stats(session.connection(), target_codes)
+        if sample_code:
+            try:
+                estimate_scrap_value(sample_code, session, custom_prices={})
+            except Exception as e:
+                # 個別の車種データの不備は準備の失敗とはしない (リクエスト時と同じくその車両だけの問題)
+                print(f"起動時の試し算定 (型式 {sample_code}) でエラーが発生しました: {e}")
+    finally:
+        session.close()
 
-    pdf.set_text_color(0, 0, 0)
-    
-    output_path = os.path.join(tempfile.gettempdir(), f"report_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf")
-    pdf.output(output_path)
-    return output_path
+
+def _warm_sales_rollup():
+    """落札実績の月別集計 (/api/market-demand が読む) が空なら、DBファイル上に作っておく"""
+    with engine.begin() as connection:
+        ensure_sales_rollup(connection)
+
+
+# 起動時の準備の手順 (名前, 関数)。DBを最初に開くのは注目車種の読み込みで行う
+WARMUP_STEPS = [
+    ("report_rendering", _warm_report_rendering),
+    ("render_pool", warm_render_pool),
+    ("mappers", configure_mappers),
+    ("sales_rollup", _warm_sales_rollup),
+    ("target_models", get_target_model_set),
+    ("valuation_data", _warm_valuation_data),
+]
+
+
+@app.get("/api/health")
+def health_endpoint():
+    """プロセスが応答できるかだけを返す (死活監視用。準備が終わっていなくても200)"""
+    return {"status": "ok"}
+
+
+@app.get("/api/ready")
+def ready_endpoint():
+    """起動時の準備が終わっていれば200、終わっていない (または失敗した) 場合は503を返す (ロードバランサーの振り分け判定用)"""
+    status = get_warmup_status()
+    return JSONResponse(status_code=200 if is_ready() else 503, content=status)
 
 
 @app.get("/api/parameters")
@@ -179,9 +202,168 @@ def get_parameters():
         "transport_cost": 5000, # 輸送費は固定値として追加
     }
 
-    
+
+@app.get("/api/market-demand")
+def market_demand_endpoint(model_codes: str, months: int = 12, end_month: str = None):
+    """
+    型式ごとの需要 (落札件数・月ごとの取引先数) を、月別の集計テーブルから返す
+    model_codes はカンマ区切り。end_month ("YYYY-MM") を含む直近 months か月が対象 (省略時は今月まで)
+    """
+    try:
+        end_date = datetime.strptime(end_month, "%Y-%m").date() if end_month else datetime.now().date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="end_month は YYYY-MM 形式で指定してください。")
+    if months < 1:
+        raise HTTPException(status_code=400, detail="months は1以上で指定してください。")
+
+    codes = list(dict.fromkeys(normalize_text(code) for code in model_codes.split(",") if code.strip()))
+    start, end = month_window_start(end_date, months), month_window_start(end_date, 1)
+    with engine.connect() as connection:
+        demand = get_market_demand(connection, codes, start, end)
+
+    return {
+        "start_month": start,
+        "end_month": end,
+        "models": [
+            {
+                "model_code": code,
+                "sales_count": stats["sales_count"],
+                "average_monthly_sales": stats["sales_count"] / months,
+                "monthly": stats["monthly"],
+            }
+            for code, stats in demand.items()
+        ],
+    }
+
+
+def parse_sheet(pdf_path: str):
+    """出品票PDFを読み取り、(header_info, 車両のDataFrame) を返す (メーカー名などは正規化済み)"""
+    header_info, all_vehicles = extract_vehicles_from_pdf(pdf_path)
+    df = pd.DataFrame(all_vehicles)
+    df = df[df['maker'] != 'メーカー'].copy()
+
+    for col in ['maker', 'car_name', 'model_code']:
+        if col in df.columns:
+            df[col] = normalize_series(df[col])
+    return header_info, df
+
+
+def build_final_record(pdf_row_data: dict, valuation: dict) -> dict:
+    """PDFから読み取った1台分のデータと、その型式の算定結果をマージする"""
+    db_info = valuation.get('vehicle_info', {})
+    calculated_values = valuation.copy()
+    calculated_values.pop('vehicle_info', None)
+
+    # ▼▼▼ あなたの完璧なロジック「PDF -> DB -> PDF」▼▼▼
+    # 1. PDFをベースにし
+    final_record = pdf_row_data.copy()
+    # 2. DBの補足情報（重量など）で上書き（補完）し
+    final_record.update(db_info)
+    # 3. 最後にPDFの主要情報（年式など）で再度上書きする
+    final_record.update(pdf_row_data)
+    # 4. 算定した価値情報を追加する
+    final_record.update(calculated_values)
+    # ▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲
+
+    # 表記ゆれを解決した場合は、正式な型式で過去相場を引く
+    final_record['canonical_model_code'] = db_info.get('model_code') or pdf_row_data.get('model_code')
+    return final_record
+
+
+def _sheet_model_codes(df: pd.DataFrame) -> set:
+    return set(df['model_code'].dropna()) if 'model_code' in df.columns else set()
+
+
+def iter_valued_records(df: pd.DataFrame, params: dict):
+    """
+    PDFから読み取った車両を1台ずつ算定し、入札度まで付けた結果を順に返す
+    1件ずつ返すので、CSVなどは算定が終わった行からすぐに書き出せる
+    """
+    session = SessionLocal()
+    try:
+        print(f"PDFから {len(df)} 件の車両を検出。価値算定を開始します...")
+        # 過去相場はシートに載っている型式でまとめて先に引いておく (行ごとのクエリはしない)
+        # 表記ゆれを解決して別の型式になった場合だけ、その型式を追加で引く
+        sheet_codes = _sheet_model_codes(df)
+        price_stats = get_model_price_stats(session.connection(), sheet_codes)
+        looked_up_codes = set(sheet_codes)
+        # 同じ型式の車両はシート内で1回だけ算定する
+        valuations = {}
+
+        for index, row in df.iterrows():
+
+            # 1. まず、PDFから読み取った「生データ」を辞書にする
+            pdf_row_data = row.to_dict()
+            model_code = pdf_row_data.get('model_code')
+
+            # 2. 価値算定を試みる (DBにない場合でもエラーではなく、空の情報が返る)
+            if model_code and model_code not in valuations:
+                valuations[model_code] = estimate_scrap_value(model_code, session, custom_prices=params)
+
+            # 3. データをマージする
+            final_record = build_final_record(pdf_row_data, valuations.get(model_code, {}) if model_code else {})
+
+            canonical_model_code = final_record['canonical_model_code']
+            if canonical_model_code and canonical_model_code not in looked_up_codes:
+                looked_up_codes.add(canonical_model_code)
+                price_stats.update(get_model_price_stats(session.connection(), {canonical_model_code}))
+            apply_bidding_recommendation(final_record, price_stats.get(canonical_model_code))
+            yield final_record
+    finally:
+        session.close()
+
+
+def value_sheets(dfs: list, params: dict) -> list:
+    """
+    複数シートの車両をまとめて算定し、シートごとの算定結果のリストを返す
+    全シートを通して、異なる型式ごとに1回だけ算定し、過去相場も1回のまとめ引きで済ませる
+    """
+    codes = set().union(*(_sheet_model_codes(df) for df in dfs))
+    session = SessionLocal()
+    try:
+        print(f"{len(dfs)} 枚のシートから {sum(len(df) for df in dfs)} 件の車両 (型式 {len(codes)} 種類) を検出。価値算定を開始します...")
+        valuations = {code: estimate_scrap_value(code, session, custom_prices=params) for code in sorted(codes) if code}
+        sheets = [
+            [build_final_record(row.to_dict(), valuations.get(row.get('model_code'), {})) for _, row in df.iterrows()]
+            for df in dfs
+        ]
+        price_stats = get_model_price_stats(
+            session.connection(), {record['canonical_model_code'] for records in sheets for record in records}
+        )
+    finally:
+        session.close()
+
+    for records in sheets:
+        for final_record in records:
+            apply_bidding_recommendation(final_record, price_stats.get(final_record['canonical_model_code']))
+    return sheets
+
+
+def parse_sheets(pdf_paths: list) -> list:
+    """複数の出品票PDFを (CPUコアが複数あれば) 別プロセスで並列に読み取り、[(header_info, df), ...] を返す"""
+    workers = min(config.SHEET_PARSE_WORKERS or os.cpu_count() or 1, len(pdf_paths))
+    if workers <= 1:
+        return [parse_sheet(path) for path in pdf_paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(parse_sheet, pdf_paths))
+
+
+def _remove_file(path: str):
+    if os.path.exists(path):
+        os.unlink(path)
+
+
 @app.post("/api/analyze-sheet")
-async def analyze_sheet_endpoint(file: UploadFile = File(...), params_str: str = Form(...)):
+async def analyze_sheet_endpoint(
+    file: UploadFile = File(...), params_str: str = Form(...), output_format: str = Form("pdf")
+):
+    """
+    出品票PDFを算定してレポートを返す
+    output_format は "pdf" (既定) / "csv" / "xlsx"。CSVは算定した行から順にストリーミングで返す
+    """
+    if output_format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"output_format は {', '.join(REPORT_FORMATS)} のいずれかで指定してください。")
+
     try:
         params = json.loads(params_str)
         temp_pdf_path = ""
@@ -190,74 +372,74 @@ async def analyze_sheet_endpoint(file: UploadFile = File(...), params_str: str =
                 temp_pdf.write(await file.read())
                 temp_pdf_path = temp_pdf.name
 
-            header_info, all_vehicles = extract_vehicles_from_pdf(temp_pdf_path)
-            df = pd.DataFrame(all_vehicles)
-            df = df[df['maker'] != 'メーカー'].copy()
-            
-            for col in ['maker', 'car_name', 'model_code']:
-                if col in df.columns:
-                    df[col] = df[col].apply(normalize_text)
-            
-            results = []
-            session = SessionLocal()
-            try:
-                print(f"PDFから {len(df)} 件の車両を検出。価値算定を開始します...")
-                for index, row in df.iterrows():
-                    
-                    # 1. まず、PDFから読み取った「生データ」を辞書にする
-                    pdf_row_data = row.to_dict()
-                    model_code = pdf_row_data.get('model_code')
-
-                    # 2. 価値算定を試みる (DBにない場合でもエラーではなく、空の情報が返る)
-                    valuation = {}
-                    if model_code:
-                        valuation = estimate_scrap_value(model_code, session, custom_prices=params)
-                    
-                    # 3. データをあなたのロジックでマージする
-                    db_info = valuation.get('vehicle_info', {})
-                    calculated_values = valuation.copy()
-                    calculated_values.pop('vehicle_info', None) 
-                    
-                    # ▼▼▼ あなたの完璧なロジック「PDF -> DB -> PDF」▼▼▼
-                    # 1. PDFをベースにし
-                    final_record = pdf_row_data.copy()
-                    # 2. DBの補足情報（重量など）で上書き（補完）し
-                    final_record.update(db_info)
-                    # 3. 最後にPDFの主要情報（年式など）で再度上書きする
-                    final_record.update(pdf_row_data)
-                    # 4. 算定した価値情報を追加する
-                    final_record.update(calculated_values)
-                    # ▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲
-
-                    # 過去相場と入札度のロジック
-                    past_auction_price = random.randint(30000, 110000)
-                    final_record['past_auction_price'] = past_auction_price
-                    total_value = final_record.get('total_value', 0)
-                    diff = total_value - past_auction_price
-                    if total_value == 0:
-                        bidding_recommendation = "?"
-                    elif diff >= 10000:
-                        bidding_recommendation = "〇"
-                    elif diff > -10000:
-                        bidding_recommendation = "△"
-                    else:
-                        bidding_recommendation = "×"
-                    final_record['bidding_recommendation'] = bidding_recommendation
-                    
-                    results.append(final_record)
-            finally:
-                session.close()
-
-            output_pdf_path = generate_report_pdf(results, header_info)
-            return FileResponse(output_pdf_path, media_type='application/pdf', filename="valuation_report.pdf")
-        
+            header_info, df = parse_sheet(temp_pdf_path)
         finally:
             if temp_pdf_path and os.path.exists(temp_pdf_path):
                 os.unlink(temp_pdf_path)
-    
+
+        # 算定はレスポンスを返しながら進むので、ここではまだ実行しない
+        records = iter_valued_records(df, params)
+        target_model_set = get_target_model_set()
+
+        if output_format == "csv":
+            return StreamingResponse(
+                iter_report_csv(records, target_model_set),
+                media_type="text/csv; charset=utf-8",
+                headers={"Content-Disposition": 'attachment; filename="valuation_report.csv"'},
+            )
+
+        if output_format == "xlsx":
+            output_path = os.path.join(tempfile.gettempdir(), f"report_{datetime.now().strftime('%Y%m%d%H%M%S%f')}.xlsx")
+            write_report_xlsx(records, target_model_set, output_path)
+            return FileResponse(
+                output_path, media_type=XLSX_MEDIA_TYPE, filename="valuation_report.xlsx",
+                background=BackgroundTask(_remove_file, output_path),
+            )
+
+        output_pdf_path = generate_report_pdf(list(records), header_info)
+        return FileResponse(output_pdf_path, media_type='application/pdf', filename="valuation_report.pdf")
+
+    except Exception as e:
+        print("\n" + "="*50)
+        print("バックエンドで予期せぬエラーが発生しました。")
+        traceback.print_exc()
+        print("="*50 + "\n")
+        return {"error": "Internal Server Error"}, 500
+
+
+@app.post("/api/analyze-sheets")
+async def analyze_sheets_endpoint(files: List[UploadFile] = File(...), params_str: str = Form(...)):
+    """
+    同じ開催日の複数の出品票PDFをまとめて算定し、シートごとのセクションを持つ1つのPDFレポートを返す
+    PDFの読み取りは並列に行い、シート間で共通する型式の算定やDB参照は1回にまとめる
+    """
+    if len(files) > config.MAX_BATCH_SHEETS:
+        raise HTTPException(status_code=400, detail=f"一度に送れるシートは {config.MAX_BATCH_SHEETS} 枚までです。")
+
+    try:
+        params = json.loads(params_str)
+        temp_pdf_paths = []
+        try:
+            for file in files:
+                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
+                    temp_pdf.write(await file.read())
+                    temp_pdf_paths.append(temp_pdf.name)
+
+            parsed_sheets = parse_sheets(temp_pdf_paths)
+        finally:
+            for temp_pdf_path in temp_pdf_paths:
+                if os.path.exists(temp_pdf_path):
+                    os.unlink(temp_pdf_path)
+
+        sheet_results = value_sheets([df for _, df in parsed_sheets], params)
+        output_pdf_path = generate_batch_report_pdf(
+            [(header_info, results) for (header_info, _), results in zip(parsed_sheets, sheet_results)]
+        )
+        return FileResponse(output_pdf_path, media_type='application/pdf', filename="valuation_report.pdf")
+
     except Exception as e:
         print("\n" + "="*50)
         print("バックエンドで予期せぬエラーが発生しました。")
         traceback.print_exc()
         print("="*50 + "\n")
-        return {"error": "Internal Server Error"}, 500
\ No newline at end of file
+        return {"error": "Internal Server Error"}, 500
@@ -0,0 +1,284 @@
+# src/api/report_pdf.py
+
+import io
+import os
+import importlib.util
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from fpdf import FPDF
+from src import config
+
+# pypdf はオプション。無ければ分割レンダリングはせず、1プロセスで全ページを描画する
+try:
+    from pypdf import PdfWriter
+    HAS_PYPDF = True
+except ImportError:
+    HAS_PYPDF = False
+
+# ▼▼▼ headersリストの定義を修正 ▼▼▼
+# 「色」を削除し、「総重量」「シフト」「評価点」を追加
+# 過去相場 (落札価格の中央値と件数) と入札度の列を追加し、その分メモ欄などを詰める
+REPORT_HEADERS = [
+    ("出品番号", 14), ("メーカー", 18), ("車名", 26), ("グレード", 26),
+    ("年式", 10), ("型式", 22), ("排気量", 15), ("車検", 18),
+    ("走行", 12), ("シフト", 12), ("評価点", 12), ("総重量", 12),
+    ("E/G販売", 12), ("E/G価値", 12), ("素材価値", 12), ("過去相場", 20), ("入札", 8), ("メモ", 12)
+]
+HEADER_ROW_HEIGHT = 7
+ROW_HEIGHT = 6
+
+
+def get_japanese_font_path() -> str:
+    """japanize_matplotlib に同梱されているIPAexゴシックのパスを返す (matplotlib本体は読み込まない)"""
+    spec = importlib.util.find_spec("japanize_matplotlib")
+    font_dir = list(spec.submodule_search_locations)[0]
+    return os.path.join(font_dir, 'fonts', 'ipaexg.ttf')
+
+
+class PDF(FPDF):
+    def __init__(self, header_info=None, page_offset=0, total_pages=None, *args, **kwargs): # ← ★ 1. header_info を受け取る
+        super().__init__(*args, **kwargs)
+        self.header_info = header_info or {} # ← ★ 2. 受け取った情報をselfに保存
+        # 分割して描画するときの、このファイルの1ページ目より前のページ数と、レポート全体のページ数
+        self.page_offset = page_offset
+        self.total_pages = total_pages
+        try:
+            # フォント設定は変更なし
+            font_path = get_japanese_font_path()
+            self.add_font('ipaexg', '', font_path, uni=True)
+            self.add_font('ipaexg', 'B', font_path, uni=True)
+            self.set_font('ipaexg', '', 12)
+        except Exception as e:
+            print(f"フォントの読み込みに失敗しました: {e}")
+            self.set_font('Arial', '', 12)
+
+    def header(self):
+        # --- 受け取ったヘッダー情報を使って動的なタイトルを生成 ---
+        title = self.header_info.get("auction_venue", "車両価値算定レポート")
+        date = self.header_info.get("auction_date", "")
+        corner = self.header_info.get("auction_corner", "") # コーナー名を取得
+
+        self.set_font('ipaexg', 'B', 15)
+        self.cell(0, 10, title, 0, 1, 'C')
+
+        # 日付とコーナー名をサブタイトルとして表示
+        subtitle = f"({date}開催分 / {corner}コーナー)" if date and corner else f"({date}開催分)" if date else ""
+        if subtitle:
+            self.set_font('ipaexg', '', 10)
+            self.cell(0, 7, subtitle, 0, 1, 'C')
+
+        self.ln(5)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('ipaexg', '', 8)
+        page = self.page_offset + self.page_no()
+        label = f'Page {page} / {self.total_pages}' if self.total_pages else f'Page {page}'
+        self.cell(0, 10, label, 0, 0, 'C')
+
+
+# 表形式 (CSV/Excel) の出力では数値のまま書き、PDFでは桁区切りにする列
+AMOUNT_COLUMNS = {"E/G価値", "素材価値"}
+# 過去相場の列は、値としては落札価格の中央値 (無ければ None) を持ち、PDFでは件数と合わせた文字列にする
+PAST_PRICE_COLUMN = "過去相場"
+
+
+def format_past_price(past_price, sample_size) -> str:
+    return f"{past_price:,.0f} ({sample_size or 0}件)" if past_price is not None else "-"
+
+
+def build_report_values(res: dict) -> list:
+    """算定結果1件を、レポートの1行分の値のリストに変換する (金額と過去相場の列は数値のまま)"""
+    breakdown = res.get('breakdown', {})
+
+    material_value = (
+        breakdown.get('プレス材 (鉄)', 0) +
+        breakdown.get('甲山 (ミックスメタル)', 0) +
+        breakdown.get('ハーネス (銅)', 0)
+    )
+
+    # ▼▼▼ 2つの評価点を結合するロジックを追加 ▼▼▼
+    score = res.get('evaluation_score', '')
+    interior = res.get('evaluation_interior', '')
+    evaluation_text = f"{score} / {interior}" if score and interior else score or interior
+
+    # ▼▼▼ row_dataリストの定義を修正 ▼▼▼
+    return [
+        res.get('auction_no', ''),
+        res.get('maker', ''),
+        res.get('car_name', ''),
+        res.get('grade', ''),
+        res.get('year', ''),
+        res.get('model_code', ''),
+        str(res.get('displacement_cc', '')),
+        str(res.get('inspection_date', '')),
+        str(res.get('mileage_km', '')),
+        res.get('shift', ''),
+        evaluation_text,
+        str(res.get('total_weight_kg', '')),
+        breakdown.get('エンジン部品販売', '×'),
+        breakdown.get('エンジン/ミッション', 0),
+        material_value,
+        res.get('past_auction_price'),
+        res.get('bidding_recommendation', '?'),
+        '' # メモ欄
+    ]
+
+
+def build_report_row(res: dict, target_model_set: frozenset):
+    """算定結果1件を、レポートの1行分の文字列のリストに変換し、(セルの値, 注目車種か) を返す"""
+    row_data = build_report_values(res)
+    cells = []
+    for (header, _), data in zip(REPORT_HEADERS, row_data):
+        if header in AMOUNT_COLUMNS:
+            cells.append(f"{data:,.0f}")
+        elif header == PAST_PRICE_COLUMN:
+            cells.append(format_past_price(data, res.get('past_auction_sample_size')))
+        else:
+            cells.append(str(data))
+    return cells, res.get('model_code', '') in target_model_set
+
+
+def _new_pdf(header_info: dict, page_offset: int = 0, total_pages: int = None) -> PDF:
+    pdf = PDF(header_info=header_info, page_offset=page_offset, total_pages=total_pages, orientation='L') # PDFクラスにヘッダー情報を渡す
+    # 改ページは paginate_rows で決めた位置で明示的に行う (分割描画でも同じページ割りになるように)
+    pdf.set_auto_page_break(False, margin=20)
+    return pdf
+
+
+def paginate_rows(rows: list, header_info: dict) -> list:
+    """
+    行をページごとに分ける。1ページ目は表の見出しの分だけ行数が少ない
+    1ページに入る行数は、実際にヘッダーを描画した後の位置と改ページの位置から求める
+    """
+    pdf = _new_pdf(header_info)
+    pdf.add_page()
+    available = pdf.page_break_trigger - pdf.get_y()
+    rows_per_page = max(int((available + 1e-6) // ROW_HEIGHT), 1)
+    first_page_rows = max(int((available - HEADER_ROW_HEIGHT + 1e-6) // ROW_HEIGHT), 1)
+
+    pages = [rows[:first_page_rows]]
+    for start in range(first_page_rows, len(rows), rows_per_page):
+        pages.append(rows[start:start + rows_per_page])
+    return pages
+
+
+def layout_sections(sections: list) -> list:
+    """
+    [(header_info, 行のリスト), ...] をページのリストにする
+    各ページは (header_info, そのページの行, 表の見出しを描くか) で、見出しは各セクションの1ページ目にだけ描く
+    """
+    pages = []
+    for header_info, rows in sections:
+        section_pages = paginate_rows(rows, header_info) if rows else [[]]
+        pages.extend((header_info, page_rows, i == 0) for i, page_rows in enumerate(section_pages))
+    return pages
+
+
+def render_pages(pages: list, page_offset: int = 0, total_pages: int = None) -> bytes:
+    """layout_sections で作ったページを描画してPDFのバイト列を返す"""
+    pdf = _new_pdf({}, page_offset, total_pages)
+    widths = [w for h, w in REPORT_HEADERS]
+
+    for header_info, page_rows, draw_table_header in pages:
+        # ページ上部のタイトルは、そのページが属するシートのヘッダー情報で描く
+        pdf.header_info = header_info
+        pdf.add_page()
+        if draw_table_header:
+            pdf.set_font('ipaexg', 'B', 7)
+            for header, width in REPORT_HEADERS:
+                pdf.cell(width, HEADER_ROW_HEIGHT, header, border=1, align='C')
+            pdf.ln()
+        pdf.set_font('ipaexg', 'B', 7)
+        pdf.set_fill_color(220, 220, 220)
+
+        for cells, is_target in page_rows:
+            if is_target:
+                pdf.set_text_color(0, 0, 0)
+                should_fill = False
+            else:
+                pdf.set_text_color(100, 100, 100)
+                should_fill = True
+            for data, width in zip(cells, widths):
+                pdf.cell(width, ROW_HEIGHT, data, border=1, fill=should_fill, align='C')
+            pdf.ln()
+
+        pdf.set_text_color(0, 0, 0)
+    return bytes(pdf.output())
+
+
+def _render_chunk(args) -> bytes:
+    return render_pages(*args)
+
+
+# 並列描画用のワーカープロセスのプール。APIの起動時 (lifespan) に start_render_pool で1度だけ作り、
+# リクエストごとにプロセスを起動し直さない。作られていなければ常に1プロセスで描画する
+_render_pool = None
+_render_pool_workers = 0
+
+
+def start_render_pool(workers: int = None):
+    """
+    描画用のプロセスプールを作って返す。pypdf が無い、またはワーカー数が1以下 (1コアのマシン) の場合は作らずに None を返す
+    1コアでは塊に分けて別プロセスで描いても速くならず、連結の分だけ遅くなるため
+    """
+    global _render_pool, _render_pool_workers
+    workers = workers or config.REPORT_RENDER_WORKERS or os.cpu_count() or 1
+    if _render_pool is None and HAS_PYPDF and workers > 1:
+        _render_pool = ProcessPoolExecutor(max_workers=workers)
+        _render_pool_workers = workers
+    return _render_pool
+
+
+def warm_render_pool():
+    """各ワーカーで空のレポートを1回描画し、プロセスの起動と日本語フォントの読み込みを済ませておく"""
+    if _render_pool is not None:
+        empty = (layout_sections([({}, [])]), 0, None)
+        list(_render_pool.map(_render_chunk, [empty] * _render_pool_workers))
+
+
+def shutdown_render_pool():
+    global _render_pool, _render_pool_workers
+    if _render_pool is not None:
+        _render_pool.shutdown()
+        _render_pool, _render_pool_workers = None, 0
+
+
+def render_report(rows: list, header_info: dict, output_path: str) -> str:
+    """1枚のシートのレポートを output_path に書き出す"""
+    return render_sections([(header_info, rows)], output_path)
+
+
+def render_sections(sections: list, output_path: str) -> str:
+    """
+    シートごとのセクション [(header_info, 行のリスト), ...] を、1つのレポートとして output_path に書き出す
+    描画用のプールがあり、ページ数が多い場合は、ページを塊に分けてワーカーで並列に描画し、1つのPDFへ連結する
+    塊はワーカー数の2倍までしか同時に投入せず、描き終わった塊から順に連結していくので、
+    描画済みの塊のバイト列が溜まらない (連結後の文書は書き出すまで PdfWriter が持つ)
+    """
+    pages = layout_sections(sections)
+    total_pages = len(pages)
+
+    if _render_pool is None or total_pages < config.REPORT_PARALLEL_MIN_PAGES:
+        with open(output_path, 'wb') as f:
+            f.write(render_pages(pages, 0, total_pages))
+        return output_path
+
+    # 塊はワーカー数で均等に分けるが、1つの塊が REPORT_PAGES_PER_CHUNK ページを超えないようにする
+    chunk_pages = min(config.REPORT_PAGES_PER_CHUNK, -(-total_pages // _render_pool_workers))
+    jobs = (
+        (pages[start:start + chunk_pages], start, total_pages)
+        for start in range(0, total_pages, chunk_pages)
+    )
+    writer = PdfWriter()
+    in_flight = deque()
+    for job in jobs:
+        in_flight.append(_render_pool.submit(_render_chunk, job))
+        if len(in_flight) >= _render_pool_workers * 2:
+            # 先に投入した塊から順に連結するので、ページ順は保たれる
+            writer.append(io.BytesIO(in_flight.popleft().result()))
+    while in_flight:
+        writer.append(io.BytesIO(in_flight.popleft().result()))
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+    return output_path
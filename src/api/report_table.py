@@ -0,0 +1,98 @@
+# src/api/report_table.py
+
+import csv
+import io
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+from src.api.report_pdf import REPORT_HEADERS, AMOUNT_COLUMNS, PAST_PRICE_COLUMN, build_report_values
+
+# 過去相場はPDFでは「中央値 (件数)」の文字列だが、表形式では並べ替え・計算できるよう数値の2列に分ける
+PAST_PRICE_TABLE_HEADERS = ["過去相場 (中央値)", "過去相場 (件数)"]
+
+# PDFレポートと同じ列に、注目車種かどうかの列を加える (並べ替え・絞り込み用)
+TABLE_HEADERS = [
+    name
+    for header, _ in REPORT_HEADERS
+    for name in (PAST_PRICE_TABLE_HEADERS if header == PAST_PRICE_COLUMN else [header])
+] + ["注目車種"]
+TABLE_AMOUNT_COLUMNS = AMOUNT_COLUMNS | {PAST_PRICE_TABLE_HEADERS[0]}
+
+# PDFと同じく、注目車種以外の行は灰色の背景・文字にする
+NON_TARGET_FILL = PatternFill(fill_type="solid", start_color="DCDCDC", end_color="DCDCDC")
+NON_TARGET_FONT = Font(color="646464")
+
+
+def build_table_row(res: dict, target_model_set: frozenset):
+    """算定結果1件を表形式の1行 (金額・過去相場は数値。過去相場が無ければ空欄) に変換し、(値のリスト, 注目車種か) を返す"""
+    is_target = res.get('model_code', '') in target_model_set
+    values = []
+    for (header, _), value in zip(REPORT_HEADERS, build_report_values(res)):
+        if header == PAST_PRICE_COLUMN:
+            values += [value, res.get('past_auction_sample_size') if value is not None else None]
+        else:
+            values.append(value)
+    return values + ["〇" if is_target else ""], is_target
+
+
+def iter_report_csv(records, target_model_set: frozenset):
+    """
+    算定結果を1行ずつCSVの文字列にして返す (StreamingResponse 用)
+    records は算定しながら1件ずつ結果を返すイテレータでよく、算定が終わった行から順にダウンロードが進む
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return line
+
+    # Excelで開いたときに文字化けしないよう、BOM付きのUTF-8にする
+    buffer.write("\ufeff")
+    writer.writerow(TABLE_HEADERS)
+    yield flush()
+    for res in records:
+        if not res or "error" in res:
+            continue
+        values, _ = build_table_row(res, target_model_set)
+        writer.writerow(values)
+        yield flush()
+
+
+def write_report_xlsx(records, target_model_set: frozenset, output_path: str) -> str:
+    """
+    算定結果をExcelファイルに書き出す
+    書き込み専用モードなので、行は算定した順にファイルへ流れ、シート全体をメモリに保持しない
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title="算定結果")
+    column_widths = dict(REPORT_HEADERS)
+    for i, header in enumerate(TABLE_HEADERS, start=1):
+        # PDFの列幅 (mm) を、おおよその文字数に換算する (過去相場の2列は、元の列幅をそれぞれに使う)
+        width = column_widths.get(header, column_widths[PAST_PRICE_COLUMN] if header in PAST_PRICE_TABLE_HEADERS else 10)
+        sheet.column_dimensions[get_column_letter(i)].width = max(width * 0.6, 6)
+    sheet.freeze_panes = "A2"
+    sheet.append(TABLE_HEADERS)
+
+    amount_indexes = {i for i, header in enumerate(TABLE_HEADERS) if header in TABLE_AMOUNT_COLUMNS}
+    for res in records:
+        if not res or "error" in res:
+            continue
+        values, is_target = build_table_row(res, target_model_set)
+        row = []
+        for i, value in enumerate(values):
+            cell = WriteOnlyCell(sheet, value=value)
+            if i in amount_indexes:
+                cell.number_format = "#,##0"
+            if not is_target:
+                cell.fill = NON_TARGET_FILL
+                cell.font = NON_TARGET_FONT
+            row.append(cell)
+        sheet.append(row)
+
+    workbook.save(output_path)
+    return output_path
+
@@ -0,0 +1,46 @@
+# src/api/warmup.py
+
+import threading
+import time
+import traceback
+
+# 起動時の準備 (ウォームアップ) の状態。/api/ready は status が "ready" になるまで 503 を返す
+# status: "pending" (未開始) -> "warming" (実行中) -> "ready" (完了) / "failed" (失敗)
+_state = {"status": "pending", "steps": {}, "error": None, "elapsed_seconds": None}
+
+
+def run_warmup(steps: list):
+    """
+    steps の (名前, 関数) を順に実行し、手順ごとの所要時間を記録する
+    1つでも失敗した場合は "failed" のままにして、準備が不完全なワーカーにリクエストが来ないようにする
+    """
+    _state.update(status="warming", steps={}, error=None, elapsed_seconds=None)
+    started_at = time.perf_counter()
+    for name, func in steps:
+        step_started_at = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            print(f"❌ 起動時の準備 '{name}' に失敗しました: {e}")
+            traceback.print_exc()
+            _state.update(status="failed", error=f"{name}: {e}")
+            return
+        _state["steps"][name] = round(time.perf_counter() - step_started_at, 3)
+
+    _state.update(status="ready", elapsed_seconds=round(time.perf_counter() - started_at, 3))
+    print(f"✅ 起動時の準備が完了しました ({_state['elapsed_seconds']}秒): {_state['steps']}")
+
+
+def start_warmup(steps: list) -> threading.Thread:
+    """ウォームアップをバックグラウンドのスレッドで開始する (その間も /api/health などには応答できる)"""
+    thread = threading.Thread(target=run_warmup, args=(steps,), name="api-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready() -> bool:
+    return _state["status"] == "ready"
+
+
+def get_warmup_status() -> dict:
+    return {**_state, "steps": dict(_state["steps"])}
@@ -17,11 +17,47 @@ DB_PATH = DATA_DIR / "vehicle_database.db"
 
 # インプットファイルのパス
 AUCTION_SHEETS_DIR = INPUT_DIR / "auction_sheets"
+PROCUREMENT_RECORDS_DIR = INPUT_DIR / "procurement_records"
+SALES_RECORDS_DIR = INPUT_DIR / "sales_records"
+AUCTION_RESULTS_DIR = INPUT_DIR / "auction_results"
 ENGINE_VALUE_PATH = INPUT_DIR / "engine_value.csv"
 CATALYST_VALUE_PATH = INPUT_DIR / "catalyst_value.csv"
 
 # アウトプットファイルのパス
 VEHICLE_VALUE_LIST_PATH = OUTPUT_DIR / "vehicle_value_list.csv"
+VEHICLE_VALUE_LIST_PARQUET_PATH = OUTPUT_DIR / "vehicle_value_list.parquet"
+# 出品データの履歴 (開催月ごとにパーティション分割したParquetデータセット)
+AUCTION_HISTORY_DIR = OUTPUT_DIR / "auction_history"
+
+# 生成AIの設定
+LLM_MODEL_NAME = "gemini-1.5-flash"
+# 使用するバックエンド ("gemini": 本番API, "stub": オフライン用スタブ, "replay": キャッシュ済み応答のみ)
+# 環境変数 LLM_BACKEND で上書きできる
+LLM_BACKEND = "gemini"
+# LLM応答キャッシュの有効期限 (日)。"UNKNOWN" などの否定的な結果は短めに保持する
+LLM_CACHE_TTL_DAYS = 180
+LLM_CACHE_NEGATIVE_TTL_DAYS = 30
+# 1回のプロンプトでまとめて問い合わせる最大件数
+LLM_BATCH_SIZE = 20
+
+# レポートPDFの並列描画 (pypdf がインストールされている場合のみ)
+# この枚数以上のレポートは、ページを塊に分けてワーカープロセスで描画して連結する
+REPORT_PARALLEL_MIN_PAGES = 20
+# 1つの塊の最大ページ数 (ワーカー1つあたりのメモリ使用量の上限になる)
+# 塊ごとにフォントの読み込みなどの固定費がかかるため、これ以下ならワーカー数で均等に分ける
+REPORT_PAGES_PER_CHUNK = 50
+# ワーカープロセス数 (None ならCPUコア数)。プールはAPIの起動時に1度だけ作り、1以下なら作らずに1プロセスで描画する
+REPORT_RENDER_WORKERS = None
+
+# /api/analyze-sheets (複数シートの一括算定) で一度に受け付けるシート数の上限と、
+# PDFを並列に読み取るワーカープロセス数 (None ならCPUコア数)
+MAX_BATCH_SHEETS = 20
+SHEET_PARSE_WORKERS = None
+
+# エンジン部品の市場価格は、直近この月数の販売実績の平均を使う
+# 期間内の件数が COMPONENT_PRICE_WINDOW_MIN_SAMPLES 未満なら、全期間の平均を使う
+COMPONENT_PRICE_WINDOW_MONTHS = 12
+COMPONENT_PRICE_WINDOW_MIN_SAMPLES = 3
 
 # ▼▼▼ この単価マスターをファイル末尾に追加 ▼▼▼
 # 価値算定のための単価・固定価格リスト (円)
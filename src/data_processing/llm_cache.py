@@ -0,0 +1,125 @@
+# src/data_processing/llm_cache.py
+
+import json
+import math
+import hashlib
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, func, cast, Integer
+from src import config
+from src.db.database import engine
+from src.db.models import LLMResponseCache
+from src.utils import normalize_text
+
+# キャッシュの利用状況 (プロセス内の累計)
+CACHE_STATS = Counter()
+
+_table_ready = False
+
+
+def _ensure_table():
+    """キャッシュテーブルが無ければ作成する (初回のみ)"""
+    global _table_ready
+    if not _table_ready:
+        LLMResponseCache.__table__.create(engine, checkfirst=True)
+        _table_ready = True
+
+
+def _normalize_input_value(value) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return normalize_text(str(value))
+
+
+def make_cache_key(function_name: str, inputs: dict, model_name: str, prompt_version: str) -> str:
+    """関数名・正規化済み入力・モデル名・プロンプト版からキャッシュキーを作る"""
+    normalized = {k: _normalize_input_value(v) for k, v in sorted(inputs.items())}
+    payload = json.dumps(
+        [function_name, normalized, model_name, prompt_version], ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cached(function_name: str, inputs: dict, model_name: str, prompt_version: str):
+    """
+    キャッシュを検索し、(見つかったか, 値) を返す
+    有効期限切れのエントリは削除して「見つからない」扱いにする
+    """
+    _ensure_table()
+    key = make_cache_key(function_name, inputs, model_name, prompt_version)
+    table = LLMResponseCache.__table__
+    now = datetime.utcnow()
+
+    with engine.begin() as connection:
+        row = connection.execute(
+            select(table.c.response_json, table.c.is_negative, table.c.created_at).where(table.c.cache_key == key)
+        ).first()
+        if row is None:
+            CACHE_STATS["misses"] += 1
+            return False, None
+
+        ttl_days = config.LLM_CACHE_NEGATIVE_TTL_DAYS if row.is_negative else config.LLM_CACHE_TTL_DAYS
+        if row.created_at < now - timedelta(days=ttl_days):
+            connection.execute(delete(table).where(table.c.cache_key == key))
+            CACHE_STATS["expired"] += 1
+            CACHE_STATS["misses"] += 1
+            return False, None
+
+        connection.execute(
+            update(table).where(table.c.cache_key == key).values(hit_count=table.c.hit_count + 1, last_hit_at=now)
+        )
+
+    CACHE_STATS["negative_hits" if row.is_negative else "hits"] += 1
+    return True, json.loads(row.response_json)
+
+
+def set_cached(function_name: str, inputs: dict, model_name: str, prompt_version: str, value, is_negative: bool = False):
+    """応答をキャッシュに保存する (同じキーがあれば上書き)"""
+    _ensure_table()
+    key = make_cache_key(function_name, inputs, model_name, prompt_version)
+    table = LLMResponseCache.__table__
+
+    with engine.begin() as connection:
+        connection.execute(delete(table).where(table.c.cache_key == key))
+        connection.execute(
+            table.insert().values(
+                cache_key=key,
+                function_name=function_name,
+                model_name=model_name,
+                prompt_version=prompt_version,
+                inputs_json=json.dumps(inputs, ensure_ascii=False, default=str),
+                response_json=json.dumps(value, ensure_ascii=False),
+                is_negative=is_negative,
+                hit_count=0,
+                created_at=datetime.utcnow(),
+            )
+        )
+    CACHE_STATS["writes"] += 1
+
+
+def get_cache_stats() -> dict:
+    """キャッシュ統計 (ヒット数・ミス数・API呼び出し数・DB内の件数) を返す"""
+    _ensure_table()
+    table = LLMResponseCache.__table__
+    with engine.connect() as connection:
+        stored, stored_negative = connection.execute(
+            select(func.count(), func.coalesce(func.sum(cast(table.c.is_negative, Integer)), 0))
+        ).one()
+
+    stats = dict(CACHE_STATS)
+    stats["stored_entries"] = stored
+    stats["stored_negative_entries"] = stored_negative
+    lookups = CACHE_STATS["hits"] + CACHE_STATS["negative_hits"] + CACHE_STATS["misses"]
+    stats["hit_rate"] = (CACHE_STATS["hits"] + CACHE_STATS["negative_hits"]) / lookups if lookups else 0.0
+    return stats
+
+
+def print_cache_stats():
+    stats = get_cache_stats()
+    print("--- LLMキャッシュ統計 ---")
+    print(f"ヒット: {stats.get('hits', 0)}件 (否定的結果: {stats.get('negative_hits', 0)}件)")
+    print(f"ミス: {stats.get('misses', 0)}件 (期限切れ: {stats.get('expired', 0)}件)")
+    print(f"API呼び出し: {stats.get('network_calls', 0)}回")
+    print(f"ヒット率: {stats['hit_rate']:.1%}")
+    print(f"保存済みエントリ: {stats['stored_entries']}件 (否定的結果: {stats['stored_negative_entries']}件)")
+    print("------------------------")
@@ -1,35 +1,169 @@
 import os
 import json
-import google.generativeai as genai
-from dotenv import load_dotenv
-
-# .envファイルから環境変数を読み込む
-load_dotenv()
-
-# APIキーを設定
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("APIキーが設定されていません。.envファイルを確認してください。")
-genai.configure(api_key=api_key)
-
-# モデルを設定
-generation_config = {
-  "temperature": 0.2,
-  "top_p": 1,
-  "top_k": 1,
-  "max_output_tokens": 2048,
+import time
+from abc import ABC, abstractmethod
+from src import config
+from src.data_processing.llm_cache import get_cached, set_cached, CACHE_STATS
+from src.utils import normalize_text
+
+# プロンプトの版数。プロンプトを変更したら上げること (古いキャッシュが使われなくなる)
+SPECS_PROMPT_VERSION = "v1"
+ENGINE_PROMPT_VERSION = "v1"
+
+
+class LLMUnavailableError(RuntimeError):
+    """バックエンドが応答を返せない場合 (キャッシュ再生モードでの未登録入力など)"""
+
+
+class LLMBackend(ABC):
+    """生成AIバックエンドの共通インターフェース (generate を実装しないサブクラスはインスタンス化できない)"""
+    model_name = config.LLM_MODEL_NAME
+    use_cache = True # 応答キャッシュを読み書きするか
+
+    @abstractmethod
+    def generate(self, prompt: str) -> str:
+        """プロンプトに対する応答のテキストを返す"""
+
+
+class GeminiBackend(LLMBackend):
+    """Gemini API を呼び出す本番用バックエンド。初回の呼び出し時にクライアントを構築する"""
+
+    def __init__(self):
+        self._model = None
+
+    def _get_model(self):
+        if self._model is None:
+            import google.generativeai as genai
+            from dotenv import load_dotenv
+
+            # .envファイルから環境変数を読み込む
+            load_dotenv()
+
+            # APIキーを設定
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("APIキーが設定されていません。.envファイルを確認してください。")
+            genai.configure(api_key=api_key)
+
+            # モデルを設定
+            generation_config = {
+              "temperature": 0.2,
+              "top_p": 1,
+              "top_k": 1,
+              "max_output_tokens": 2048,
+            }
+            self._model = genai.GenerativeModel(
+                model_name=self.model_name,
+                generation_config=generation_config
+            )
+        return self._model
+
+    def generate(self, prompt: str) -> str:
+        model = self._get_model()
+        CACHE_STATS["network_calls"] += 1
+        response = model.generate_content(prompt)
+        return response.text
+
+
+class StubBackend(LLMBackend):
+    """
+    ネットワークを使わない決定的なスタブ (オフライン動作確認用)
+    常に「特定できない」応答を返し、キャッシュは読み書きしない
+    """
+    model_name = "stub"
+    use_cache = False
+
+    def generate(self, prompt: str) -> str:
+        if "JSON配列" in prompt:
+            return "[]"
+        if "JSON形式" in prompt:
+            return "{}"
+        return "UNKNOWN"
+
+
+class ReplayBackend(LLMBackend):
+    """キャッシュ済みの応答だけを返すモード。キャッシュに無い入力は LLMUnavailableError になる"""
+
+    def generate(self, prompt: str) -> str:
+        raise LLMUnavailableError("キャッシュ再生モードのため、未登録の入力には問い合わせません")
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "stub": StubBackend,
+    "replay": ReplayBackend,
 }
-model = genai.GenerativeModel(
-    model_name="gemini-1.5-flash",
-    generation_config=generation_config
-)
+
+_backend = None
+
+
+def get_backend() -> LLMBackend:
+    """環境変数 LLM_BACKEND (gemini / stub / replay) に応じたバックエンドを初回呼び出し時に構築する"""
+    global _backend
+    if _backend is None:
+        name = os.getenv("LLM_BACKEND", config.LLM_BACKEND)
+        if name not in BACKENDS:
+            raise ValueError(f"不明なLLMバックエンドです: {name} (選択肢: {', '.join(BACKENDS)})")
+        _backend = BACKENDS[name]()
+    return _backend
+
+
+def set_backend(backend: LLMBackend):
+    """バックエンドを明示的に差し替える"""
+    global _backend
+    _backend = backend
+
+
+def _generate(prompt: str) -> str:
+    """選択中のバックエンドで生成AIを呼び出し、応答テキストを返す"""
+    return get_backend().generate(prompt)
+
+
+def _get_cached(function_name: str, inputs: dict, prompt_version: str):
+    backend = get_backend()
+    if not backend.use_cache:
+        return False, None
+    return get_cached(function_name, inputs, backend.model_name, prompt_version)
+
+
+def _set_cached(function_name: str, inputs: dict, prompt_version: str, value, is_negative: bool = False):
+    backend = get_backend()
+    if backend.use_cache:
+        set_cached(function_name, inputs, backend.model_name, prompt_version, value, is_negative=is_negative)
+
+
+def _parse_json_response(text: str):
+    """応答テキストからコードブロック記号を除去してJSONとして読み込む"""
+    return json.loads(text.strip().replace("```json", "").replace("```", ""))
+
+
+def _cache_specs(model_code: str, specs: dict):
+    # すべての値がnullの場合は「特定できなかった」結果として短期間だけキャッシュする
+    is_negative = not any(v is not None for v in specs.values())
+    _set_cached("get_specs_from_llm", {"model_code": model_code}, SPECS_PROMPT_VERSION, specs, is_negative=is_negative)
+
+
+def _cache_engine_answer(cache_inputs: dict, short_engine_model, full_model_name: str) -> str:
+    """エンジン型式の回答をキャッシュし、呼び出し元に返す値を決める"""
+    if "UNKNOWN" in full_model_name:
+        _set_cached("get_full_engine_model_from_llm", cache_inputs, ENGINE_PROMPT_VERSION, "UNKNOWN", is_negative=True)
+        return str(short_engine_model) # 不明な場合は元の短い名前を返す
+
+    _set_cached("get_full_engine_model_from_llm", cache_inputs, ENGINE_PROMPT_VERSION, full_model_name)
+    return full_model_name
 
 # src/data_processing/llm_client.py
 
 def get_specs_from_llm(model_code: str) -> dict: # 引数はmodel_codeのみ
     """
     生成AIを使用して車両のスペック情報を取得し、辞書形式で返す
+    一度回答を得た型式はキャッシュから返す
     """
+    cache_inputs = {"model_code": model_code}
+    found, cached_specs = _get_cached("get_specs_from_llm", cache_inputs, SPECS_PROMPT_VERSION)
+    if found:
+        return cached_specs
+
     prompt = f"""
 あなたは日本の自動車の専門家です。
 以下の車両型式に基づいて、メーカー、正式な車名、及び公開スペックを調べてJSON形式で回答してください。
@@ -64,13 +198,15 @@ def get_specs_from_llm(model_code: str) -> dict: # 引数はmodel_codeのみ
 """
 
     try:
-        response = model.generate_content(prompt)
-        json_text = response.text.strip().replace("```json", "").replace("```", "")
-        specs = json.loads(json_text)
-        return specs
+        specs = _parse_json_response(_generate(prompt))
+        if not isinstance(specs, dict):
+            raise ValueError("JSONオブジェクトではありません")
     except Exception as e:
         print(f"    - LLM APIエラー: 型式={model_code} ({e})")
-        return {} # エラー時は空の辞書を返す
+        return {} # エラー時は空の辞書を返す (キャッシュしない)
+
+    _cache_specs(model_code, specs)
+    return specs
 
 
 # src/data_processing/llm_client.py
@@ -80,7 +216,13 @@ def get_specs_from_llm(model_code: str) -> dict: # 引数はmodel_codeのみ
 def get_full_engine_model_from_llm(maker: str, model_code: str, short_engine_model: str) -> str:
     """
     AIを使い、不完全なエンジン型式から正式名称を推定する
+    一度回答を得た組み合わせ ("UNKNOWN" を含む) はキャッシュから返す
     """
+    cache_inputs = {"maker": maker, "model_code": model_code, "short_engine_model": short_engine_model}
+    found, full_model_name = _get_cached("get_full_engine_model_from_llm", cache_inputs, ENGINE_PROMPT_VERSION)
+    if found:
+        return str(short_engine_model) if full_model_name == "UNKNOWN" else full_model_name
+
     prompt = f"""
 あなたは日本の自動車エンジンに関する専門家です。
 以下の車両に搭載されているエンジンの、不完全な型式情報から、最も可能性の高い完全な正式名称を一つだけ回答してください。
@@ -97,10 +239,170 @@ def get_full_engine_model_from_llm(maker: str, model_code: str, short_engine_mod
 特定できない場合は "UNKNOWN" と回答してください。
 """
     try:
-        response = model.generate_content(prompt)
-        full_model_name = response.text.strip()
-        if "UNKNOWN" in full_model_name:
-            return str(short_engine_model) # 不明な場合は元の短い名前を返す
-        return full_model_name
+        full_model_name = _generate(prompt).strip()
     except Exception:
-        return str(short_engine_model) # エラー時も元の名前を返す
\ No newline at end of file
+        return str(short_engine_model) # エラー時も元の名前を返す (キャッシュしない)
+
+    return _cache_engine_answer(cache_inputs, short_engine_model, full_model_name)
+
+
+# --- 複数件をまとめて問い合わせるバッチ版 ---
+# 結果は単件版と同じキーでキャッシュするため、どちらの経路から呼んでも再利用される
+
+SPEC_FIELDS = ["maker", "car_name", "engine_model", "drive_type", "body_type", "total_weight_kg", "engine_weight_kg", "grade"]
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def get_specs_batch_from_llm(model_codes: list, batch_size: int = None) -> dict:
+    """
+    複数の型式のスペック情報を、最大batch_size件ずつ1回のプロンプトで取得する
+    戻り値は {型式: スペック辞書}。応答に含まれない・形式が不正な型式は単件版で取り直す
+    """
+    batch_size = batch_size or config.LLM_BATCH_SIZE
+    results = {}
+    pending = []
+    for model_code in dict.fromkeys(model_codes):
+        found, cached_specs = _get_cached("get_specs_from_llm", {"model_code": model_code}, SPECS_PROMPT_VERSION)
+        if found:
+            results[model_code] = cached_specs
+        else:
+            pending.append(model_code)
+
+    for batch_no, batch in enumerate(_chunks(pending, batch_size)):
+        if batch_no > 0:
+            time.sleep(0.1) # レートリミット対策
+        codes_text = "\n".join(f"- {code}" for code in batch)
+        prompt = f"""
+あなたは日本の自動車の専門家です。
+以下の車両型式それぞれについて、メーカー、正式な車名、及び公開スペックを調べてJSON配列で回答してください。
+
+# 車両型式の一覧:
+{codes_text}
+
+# 各要素に含める情報:
+- 型式 (model_code) ※一覧の表記をそのまま返してください
+- メーカー (maker)
+- 車名 (car_name)
+- エンジン型式 (engine_model)
+- 駆動方式 (drive_type)
+- ボディタイプ (body_type)
+- 車両総重量 (total_weight_kg)
+- エンジン単体重量 (engine_weight_kg)
+- グレード (grade)
+
+# 出力形式の例:
+```json
+[
+  {{
+    "model_code": "ZVW30",
+    "maker": "トヨタ",
+    "car_name": "プリウス",
+    "engine_model": "2ZR-FXE",
+    "drive_type": "HV",
+    "body_type": "セダン",
+    "total_weight_kg": 1350,
+    "engine_weight_kg": 120,
+    "grade": "S"
+  }}
+]
+```
+もし情報が見つからない、または特定できない場合は、該当する値を null としてください。
+一覧のすべての型式について1要素ずつ、余計な説明は含めずJSON配列のみを返してください。
+"""
+        answered = {}
+        try:
+            items = _parse_json_response(_generate(prompt))
+            if not isinstance(items, list):
+                raise ValueError("JSON配列ではありません")
+            requested = {normalize_text(code): code for code in batch}
+            for item in items:
+                if not isinstance(item, dict) or not isinstance(item.get("model_code"), str):
+                    continue
+                model_code = requested.get(normalize_text(item["model_code"]))
+                if model_code is not None:
+                    answered[model_code] = {field: item.get(field) for field in SPEC_FIELDS}
+        except Exception as e:
+            print(f"    - LLM APIエラー (バッチ {len(batch)}件): {e}")
+
+        for model_code in batch:
+            if model_code in answered:
+                _cache_specs(model_code, answered[model_code])
+                results[model_code] = answered[model_code]
+            else:
+                # 応答から漏れた型式は単件で問い合わせる
+                results[model_code] = get_specs_from_llm(model_code)
+
+    return results
+
+
+def get_full_engine_models_batch_from_llm(items: list, batch_size: int = None) -> dict:
+    """
+    (メーカー, 車両型式, 不完全なエンジン型式) のリストを受け取り、
+    最大batch_size件ずつ1回のプロンプトで正式名称を推定する
+    戻り値は {入力タプル: 正式名称}。応答に含まれない・形式が不正なものは単件版で取り直す
+    """
+    batch_size = batch_size or config.LLM_BATCH_SIZE
+    results = {}
+    pending = []
+    for item in dict.fromkeys(items):
+        maker, model_code, short_engine_model = item
+        cache_inputs = {"maker": maker, "model_code": model_code, "short_engine_model": short_engine_model}
+        found, full_model_name = _get_cached("get_full_engine_model_from_llm", cache_inputs, ENGINE_PROMPT_VERSION)
+        if found:
+            results[item] = str(short_engine_model) if full_model_name == "UNKNOWN" else full_model_name
+        else:
+            pending.append(item)
+
+    for batch_no, batch in enumerate(_chunks(pending, batch_size)):
+        if batch_no > 0:
+            time.sleep(0.1) # レートリミット対策
+        vehicles_text = "\n".join(
+            f"- id: {i} / メーカー: {maker or ''} / 車両型式: {model_code or ''} / 不完全なエンジン型式: {short or ''}"
+            for i, (maker, model_code, short) in enumerate(batch)
+        )
+        prompt = f"""
+あなたは日本の自動車エンジンに関する専門家です。
+以下の各車両に搭載されているエンジンについて、不完全な型式情報から、最も可能性の高い完全な正式名称を一つずつ回答してください。
+
+# 車両情報の一覧
+{vehicles_text}
+
+# 回答形式の例
+```json
+[
+  {{"id": 0, "full_engine_model": "1ZZ-FE"}},
+  {{"id": 1, "full_engine_model": "UNKNOWN"}}
+]
+```
+
+一覧のすべてのidについて1要素ずつ、余計な説明は含めずJSON配列のみを返してください。
+特定できない場合は "UNKNOWN" と回答してください。
+"""
+        answered = {}
+        try:
+            answers = _parse_json_response(_generate(prompt))
+            if not isinstance(answers, list):
+                raise ValueError("JSON配列ではありません")
+            for answer in answers:
+                if not isinstance(answer, dict):
+                    continue
+                idx, full_model_name = answer.get("id"), answer.get("full_engine_model")
+                if isinstance(idx, int) and 0 <= idx < len(batch) and isinstance(full_model_name, str) and full_model_name.strip():
+                    answered[idx] = full_model_name.strip()
+        except Exception as e:
+            print(f"    - LLM APIエラー (バッチ {len(batch)}件): {e}")
+
+        for idx, item in enumerate(batch):
+            maker, model_code, short_engine_model = item
+            if idx in answered:
+                cache_inputs = {"maker": maker, "model_code": model_code, "short_engine_model": short_engine_model}
+                results[item] = _cache_engine_answer(cache_inputs, short_engine_model, answered[idx])
+            else:
+                # 応答から漏れたものは単件で問い合わせる
+                results[item] = get_full_engine_model_from_llm(maker, model_code, short_engine_model)
+
+    return results
@@ -1,30 +1,33 @@
 import pandas as pd
-import time
-from src.data_processing.llm_client import get_specs_from_llm
+from src.data_processing.llm_client import get_specs_batch_from_llm
+
+# AIで拡充するスペック列。どれか1つでも欠けている車種が拡充の対象になる
+# (enrich_database.py の対象の抽出も同じ条件を使うため、ここを変えれば両方に反映される)
+SPEC_COLUMNS = ['engine_model', 'drive_type', 'body_type', 'total_weight_kg']
+
+
+def needs_specs(master_df: pd.DataFrame) -> pd.Series:
+    """型式があり、スペック列のどれかが欠けている行を True とする"""
+    has_code = master_df['model_code'].notna() & (master_df['model_code'] != '')
+    return has_code & master_df[SPEC_COLUMNS].isna().any(axis=1)
+
 
 def enrich_vehicle_data(master_df: pd.DataFrame) -> pd.DataFrame:
     print("  - AIによるデータ拡充処理を開始します...")
-    enriched_records = []
     total_vehicles = len(master_df)
 
-    for index, row in master_df.iterrows():
-        model_code = row.get('model_code')
-        print(f"    - 処理中 ({index + 1}/{total_vehicles}): 型式 ({model_code})")
-        
-        # 既に情報が十分にあればスキップ
-        if pd.notna(row.get('car_name')) and pd.notna(row.get('engine_model')):
-            print("      -> 既に情報があるためスキップします。")
-            enriched_records.append(row.to_dict())
-            continue
+    # 既にスペック情報が揃っている車種はスキップし、残りの型式をまとめてAIに問い合わせる
+    targets = needs_specs(master_df)
+    target_codes = list(master_df.loc[targets, 'model_code'])
+    print(f"    - {total_vehicles}件中 {int((~targets).sum())}件は既に情報があるためスキップします。")
+    print(f"    - {len(target_codes)}件の型式をまとめて問い合わせます...")
+    specs_by_code = get_specs_batch_from_llm(target_codes)
 
-        # AIに型式だけを渡す
-        specs = get_specs_from_llm(model_code)
-        
-        new_record = row.to_dict()
-        new_record.update(specs)
-        enriched_records.append(new_record)
-        
-        time.sleep(0.1)
+    enriched_records = []
+    for row, is_target in zip(master_df.to_dict('records'), targets):
+        if is_target:
+            row.update(specs_by_code.get(row.get('model_code'), {}))
+        enriched_records.append(row)
     
     print("  - データ拡充処理が完了しました。")
-    return pd.DataFrame(enriched_records)
\ No newline at end of file
+    return pd.DataFrame(enriched_records)
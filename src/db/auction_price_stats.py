@@ -0,0 +1,74 @@
+# src/db/auction_price_stats.py
+
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from src.db.bulk import iter_batches, bulk_upsert
+from src.db.models import AuctionResult, ModelPriceStats
+
+STATS_COLUMNS = ["sample_size", "median_price", "p25_price", "p75_price", "min_price", "max_price", "latest_auction_date"]
+
+# IN句のバインド変数が多くなりすぎないように、型式をこの件数ずつ処理する
+MODEL_CODE_BATCH_SIZE = 500
+
+
+def parse_auction_dates(values: pd.Series) -> pd.Series:
+    """落札結果CSVの開催日 ("2025/6/3" "2025-06-03" "2025年6月3日" など) を日付に変換する。読めない値は NaT"""
+    text_values = values.astype(str).str.strip().str.replace(r'(\d+)年(\d+)月(\d+)日', r'\1-\2-\3', regex=True)
+    return pd.to_datetime(text_values.where(values.notna()), errors='coerce', format='mixed')
+
+
+def refresh_model_price_stats(connection, model_codes) -> int:
+    """
+    指定した型式の落札価格の統計 (中央値・四分位・件数) を、落札結果全体から計算し直して保存する
+    中央値や四分位は差分の加算で求められないため、増えた型式についてだけ全件を読み直す。更新した型式数を返す
+    """
+    result = AuctionResult.__table__.c
+    now = datetime.utcnow()
+    refreshed = 0
+    for batch in iter_batches(sorted({code for code in model_codes if code}), MODEL_CODE_BATCH_SIZE):
+        prices_df = pd.read_sql(
+            select(result.model_code, result.winning_price, result.auction_date).where(result.model_code.in_(batch)),
+            connection
+        )
+        if prices_df.empty:
+            continue
+        # 開催日は文字列のまま比べると "2025/10/1" < "2025/9/1" になるため、日付に直してから最新を求める
+        prices_df['auction_date'] = parse_auction_dates(prices_df['auction_date'])
+        grouped = prices_df.groupby('model_code')
+        stats_df = grouped['winning_price'].agg(
+            sample_size='count', median_price='median', min_price='min', max_price='max'
+        )
+        stats_df['p25_price'] = grouped['winning_price'].quantile(0.25)
+        stats_df['p75_price'] = grouped['winning_price'].quantile(0.75)
+        stats_df['latest_auction_date'] = grouped['auction_date'].max().map(
+            lambda latest: None if pd.isna(latest) else latest.date().isoformat()
+        )
+
+        records = [
+            dict(record, updated_at=now)
+            for record in stats_df.reset_index()[['model_code'] + STATS_COLUMNS].to_dict('records')
+        ]
+        bulk_upsert(
+            connection, ModelPriceStats.__table__, records,
+            conflict_cols=["model_code"], update_cols=STATS_COLUMNS + ["updated_at"],
+        )
+        refreshed += len(records)
+    return refreshed
+
+
+def get_model_price_stats(connection, model_codes) -> dict:
+    """型式の集合に対する統計を {型式: 統計の辞書} としてまとめて引く (出品リスト1枚につき数回のクエリ。無い型式は含まない)"""
+    stats = ModelPriceStats.__table__.c
+    found = {}
+    for batch in iter_batches(sorted({code for code in model_codes if code}), MODEL_CODE_BATCH_SIZE):
+        try:
+            rows = connection.execute(
+                select(stats.model_code, *[stats[col] for col in STATS_COLUMNS]).where(stats.model_code.in_(batch))
+            ).mappings().all()
+        except OperationalError:
+            return {}  # 統計テーブルが未作成 (落札結果を一度も取り込んでいない)
+        for row in rows:
+            found[row["model_code"]] = {col: row[col] for col in STATS_COLUMNS}
+    return found
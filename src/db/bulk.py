@@ -0,0 +1,60 @@
+# src/db/bulk.py
+
+from sqlalchemy import Table
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+
+# 1回のexecutemanyで送る最大行数
+BULK_BATCH_SIZE = 1000
+# 複数行VALUESの1文にまとめる最大行数 (SQLiteのバインド変数上限に収まるように)
+UPSERT_BATCH_SIZE = 500
+
+
+def iter_batches(records: list, batch_size: int = BULK_BATCH_SIZE):
+    for start in range(0, len(records), batch_size):
+        yield records[start:start + batch_size]
+
+
+def insert_or_ignore(connection: Connection, table: Table, records: list, batch_size: int = BULK_BATCH_SIZE) -> int:
+    """
+    INSERT OR IGNORE でレコードをまとめて挿入し、実際に挿入された件数を返す
+    一意制約に違反する行 (既存の重複) は黙ってスキップされる
+    """
+    if not records:
+        return 0
+    stmt = table.insert().prefix_with("OR IGNORE")
+    inserted = 0
+    for batch in iter_batches(records, batch_size):
+        inserted += connection.execute(stmt, batch).rowcount
+    return inserted
+
+
+def insert_on_conflict_do_nothing(connection: Connection, table: Table, records: list, conflict_cols: list,
+                                  batch_size: int = BULK_BATCH_SIZE) -> int:
+    """
+    INSERT ... ON CONFLICT (conflict_cols) DO NOTHING でレコードをまとめて挿入し、実際に挿入された件数を返す
+    INSERT OR IGNORE と違い、スキップするのは conflict_cols の一意制約に当たった行だけで、
+    NOT NULL などそれ以外の制約違反は例外になる (不正な行を黙って捨てない)
+    """
+    if not records:
+        return 0
+    stmt = sqlite_insert(table).on_conflict_do_nothing(index_elements=conflict_cols)
+    inserted = 0
+    for batch in iter_batches(records, batch_size):
+        inserted += connection.execute(stmt, batch).rowcount
+    return inserted
+
+
+def bulk_upsert(connection: Connection, table: Table, records: list, conflict_cols: list, update_cols: list,
+                batch_size: int = UPSERT_BATCH_SIZE):
+    """
+    INSERT ... ON CONFLICT DO UPDATE でレコードをまとめて登録・更新する (1バッチ = 1文)
+    conflict_cols は一意制約と同じ列の組み合わせである必要がある
+    """
+    for batch in iter_batches(records, batch_size):
+        stmt = sqlite_insert(table).values(batch)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=conflict_cols,
+            set_={col: stmt.excluded[col] for col in update_cols},
+        )
+        connection.execute(stmt)
@@ -0,0 +1,30 @@
+# src/db/data_version.py
+
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+from src.db.models import DataVersion
+
+# 更新番号の名前
+TARGET_MODELS_VERSION = "targetmodel"
+
+
+def get_data_version(connection, name: str) -> int:
+    """指定した名前の更新番号を返す (未登録、またはテーブルが未作成なら0)"""
+    try:
+        version = connection.execute(select(DataVersion.version).where(DataVersion.name == name)).scalar()
+    except OperationalError:
+        return 0
+    return version or 0
+
+
+def bump_data_version(connection, name: str) -> int:
+    """更新番号を1つ進め、新しい番号を返す"""
+    stmt = sqlite_insert(DataVersion.__table__).values(name=name, version=1, updated_at=datetime.utcnow())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"version": DataVersion.__table__.c.version + 1, "updated_at": stmt.excluded.updated_at},
+    )
+    connection.execute(stmt)
+    return get_data_version(connection, name)
@@ -1,14 +1,65 @@
 # src/db/database.py
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text, UniqueConstraint
+from sqlmodel import SQLModel
 from sqlalchemy.orm import sessionmaker
 from src import config
 
 # SQLiteデータベースへの接続エンジンを作成
 engine = create_engine(
     f"sqlite:///{config.DB_PATH}",
-    connect_args={"check_same_thread": False} # SQLiteを使う場合のおまじない
+    # check_same_thread: SQLiteを使う場合のおまじない
+    # timeout: 並列インポート時に他のプロセスの書き込み完了を待つ秒数
+    connect_args={"check_same_thread": False, "timeout": 30}
 )
 
 # データベースと対話するための「セッション」を作成するクラス
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _missing_unique_constraints(connection, table_names=None):
+    """モデルの複合一意制約のうち、既存のテーブルに一意インデックスとしてまだ無いものを (テーブル, 制約) で返す"""
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables or (table_names is not None and table.name not in table_names):
+            continue
+        existing_keys = {tuple(u["column_names"]) for u in inspector.get_unique_constraints(table.name)}
+        existing_keys |= {tuple(i["column_names"]) for i in inspector.get_indexes(table.name) if i["unique"]}
+        for constraint in table.constraints:
+            if not isinstance(constraint, UniqueConstraint) or len(constraint.columns) < 2:
+                continue
+            if tuple(c.name for c in constraint.columns) not in existing_keys:
+                missing.append((table, constraint))
+    return missing
+
+
+def ensure_unique_constraints(connection):
+    """
+    モデルに後から追加した複合一意制約を、既存のテーブルにも一意インデックスとして作成する
+    (CREATE TABLE し直さずに済むように)。作成前に、キーが重複している古い行を削除して最新のものだけ残す
+    行を削除するので、migrate_db.py からだけ呼ぶ (取り込み処理からは check_unique_constraints で確認だけする)
+    """
+    for table, constraint in _missing_unique_constraints(connection):
+        cols = [c.name for c in constraint.columns]
+        col_list = ", ".join(cols)
+        not_null = " AND ".join(f"{c} IS NOT NULL" for c in cols)
+        connection.execute(text(
+            f"DELETE FROM {table.name} WHERE {not_null} AND id NOT IN "
+            f"(SELECT MAX(id) FROM {table.name} WHERE {not_null} GROUP BY {col_list})"
+        ))
+        connection.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {constraint.name} ON {table.name} ({col_list})"))
+
+
+def check_unique_constraints(connection, table_names: list):
+    """
+    取り込み処理が前提とする一意インデックス (ON CONFLICT のキー) があるかを確認し、無ければ例外を送出する
+    古いDBでは重複行の整理が必要になるため、ここでは作成せず migrate_db.py の実行を促す
+    """
+    missing = _missing_unique_constraints(connection, set(table_names))
+    if missing:
+        names = ", ".join(f"{table.name}({', '.join(c.name for c in constraint.columns)})" for table, constraint in missing)
+        raise RuntimeError(
+            f"一意インデックスが不足しています: {names}。先に 'python migrate_db.py' を実行してください。"
+        )
@@ -0,0 +1,67 @@
+# src/db/manifest.py
+
+import hashlib
+from pathlib import Path
+from datetime import datetime
+from sqlalchemy import select, delete
+from src import config
+from src.db.models import ImportManifest
+
+
+def _manifest_path(path: Path) -> str:
+    # プロジェクトのルートからの相対パスで記録する (別の環境にDBを移しても使えるように)
+    try:
+        return Path(path).resolve().relative_to(config.ROOT_DIR.resolve()).as_posix()
+    except ValueError:
+        return Path(path).resolve().as_posix()
+
+
+def file_hash(path: Path) -> str:
+    """ファイル内容のSHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def check_file(connection, source_kind: str, path: Path):
+    """
+    ファイルを取り込む必要があるかを判定し、(必要か, 指紋) を返す
+    サイズと更新日時が記録と同じならハッシュ計算を省略する。
+    日時だけが変わっていて内容が同じ場合は記録の日時を更新して「不要」とする
+    """
+    stat = Path(path).stat()
+    fingerprint = {"file_size": stat.st_size, "file_mtime": stat.st_mtime}
+    table = ImportManifest.__table__
+    row = connection.execute(
+        select(table.c.file_hash, table.c.file_size, table.c.file_mtime)
+        .where(table.c.source_kind == source_kind, table.c.file_path == _manifest_path(path))
+    ).first()
+
+    if row is not None and row.file_size == stat.st_size and row.file_mtime == stat.st_mtime:
+        return False, dict(fingerprint, file_hash=row.file_hash)
+
+    fingerprint["file_hash"] = file_hash(path)
+    if row is not None and row.file_hash == fingerprint["file_hash"]:
+        connection.execute(
+            table.update()
+            .where(table.c.source_kind == source_kind, table.c.file_path == _manifest_path(path))
+            .values(file_mtime=stat.st_mtime)
+        )
+        return False, fingerprint
+    return True, fingerprint
+
+
+def record_import(connection, source_kind: str, path: Path, fingerprint: dict, row_count: int):
+    """取り込みが完了したファイルをマニフェストに記録する (既存の記録は置き換える)"""
+    table = ImportManifest.__table__
+    connection.execute(
+        delete(table).where(table.c.source_kind == source_kind, table.c.file_path == _manifest_path(path))
+    )
+    connection.execute(
+        table.insert().values(
+            source_kind=source_kind, file_path=_manifest_path(path), row_count=row_count,
+            imported_at=datetime.utcnow(), **fingerprint
+        )
+    )
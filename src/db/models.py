@@ -1,6 +1,7 @@
 # src/db/models.py
 
 from sqlmodel import SQLModel, Field
+from sqlalchemy import UniqueConstraint
 from typing import Optional
 from datetime import date, datetime
 
@@ -27,6 +28,12 @@ class VehicleMaster(SQLModel, table=True):
 
 # ▼▼▼ このモデル定義をファイル末尾に追加 ▼▼▼
 class ComponentValue(SQLModel, table=True):
+    # 市場価格は (部品名, エンジン型式, タグ)、車種別の特別価格は (型式, 部品名) で一意
+    # (NULLは重複扱いされないため、それぞれ相手側のレコードには影響しない)
+    __table_args__ = (
+        UniqueConstraint("item_name", "engine_model", "details_tags", name="uq_componentvalue_engine_key"),
+        UniqueConstraint("model_code", "item_name", name="uq_componentvalue_model_key"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     item_name: str = Field(index=True)
     engine_model: Optional[str] = Field(default=None, index=True)
@@ -56,3 +63,177 @@ class SalesHistory(SQLModel, table=True):
 class TargetModel(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     model_code: str = Field(unique=True, index=True)
+
+class LLMResponseCache(SQLModel, table=True):
+    """生成AIの応答キャッシュ (関数名・正規化済み入力・モデル名・プロンプト版で一意)"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    cache_key: str = Field(unique=True, index=True)
+    function_name: str = Field(index=True)
+    model_name: str
+    prompt_version: str
+    inputs_json: str
+    response_json: str
+    is_negative: bool = Field(default=False)
+    hit_count: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_hit_at: Optional[datetime] = None
+
+class EngineModelMapping(SQLModel, table=True):
+    """販売実績の (メーカー, 車両型式, 不完全なエンジン型式) → 正式なエンジン型式 の対応表"""
+    __table_args__ = (
+        UniqueConstraint("maker", "vehicle_model_code", "short_engine_model", name="uq_enginemodelmapping_key"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    maker: str = Field(default="")
+    vehicle_model_code: str = Field(default="")
+    short_engine_model: str = Field(index=True)
+    full_engine_model: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ImportManifest(SQLModel, table=True):
+    """取り込み済みの入力ファイルの記録 (同じ内容のファイルを二度取り込まないために使う)"""
+    __table_args__ = (
+        UniqueConstraint("source_kind", "file_path", name="uq_importmanifest_file"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    source_kind: str = Field(index=True) # "procurement" / "sales" など
+    file_path: str
+    file_hash: str
+    file_size: int
+    file_mtime: float
+    row_count: int = Field(default=0)
+    imported_at: datetime = Field(default_factory=datetime.utcnow)
+
+class DataVersion(SQLModel, table=True):
+    """テーブルごとの更新番号。内容が変わるたびに増やし、読み手のキャッシュ更新の判定に使う"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(unique=True, index=True)
+    version: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class AuctionListing(SQLModel, table=True):
+    """出品リストPDFから取り込んだ出品1件ごとの記録 (会場・開催日・出品番号で一意)"""
+    __table_args__ = (
+        UniqueConstraint("auction_venue", "auction_date", "auction_no", name="uq_auctionlisting_key"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    auction_venue: str = Field(index=True)
+    auction_date: str = Field(index=True)
+    auction_no: str
+    auction_round: Optional[str] = None
+    auction_corner: Optional[str] = None
+
+    maker: Optional[str] = None
+    car_name: Optional[str] = None
+    grade: Optional[str] = None
+    year: Optional[str] = None
+    model_code: Optional[str] = Field(default=None, index=True)
+    displacement_cc: Optional[str] = None
+    inspection_date: Optional[str] = None
+    mileage_km: Optional[str] = None
+    color: Optional[str] = None
+    shift: Optional[str] = None
+    evaluation_score: Optional[str] = None
+    evaluation_interior: Optional[str] = None
+
+    source_file: str = Field(index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ModelCodeAlias(SQLModel, table=True):
+    """VehicleMaster に無い型式の表記 → 正式な型式 の対応表 (一度解決した表記を次回から即座に引けるように保存する)"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    alias: str = Field(unique=True, index=True)
+    model_code: str = Field(index=True)
+    match_type: str # "prefix_stripped" / "canonical_prefix" / "unique_extension"
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ComponentPriceObservation(SQLModel, table=True):
+    """
+    販売実績1行ごとの部品単価の記録。同じ内容のファイル (ハッシュが同じ) の同じ行は二度記録しない
+    (ファイル名を変えて取り込み直しても二重に数えない)。同じ名前のファイルが別の内容に置き換わった場合は、
+    古い内容の記録を取り消してから記録し直す
+    """
+    __table_args__ = (
+        UniqueConstraint("source_hash", "source_row", name="uq_componentpriceobservation_content"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    item_name: str = Field(index=True)
+    engine_model: str = Field(index=True)
+    details_tags: str = Field(default="standard")
+    price: float
+    observed_date: Optional[date] = Field(default=None, index=True)
+    source_file: str = Field(index=True)
+    source_hash: Optional[str] = None # 取り込んだファイルの内容のSHA-256
+    source_row: int
+    import_id: str = Field(index=True) # 記録した取り込み処理の識別子 (集計の差分更新に使う)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ComponentPriceAggregate(SQLModel, table=True):
+    """(部品名, エンジン型式, タグ) ごとの全期間の累計 (観測値が増えるたびに差分だけ加算する)"""
+    __table_args__ = (
+        UniqueConstraint("item_name", "engine_model", "details_tags", name="uq_componentpriceaggregate_key"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    item_name: str = Field(index=True)
+    engine_model: str = Field(index=True)
+    details_tags: str = Field(default="standard")
+    sample_size: int = Field(default=0)
+    price_sum: float = Field(default=0.0)
+    price_sum_sq: float = Field(default=0.0)
+    latest_date: Optional[date] = None
+    latest_price: Optional[float] = None
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ComponentPriceMonthly(SQLModel, table=True):
+    """(部品名, エンジン型式, タグ) ごと・月ごとの累計 (直近Nか月の平均などの計算に使う)"""
+    __table_args__ = (
+        UniqueConstraint("item_name", "engine_model", "details_tags", "month", name="uq_componentpricemonthly_key"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    item_name: str = Field(index=True)
+    engine_model: str = Field(index=True)
+    details_tags: str = Field(default="standard")
+    month: str = Field(index=True) # "YYYY-MM"
+    sample_size: int = Field(default=0)
+    price_sum: float = Field(default=0.0)
+    price_sum_sq: float = Field(default=0.0)
+
+class SalesRollup(SQLModel, table=True):
+    """落札実績の (型式, メーカー, 月) ごとの集計。仕入れ実績の取り込み時に、増えた行の属する組み合わせだけ集計し直す"""
+    __table_args__ = (
+        UniqueConstraint("model_code", "maker", "month", name="uq_salesrollup_key"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    model_code: str = Field(index=True)
+    maker: str = Field(index=True)
+    month: str = Field(index=True) # "YYYY-MM"
+    sales_count: int = Field(default=0)
+    distinct_buyers: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class AuctionResult(SQLModel, table=True):
+    """過去のオークションの落札結果 (会場・開催日・出品番号で一意)"""
+    __table_args__ = (
+        UniqueConstraint("auction_venue", "auction_date", "auction_no", name="uq_auctionresult_key"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    auction_venue: str = Field(index=True)
+    auction_date: str = Field(index=True)
+    auction_no: str
+    model_code: Optional[str] = Field(default=None, index=True)
+    winning_price: float
+    source_file: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ModelPriceStats(SQLModel, table=True):
+    """型式ごとの過去の落札価格の統計 (落札結果の取り込み時に、増えた型式だけ計算し直す)"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    model_code: str = Field(unique=True, index=True)
+    sample_size: int
+    median_price: float
+    p25_price: float
+    p75_price: float
+    min_price: float
+    max_price: float
+    latest_auction_date: Optional[str] = None
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
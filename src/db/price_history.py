@@ -0,0 +1,224 @@
+# src/db/price_history.py
+
+import math
+from datetime import date, datetime
+from sqlalchemy import text, select, func
+from src.db.bulk import insert_or_ignore, bulk_upsert
+from src.utils import month_window_start
+from src.db.models import ComponentPriceObservation, ComponentPriceAggregate, ComponentPriceMonthly, ComponentValue
+
+# 今回の取り込みで増えた観測値だけを集計し、全期間の累計に加算する
+# 最新の単価は「日付が新しい行 (同じ日付なら後の行)」。日付の無い行は日付のある行より古いものとして扱う
+_UPDATE_AGGREGATE_SQL = text("""
+    INSERT INTO componentpriceaggregate
+        (item_name, engine_model, details_tags, sample_size, price_sum, price_sum_sq, latest_date, latest_price, updated_at)
+    SELECT item_name, engine_model, details_tags, COUNT(*), SUM(price), SUM(price * price),
+           MAX(CASE WHEN rn = 1 THEN observed_date END), MAX(CASE WHEN rn = 1 THEN price END), :now
+    FROM (
+        SELECT *, ROW_NUMBER() OVER (
+            PARTITION BY item_name, engine_model, details_tags
+            ORDER BY observed_date IS NULL, observed_date DESC, id DESC
+        ) AS rn
+        FROM componentpriceobservation
+        WHERE import_id = :import_id
+    )
+    GROUP BY item_name, engine_model, details_tags
+    ON CONFLICT (item_name, engine_model, details_tags) DO UPDATE SET
+        sample_size = sample_size + excluded.sample_size,
+        price_sum = price_sum + excluded.price_sum,
+        price_sum_sq = price_sum_sq + excluded.price_sum_sq,
+        latest_price = CASE WHEN latest_date IS NULL OR excluded.latest_date >= latest_date
+                            THEN excluded.latest_price ELSE latest_price END,
+        latest_date = CASE WHEN latest_date IS NULL OR excluded.latest_date >= latest_date
+                           THEN excluded.latest_date ELSE latest_date END,
+        updated_at = excluded.updated_at
+""")
+
+_UPDATE_MONTHLY_SQL = text("""
+    INSERT INTO componentpricemonthly
+        (item_name, engine_model, details_tags, month, sample_size, price_sum, price_sum_sq)
+    SELECT item_name, engine_model, details_tags, substr(observed_date, 1, 7), COUNT(*), SUM(price), SUM(price * price)
+    FROM componentpriceobservation
+    WHERE import_id = :import_id AND observed_date IS NOT NULL
+    GROUP BY item_name, engine_model, details_tags, substr(observed_date, 1, 7)
+    ON CONFLICT (item_name, engine_model, details_tags, month) DO UPDATE SET
+        sample_size = sample_size + excluded.sample_size,
+        price_sum = price_sum + excluded.price_sum,
+        price_sum_sq = price_sum_sq + excluded.price_sum_sq
+""")
+
+# 取り消しで観測値が減った部品グループは、差し引きではなく残っている観測値から集計し直す
+# (最新の単価は差し引きでは求められないため)。対象のグループは一時テーブル tmp_price_groups に入れておく
+_REBUILD_AGGREGATE_SQL = text("""
+    INSERT INTO componentpriceaggregate
+        (item_name, engine_model, details_tags, sample_size, price_sum, price_sum_sq, latest_date, latest_price, updated_at)
+    SELECT item_name, engine_model, details_tags, COUNT(*), SUM(price), SUM(price * price),
+           MAX(CASE WHEN rn = 1 THEN observed_date END), MAX(CASE WHEN rn = 1 THEN price END), :now
+    FROM (
+        SELECT o.*, ROW_NUMBER() OVER (
+            PARTITION BY o.item_name, o.engine_model, o.details_tags
+            ORDER BY o.observed_date IS NULL, o.observed_date DESC, o.id DESC
+        ) AS rn
+        FROM componentpriceobservation AS o
+        JOIN tmp_price_groups USING (item_name, engine_model, details_tags)
+    )
+    GROUP BY item_name, engine_model, details_tags
+""")
+
+_REBUILD_MONTHLY_SQL = text("""
+    INSERT INTO componentpricemonthly
+        (item_name, engine_model, details_tags, month, sample_size, price_sum, price_sum_sq)
+    SELECT o.item_name, o.engine_model, o.details_tags, substr(o.observed_date, 1, 7), COUNT(*), SUM(o.price), SUM(o.price * o.price)
+    FROM componentpriceobservation AS o
+    JOIN tmp_price_groups USING (item_name, engine_model, details_tags)
+    WHERE o.observed_date IS NOT NULL
+    GROUP BY o.item_name, o.engine_model, o.details_tags, substr(o.observed_date, 1, 7)
+""")
+
+_GROUP_AGGREGATES_SQL = text("""
+    SELECT a.item_name, a.engine_model, a.details_tags, a.sample_size, a.price_sum, a.latest_price
+    FROM componentpriceaggregate AS a
+    JOIN tmp_price_groups USING (item_name, engine_model, details_tags)
+""")
+
+_GROUPS_IN_IMPORT_SQL = text("""
+    INSERT OR IGNORE INTO tmp_price_groups
+    SELECT DISTINCT item_name, engine_model, details_tags FROM componentpriceobservation WHERE import_id = :import_id
+""")
+
+_GROUPS_IN_RETRACTED_SQL = text("""
+    INSERT OR IGNORE INTO tmp_price_groups
+    SELECT DISTINCT item_name, engine_model, details_tags FROM componentpriceobservation
+    WHERE source_file = :source_file AND (source_hash IS NULL OR source_hash != :source_hash)
+""")
+
+
+def _reset_price_groups(connection):
+    connection.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS tmp_price_groups "
+        "(item_name VARCHAR, engine_model VARCHAR, details_tags VARCHAR, PRIMARY KEY (item_name, engine_model, details_tags))"
+    ))
+    connection.execute(text("DELETE FROM tmp_price_groups"))
+
+
+def _sync_component_values(connection, now: datetime) -> int:
+    """tmp_price_groups の部品グループについて、評価で参照する ComponentValue に全期間の平均を反映する"""
+    groups = connection.execute(text("SELECT item_name, engine_model, details_tags FROM tmp_price_groups")).all()
+    value_records = [
+        {
+            "item_name": row.item_name,
+            "engine_model": row.engine_model,
+            "details_tags": row.details_tags,
+            "latest_price": float(row.latest_price),
+            "average_price": row.price_sum / row.sample_size,
+            "sample_size": row.sample_size,
+            "updated_at": now,
+        }
+        for row in connection.execute(_GROUP_AGGREGATES_SQL)
+    ]
+    bulk_upsert(
+        connection, ComponentValue.__table__, value_records,
+        conflict_cols=["item_name", "engine_model", "details_tags"],
+        update_cols=["latest_price", "average_price", "sample_size", "updated_at"],
+    )
+    # 観測値が1件も残らなかったグループの市場価格は削除する (特別価格は model_code 付きなので対象外)
+    remaining = {(r["item_name"], r["engine_model"], r["details_tags"]) for r in value_records}
+    value = ComponentValue.__table__.c
+    for item_name, engine_model, details_tags in groups:
+        if (item_name, engine_model, details_tags) not in remaining:
+            connection.execute(ComponentValue.__table__.delete().where(
+                value.item_name == item_name, value.engine_model == engine_model,
+                value.details_tags == details_tags, value.model_code.is_(None),
+            ))
+    return len(value_records)
+
+
+def retract_source_observations(connection, source_file: str, source_hash: str) -> int:
+    """
+    source_file という名前で以前に取り込んだ、内容の異なる (ハッシュが違う) ファイルの観測値を取り消し、
+    該当する部品グループの累計・月別累計・ComponentValue を残りの観測値から作り直す
+    ファイルを編集して取り込み直したときに、古い内容が累計に残らないようにする。取り消した件数を返す
+    """
+    now = datetime.utcnow()
+    _reset_price_groups(connection)
+    params = {"source_file": source_file, "source_hash": source_hash}
+    connection.execute(_GROUPS_IN_RETRACTED_SQL, params)
+    retracted = connection.execute(text(
+        "DELETE FROM componentpriceobservation "
+        "WHERE source_file = :source_file AND (source_hash IS NULL OR source_hash != :source_hash)"
+    ), params).rowcount
+    if retracted == 0:
+        return 0
+
+    for table in ("componentpriceaggregate", "componentpricemonthly"):
+        connection.execute(text(
+            f"DELETE FROM {table} WHERE (item_name, engine_model, details_tags) IN "
+            f"(SELECT item_name, engine_model, details_tags FROM tmp_price_groups)"
+        ))
+    connection.execute(_REBUILD_AGGREGATE_SQL, {"now": now})
+    connection.execute(_REBUILD_MONTHLY_SQL)
+    _sync_component_values(connection, now)
+    return retracted
+
+
+def record_price_observations(connection, records: list, import_id: str) -> int:
+    """
+    部品単価の観測値を追記し、累計・月別累計・ComponentValue を差分だけ更新する
+    records は item_name / engine_model / details_tags / price / observed_date / source_file / source_hash / source_row を持つ辞書
+    既に記録済みの (source_hash, source_row) は無視されるため、同じ内容のファイルを取り込み直しても二重に数えない
+    1つのトランザクション内で呼ぶこと。戻り値は (新しく記録した件数, 更新した部品グループ数)
+    """
+    now = datetime.utcnow()
+    rows = [{**record, "import_id": import_id, "created_at": now} for record in records]
+    inserted = insert_or_ignore(connection, ComponentPriceObservation.__table__, rows)
+    if inserted == 0:
+        return 0, 0
+
+    params = {"import_id": import_id, "now": now}
+    connection.execute(_UPDATE_AGGREGATE_SQL, params)
+    connection.execute(_UPDATE_MONTHLY_SQL, params)
+
+    # 評価で参照する ComponentValue には全期間の平均を反映する
+    _reset_price_groups(connection)
+    connection.execute(_GROUPS_IN_IMPORT_SQL, params)
+    return inserted, _sync_component_values(connection, now)
+
+
+def get_price_stats(connection, item_name: str, engine_model: str, details_tags: str = "standard",
+                    months: int = None, as_of: date = None):
+    """
+    部品グループの価格統計を、集計済みの累計から返す (観測値の件数によらず一定のコスト)
+    months を指定すると、as_of (既定は今日) を含む直近 months か月の件数と平均も返す。該当が無ければ None
+    """
+    agg = ComponentPriceAggregate.__table__.c
+    row = connection.execute(
+        select(agg.sample_size, agg.price_sum, agg.price_sum_sq, agg.latest_date, agg.latest_price).where(
+            agg.item_name == item_name, agg.engine_model == engine_model, agg.details_tags == details_tags
+        )
+    ).first()
+    if row is None or not row.sample_size:
+        return None
+
+    mean = row.price_sum / row.sample_size
+    stats = {
+        "sample_size": row.sample_size,
+        "mean": mean,
+        "stddev": math.sqrt(max(row.price_sum_sq / row.sample_size - mean * mean, 0.0)),
+        "latest_date": row.latest_date,
+        "latest_price": row.latest_price,
+    }
+
+    if months:
+        as_of = as_of or date.today()
+        monthly = ComponentPriceMonthly.__table__.c
+        window_count, window_sum = connection.execute(
+            select(func.coalesce(func.sum(monthly.sample_size), 0), func.coalesce(func.sum(monthly.price_sum), 0.0)).where(
+                monthly.item_name == item_name, monthly.engine_model == engine_model,
+                monthly.details_tags == details_tags,
+                monthly.month >= month_window_start(as_of, months), monthly.month <= month_window_start(as_of, 1),
+            )
+        ).one()
+        stats["window_months"] = months
+        stats["window_sample_size"] = window_count
+        stats["window_mean"] = window_sum / window_count if window_count else None
+    return stats
@@ -0,0 +1,74 @@
+# src/db/sales_rollup.py
+
+from datetime import datetime
+from sqlalchemy import text, select, func, bindparam, DateTime
+from src.db.models import SalesHistory, SalesRollup
+
+# id > :since_id の行が属する (型式, メーカー, 月) だけを、落札実績全体から集計し直す
+# 取引先の重複除外は月をまたいで足し合わせられないため、差分の加算ではなく組み合わせ単位で再集計する
+_REFRESH_ROLLUP_SQL = text("""
+    INSERT INTO salesrollup (model_code, maker, month, sales_count, distinct_buyers, updated_at)
+    SELECT s.model_code, s.maker, substr(s.sale_date, 1, 7), COUNT(*), COUNT(DISTINCT s.buyer_name), :now
+    FROM saleshistory AS s
+    JOIN (
+        SELECT DISTINCT model_code, maker, substr(sale_date, 1, 7) AS month
+        FROM saleshistory
+        WHERE id > :since_id
+    ) AS k ON s.model_code = k.model_code AND s.maker = k.maker AND substr(s.sale_date, 1, 7) = k.month
+    GROUP BY s.model_code, s.maker, substr(s.sale_date, 1, 7)
+    ON CONFLICT (model_code, maker, month) DO UPDATE SET
+        sales_count = excluded.sales_count,
+        distinct_buyers = excluded.distinct_buyers,
+        updated_at = excluded.updated_at
+""").bindparams(bindparam("now", type_=DateTime()))
+
+
+def get_max_sales_id(connection) -> int:
+    """落札実績の最大ID (取り込み前に控えておき、refresh_sales_rollup に渡す)"""
+    return connection.execute(select(func.coalesce(func.max(SalesHistory.id), 0))).scalar()
+
+
+def refresh_sales_rollup(connection, since_id: int = 0) -> int:
+    """
+    落札実績のうち id > since_id の行が属する組み合わせを集計し直し、更新した組み合わせの数を返す
+    集計テーブルが空 (作成直後) の場合は、since_id によらず全件から作り直す
+    """
+    if not connection.execute(select(SalesRollup.id).limit(1)).first():
+        since_id = 0
+    return connection.execute(_REFRESH_ROLLUP_SQL, {"since_id": since_id, "now": datetime.utcnow()}).rowcount
+
+
+def ensure_sales_rollup(connection) -> int:
+    """
+    集計テーブルが無ければ作成し、空なら落札実績全体から作る (既存のDBで初めて使うとき用)
+    作った組み合わせの数を返す (既に集計済みなら0)
+    """
+    SalesRollup.__table__.create(connection, checkfirst=True)
+    if connection.execute(select(SalesRollup.id).limit(1)).first():
+        return 0
+    return refresh_sales_rollup(connection, since_id=0)
+
+
+def get_market_demand(connection, model_codes: list, start_month: str, end_month: str) -> dict:
+    """
+    型式ごとの需要 (落札件数・月ごとの取引先数) を月別集計から求める
+    start_month〜end_month ("YYYY-MM"、両端を含む) の範囲で、{型式: {"sales_count", "monthly": [...]}} を返す
+    """
+    rollup = SalesRollup.__table__.c
+    rows = connection.execute(
+        select(rollup.model_code, rollup.month,
+               func.sum(rollup.sales_count).label("sales_count"),
+               func.sum(rollup.distinct_buyers).label("distinct_buyers"))
+        .where(rollup.model_code.in_(model_codes), rollup.month >= start_month, rollup.month <= end_month)
+        .group_by(rollup.model_code, rollup.month)
+        .order_by(rollup.model_code, rollup.month)
+    ).all()
+
+    demand = {code: {"sales_count": 0, "monthly": []} for code in model_codes}
+    for row in rows:
+        entry = demand[row.model_code]
+        entry["sales_count"] += row.sales_count
+        entry["monthly"].append(
+            {"month": row.month, "sales_count": row.sales_count, "distinct_buyers": row.distinct_buyers}
+        )
+    return demand
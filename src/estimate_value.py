@@ -3,11 +3,31 @@ from sqlalchemy.orm import sessionmaker, Session
 # --- インポート文をすべて src からの絶対パスに統一 ---
 from src.db.database import engine, SessionLocal
 from src.db.models import VehicleMaster, ComponentValue
-from src.config import VALUATION_PRICES, WEIGHT_BASE_RATIOS
+from sqlalchemy.exc import OperationalError
+from src.config import VALUATION_PRICES, WEIGHT_BASE_RATIOS, COMPONENT_PRICE_WINDOW_MONTHS, COMPONENT_PRICE_WINDOW_MIN_SAMPLES
+from src.db.price_history import get_price_stats
 from src.db.database import SessionLocal # SessionLocalを直接インポート
+from src.model_code_resolver import resolve_model_code, MATCH_DESCRIPTIONS
 
 
 
+def get_recent_market_price(session: Session, price_record: ComponentValue) -> float:
+    """
+    市場価格 (エンジン型式ごと) を、直近 COMPONENT_PRICE_WINDOW_MONTHS か月の販売実績の平均で返す
+    期間内の件数が少ない場合や、価格履歴のテーブルが無い古いDBでは、全期間の平均 (average_price) を返す
+    """
+    try:
+        stats = get_price_stats(
+            session.connection(), price_record.item_name, price_record.engine_model, price_record.details_tags,
+            months=COMPONENT_PRICE_WINDOW_MONTHS,
+        )
+    except OperationalError:
+        return price_record.average_price
+    if stats and stats["window_sample_size"] >= COMPONENT_PRICE_WINDOW_MIN_SAMPLES:
+        return stats["window_mean"]
+    return price_record.average_price
+
+
 def get_component_price(session: Session, item_name: str, vehicle: VehicleMaster) -> float:
     # ... (このヘルパー関数は変更の必要はありません) ...
     price_record = session.query(ComponentValue).filter_by(item_name=item_name, model_code=vehicle.model_code).first()
@@ -16,7 +36,7 @@ def get_component_price(session: Session, item_name: str, vehicle: VehicleMaster
     if "エンジン" in item_name and vehicle.engine_model:
         price_record = session.query(ComponentValue).filter_by(item_name=item_name, engine_model=vehicle.engine_model, model_code=None).order_by(ComponentValue.sample_size.desc()).first()
         if price_record:
-            return price_record.average_price
+            return get_recent_market_price(session, price_record)
     default_price_key = item_name.lower().replace(" ", "_").replace("/", "_") + "_price"
     return VALUATION_PRICES.get(default_price_key, 0.0)
 
@@ -33,13 +53,22 @@ def calculate_material_value(vehicle: VehicleMaster, current_prices: dict) -> fl
     
     return press_value + kouzan_value + harness_value
 
-def estimate_scrap_value(model_code_to_find: str, session: Session, custom_prices: dict = None):
+def estimate_scrap_value(model_code_to_find: str, session: Session, custom_prices: dict = None, save_aliases: bool = False):
     """
     指定された型式の車両価値を見積もり、辞書として返す
     DBに存在しない場合でも、空の情報を返す
+    save_aliases=True なら、表記ゆれを解決した対応を別名テーブルに保存する (APIからは保存しない)
     """
     vehicle = session.query(VehicleMaster).filter_by(model_code=model_code_to_find).first()
-    
+
+    # 完全一致しない場合は、表記ゆれ (識別記号・派生記号の有無) を吸収して正式な型式を探す
+    match_remark = None
+    if not vehicle and model_code_to_find:
+        canonical, match_type = resolve_model_code(session, model_code_to_find, save_aliases=save_aliases)
+        if canonical:
+            vehicle = session.query(VehicleMaster).filter_by(model_code=canonical).first()
+            match_remark = f"型式 {model_code_to_find} を {canonical} として算定 ({MATCH_DESCRIPTIONS[match_type]})"
+
     # ▼▼▼ ここからが修正箇所 ▼▼▼
     if not vehicle:
         # DBに車種が見つからない場合、"error"を返すのではなく、
@@ -58,7 +87,7 @@ def estimate_scrap_value(model_code_to_find: str, session: Session, custom_price
     
     breakdown = {}
     total_value = 0.0
-    remarks = []
+    remarks = [match_remark] if match_remark else []
     
     # --- エンジン価値の判定 ---
     engine_resale_value = get_component_price(session, "エンジン/ミッション", vehicle)
@@ -128,7 +157,7 @@ if __name__ == "__main__":
         target_model_code = sys.argv[1].upper()
         session = SessionLocal()
         try:
-            result = estimate_scrap_value(target_model_code, session)
+            result = estimate_scrap_value(target_model_code, session, save_aliases=True)
             if "error" in result:
                 print(result["error"])
             else:
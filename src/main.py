@@ -1,18 +1,28 @@
 # src/main.py
 from src import config
 from src import pipeline
+from src import parquet_store
+from src.db.database import engine
 import pandas as pd
 
 def main():
     print("🚀 パイプライン処理を開始します...")
 
-    # --- フェーズ1: PDFから全車両データを抽出 ---
-    print("⚙️ フェーズ1: 全車両データを抽出中...")
-    all_vehicles_df = pipeline.run_phase1_extract_all_vehicles()
+    # --- フェーズ1: 未取り込みのPDFだけから車両データを抽出 ---
+    print("⚙️ フェーズ1: 新しい出品リストから車両データを抽出中...")
+    all_vehicles_df, processed_sheets = pipeline.run_phase1_extract_new_vehicles()
     if all_vehicles_df.empty:
-        print("❌ PDFからデータが抽出されませんでした。")
+        # 車両が1台も無かったPDFは、これ以上のフェーズが無いのでここで取り込み済みにする
+        with engine.begin() as connection:
+            pipeline.record_processed_sheets(connection, processed_sheets)
+        print("❌ 新しく抽出された車両データはありません。")
         return
     print(f"✅ フェーズ1完了: {len(all_vehicles_df)}件の車両データを抽出しました。")
+
+    # 新しい出品データだけを、開催月ごとの履歴 (Parquet) に追記する
+    appended = parquet_store.append_auction_history(all_vehicles_df)
+    if appended:
+        print(f"  - 出品履歴に {appended}件を追記しました: {config.AUCTION_HISTORY_DIR}")
     
     # --- フェーズ2: AIによるデータ拡充は、専用スクリプト(enrich_database.py)に任せるため、ここではスキップ ---
     # PDF由来のユニークな車種リストを作成
@@ -21,13 +31,16 @@ def main():
     # --- フェーズ3: データベースを更新する ---
     print("\n💸 フェーズ3: データベースを更新中...")
     # PDFデータと落札実績を統合する役割に特化
-    final_db = pipeline.run_phase3_update_database(all_vehicles_df, unique_vehicles_df)
+    # 処理したPDFは、フェーズ3が成功した時点で取り込み済みとして記録される
+    final_db = pipeline.run_phase3_update_database(all_vehicles_df, unique_vehicles_df, processed_sheets)
 
     # --- CSVファイルに保存 ---
     try:
         final_db.to_csv(config.VEHICLE_VALUE_LIST_PATH, index=False, encoding='utf-8-sig')
         print(f"\n✅ パイプライン処理が完了し、最終結果をファイルに保存しました。")
         print(f"出力ファイル: {config.VEHICLE_VALUE_LIST_PATH}")
+        if parquet_store.write_vehicle_value_list(final_db):
+            print(f"出力ファイル (Parquet): {config.VEHICLE_VALUE_LIST_PARQUET_PATH}")
         print("--- 最終結果（先頭5件）---")
         print(final_db.head())
     except Exception as e:
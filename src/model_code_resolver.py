@@ -0,0 +1,198 @@
+# src/model_code_resolver.py
+
+import re
+import threading
+from datetime import datetime
+from sqlalchemy import select, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.db.database import engine
+from src.db.models import VehicleMaster, ModelCodeAlias
+
+# 前方一致で対応付けるときに必要な最低文字数 (短い型式ほど別の車種に誤って対応しやすい)
+MIN_PREFIX_MATCH_LENGTH = 4
+
+# 前方一致で正式な型式の後ろに残った部分が、これらの区切り文字で始まる場合だけ派生記号として無視する
+# ("SCP100" の "0" のように数字や英字が続く場合は、"SCP10" とは別の型式とみなす)
+SUFFIX_SEPARATORS = ("-", " ", "(", "（", "/", "・")
+# 区切り文字なしで続いても無視してよい、型式末尾の派生記号 (ボディ形状などを表す1文字)
+KNOWN_VARIANT_SUFFIXES = {"W", "V", "G", "N"}
+
+# 型式の先頭に付く排ガス規制の識別記号 ("DBA-", "DAA-", "5BA-", "E-" など)。英字1〜3文字 (先頭に数字1文字を含むことがある)
+REGULATION_PREFIX_PATTERN = re.compile(r"^[0-9]?[A-Z]{1,3}-")
+
+# 途中で切れた型式 ("ZVW3") を、それで始まる唯一の型式 ("ZVW30") に対応付けるか
+# 推測による対応付けで、別名として保存されると後から気付きにくいため既定では行わない
+ALLOW_UNIQUE_EXTENSION = False
+
+# 対応付けの種類 → 備考に表示する説明
+MATCH_DESCRIPTIONS = {
+    "exact": "完全一致",
+    "alias": "登録済みの別名",
+    "prefix_stripped": "識別記号を除去",
+    "canonical_prefix": "前方一致 (末尾の派生記号を無視)",
+    "unique_extension": "前方一致 (候補が1件のみ)",
+}
+
+
+def _is_variant_suffix(suffix: str) -> bool:
+    return suffix.startswith(SUFFIX_SEPARATORS) or suffix in KNOWN_VARIANT_SUFFIXES
+
+
+class _TrieNode:
+    __slots__ = ("children", "code", "count")
+
+    def __init__(self):
+        self.children = {}
+        self.code = None  # この位置で終わる正式な型式
+        self.count = 0    # この位置以下にある型式の数
+
+
+class ModelCodeIndex:
+    """正式な型式の集合と、その前方一致検索用のトライ木"""
+
+    def __init__(self, model_codes):
+        self.codes = set(model_codes)
+        self.root = _TrieNode()
+        for code in self.codes:
+            node = self.root
+            node.count += 1
+            for ch in code:
+                node = node.children.setdefault(ch, _TrieNode())
+                node.count += 1
+            node.code = code
+
+    def longest_prefix(self, text: str):
+        """
+        text の先頭部分に一致する、最も長い正式な型式を返す ("ZVW30W" → "ZVW30", "ZVW30-X" → "ZVW30")
+        残りの部分が区切り文字で始まるか、既知の派生記号の場合だけ一致とみなす ("SCP100" は "SCP10" にしない)
+        """
+        node = self.root
+        best = None
+        for depth, ch in enumerate(text, start=1):
+            node = node.children.get(ch)
+            if node is None:
+                break
+            if node.code is not None and depth >= MIN_PREFIX_MATCH_LENGTH and _is_variant_suffix(text[depth:]):
+                best = node.code
+        return best
+
+    def unique_extension(self, text: str):
+        """text で始まる正式な型式がちょうど1つだけあれば返す ("KZH106" → "KZH106W")"""
+        if len(text) < MIN_PREFIX_MATCH_LENGTH:
+            return None
+        node = self.root
+        for ch in text:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        if node.count != 1:
+            return None
+        while node.code is None:
+            node = next(iter(node.children.values()))
+        return node.code
+
+    def match(self, text: str, allow_extension: bool = False):
+        """
+        完全一致 → 先頭部分の一致 の順に探し、(正式な型式, 種類) を返す
+        allow_extension=True なら、最後に「text で始まる唯一の候補」も試す
+        """
+        if text in self.codes:
+            return text, "exact"
+        canonical = self.longest_prefix(text)
+        if canonical:
+            return canonical, "canonical_prefix"
+        if allow_extension:
+            canonical = self.unique_extension(text)
+            if canonical:
+                return canonical, "unique_extension"
+        return None, None
+
+
+_lock = threading.Lock()
+_index_cache = {"key": None, "index": None}
+_aliases = None
+
+
+def _ensure_alias_table():
+    ModelCodeAlias.__table__.create(engine, checkfirst=True)
+
+
+def _load_aliases() -> dict:
+    global _aliases
+    if _aliases is None:
+        # 読むだけなので、別名テーブルが未作成でもここでは作らない (DBファイルに書き込まない)
+        try:
+            with engine.connect() as connection:
+                _aliases = dict(connection.execute(select(ModelCodeAlias.alias, ModelCodeAlias.model_code)).all())
+        except OperationalError:
+            _aliases = {}
+    return _aliases
+
+
+def _save_alias(alias: str, model_code: str, match_type: str):
+    _ensure_alias_table()
+    with engine.begin() as connection:
+        connection.execute(
+            sqlite_insert(ModelCodeAlias.__table__)
+            .values(alias=alias, model_code=model_code, match_type=match_type, created_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=["alias"])
+        )
+
+
+def get_model_code_index(session) -> ModelCodeIndex:
+    """
+    VehicleMaster の型式索引を返す (件数・最大ID・最終更新日時が変わったときだけ作り直す)
+    変更の確認はセッションごとに1回だけ行い、同じセッション内の2件目以降は索引をそのまま使う
+    """
+    if "model_code_index" in session.info:
+        return session.info["model_code_index"]
+    key = (id(session.get_bind()),) + tuple(session.execute(
+        select(func.count(), func.max(VehicleMaster.id), func.max(VehicleMaster.updated_at))
+    ).one())
+    if _index_cache["key"] != key:
+        codes = session.execute(select(VehicleMaster.model_code)).scalars().all()
+        _index_cache["index"] = ModelCodeIndex(code for code in codes if code)
+        _index_cache["key"] = key
+    session.info["model_code_index"] = _index_cache["index"]
+    return _index_cache["index"]
+
+
+def resolve_model_code(session, model_code: str, save_aliases: bool = False):
+    """
+    型式の表記ゆれを吸収して、VehicleMaster に登録されている正式な型式を探す
+    完全一致 → 登録済みの別名 → 前方一致 → 先頭の "DBA-" などの識別記号を除去して完全一致・前方一致
+    の順に試し、(正式な型式, 種類) を返す
+    見つからなければ (None, None)。完全一致以外で見つかった対応は、このプロセスのメモリ上に別名として覚える
+    save_aliases=True (一括処理や取り込み処理から呼ぶ場合) のときだけ、別名テーブルにも保存する
+    (APIのリクエスト処理でDBファイルに書き込むと、読み取り用スナップショットの作り直しが起きるため)
+    """
+    if not model_code:
+        return None, None
+    text = model_code.strip()
+    with _lock:
+        index = get_model_code_index(session)
+        if text in index.codes:
+            return text, "exact"
+
+        aliases = _load_aliases()
+        canonical = aliases.get(text)
+        if canonical in index.codes:
+            return canonical, "alias"
+
+        # "ZVW30-XX" のように、正式な型式の後ろに区切り文字付きの派生記号が続く場合
+        canonical, match_type = index.match(text, allow_extension=ALLOW_UNIQUE_EXTENSION)
+        if not canonical:
+            # 先頭の排ガス規制の識別記号だけを除く ("DAA-ZVW30-AHXEB" → "ZVW30-AHXEB")
+            stripped = REGULATION_PREFIX_PATTERN.sub("", text, count=1).strip()
+            if stripped != text:
+                if stripped in index.codes:
+                    canonical, match_type = stripped, "prefix_stripped"
+                else:
+                    canonical, match_type = index.match(stripped, allow_extension=ALLOW_UNIQUE_EXTENSION)
+
+        if canonical:
+            aliases[text] = canonical
+            if save_aliases:
+                _save_alias(text, canonical, match_type)
+        return canonical, match_type
@@ -0,0 +1,125 @@
+# src/parquet_store.py
+
+import re
+import hashlib
+import pandas as pd
+from src import config
+
+# pyarrow はオプション。インストールされていなければParquet出力をスキップする
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# 車種リストの列の型 (CSVと違い、読み込み側で型を推測し直さなくて済む)
+VEHICLE_VALUE_LIST_DTYPES = {
+    "id": "Int64",
+    "maker": "string",
+    "car_name": "string",
+    "model_code": "string",
+    "appearance_count": "Int64",
+    "year": "string",
+    "grade": "string",
+    "engine_model": "string",
+    "drive_type": "string",
+    "body_type": "string",
+    "total_weight_kg": "Int64",
+    "engine_weight_kg": "Int64",
+    "kouzan_weight_kg": "Int64",
+    "wiring_weight_kg": "Int64",
+    "press_weight_kg": "Int64",
+    "created_at": "datetime64[ns]",
+    "updated_at": "datetime64[ns]",
+    "sales_count": "Int64",
+}
+
+AUCTION_HISTORY_COLUMNS = [
+    "auction_venue", "auction_date", "auction_no", "auction_round", "auction_corner",
+    "maker", "car_name", "grade", "year", "model_code", "displacement_cc", "inspection_date",
+    "mileage_km", "color", "shift", "evaluation_score", "evaluation_interior", "source_file",
+]
+
+
+def _apply_dtypes(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    df = df.copy()
+    for col, dtype in dtypes.items():
+        if col not in df.columns:
+            continue
+        if dtype == "Int64":
+            df[col] = pd.to_numeric(df[col], errors='coerce').round().astype("Int64")
+        elif dtype.startswith("datetime"):
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def write_vehicle_value_list(df: pd.DataFrame, path=config.VEHICLE_VALUE_LIST_PARQUET_PATH) -> bool:
+    """最終的な車種リストを型付きのParquetとして保存する。pyarrowが無ければ何もせずFalseを返す"""
+    if not HAS_PYARROW:
+        print("  - pyarrow がインストールされていないため、Parquet出力をスキップします。")
+        return False
+    _apply_dtypes(df, VEHICLE_VALUE_LIST_DTYPES).to_parquet(path, index=False, engine='pyarrow')
+    return True
+
+
+def load_vehicle_value_list(columns: list = None) -> pd.DataFrame:
+    """車種リストを読み込む (Parquetがあれば必要な列だけを読み、無ければCSVから読む)"""
+    if HAS_PYARROW and config.VEHICLE_VALUE_LIST_PARQUET_PATH.exists():
+        return pd.read_parquet(config.VEHICLE_VALUE_LIST_PARQUET_PATH, columns=columns, engine='pyarrow')
+    return pd.read_csv(config.VEHICLE_VALUE_LIST_PATH, usecols=columns, encoding='utf-8-sig')
+
+
+def auction_month(auction_date: str) -> str:
+    """'2025/06/14' や '2025年6月14日' のような開催日から 'YYYY-MM' を取り出す (読めなければ 'unknown')"""
+    match = re.search(r"(\d{4})\D+(\d{1,2})", str(auction_date or ""))
+    if not match:
+        return "unknown"
+    return f"{match.group(1)}-{int(match.group(2)):02d}"
+
+
+def _sheet_file_name(source_file: str) -> str:
+    # 出品PDFごとに決まるファイル名 (同じPDFを再処理すると同じファイルを上書きする)
+    stem = re.sub(r"[^\w.-]", "_", str(source_file))[:80]
+    digest = hashlib.sha1(str(source_file).encode("utf-8")).hexdigest()[:8]
+    return f"sheet-{stem}-{digest}.parquet"
+
+
+def append_auction_history(listings_df: pd.DataFrame, root_dir=config.AUCTION_HISTORY_DIR) -> int:
+    """
+    新しく取り込んだ出品データを、開催月 (auction_month) でパーティション分割した履歴に追記する
+    ファイルは出品PDF (source_file) ごとに1つで、同じPDFを再処理した場合は前回のファイルを置き換える
+    (失敗後の再実行などで同じ出品が二重に記録されないように)。書き込んだ行数を返す
+    """
+    if not HAS_PYARROW or listings_df.empty:
+        return 0
+    df = listings_df.reindex(columns=AUCTION_HISTORY_COLUMNS).astype("string")
+    months = df["auction_date"].map(auction_month)
+
+    schema = pa.schema([(col, pa.string()) for col in AUCTION_HISTORY_COLUMNS])
+    for source_file, sheet_df in df.groupby(df["source_file"].fillna(""), sort=False):
+        file_name = _sheet_file_name(source_file)
+        # 前回の処理で別の開催月に書いたファイルも含めて、このPDFの古い履歴を消す
+        for old_path in root_dir.glob(f"auction_month=*/{file_name}"):
+            old_path.unlink()
+        for month, month_df in sheet_df.groupby(months.loc[sheet_df.index], sort=False):
+            partition_dir = root_dir / f"auction_month={month}"
+            partition_dir.mkdir(parents=True, exist_ok=True)
+            table = pa.Table.from_pandas(month_df, schema=schema, preserve_index=False)
+            pq.write_table(table, partition_dir / file_name)
+    return len(df)
+
+
+def read_auction_history(columns: list = None, months: list = None, root_dir=config.AUCTION_HISTORY_DIR) -> pd.DataFrame:
+    """
+    出品データの履歴を読み込む。columns で列を、months ('YYYY-MM' のリスト) で開催月を絞り込むと、
+    該当するパーティションと列だけが読み込まれる
+    """
+    if not HAS_PYARROW:
+        raise ImportError("出品履歴の読み込みには pyarrow が必要です。")
+    if not root_dir.exists():
+        return pd.DataFrame(columns=columns or AUCTION_HISTORY_COLUMNS + ["auction_month"])
+    filters = [("auction_month", "in", list(months))] if months else None
+    return pd.read_parquet(root_dir, columns=columns, filters=filters, engine='pyarrow')
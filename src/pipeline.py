@@ -1,108 +1,168 @@
 import pandas as pd
 from datetime import datetime
+from sqlalchemy import text, bindparam, DateTime
 from src import config
-from src.db.database import SessionLocal, engine
-from src.db.models import VehicleMaster, SalesHistory, SQLModel
+from src.db.database import engine
+from src.db.bulk import insert_or_ignore
+from src.db.manifest import check_file, record_import
+from src.db.sales_rollup import ensure_sales_rollup
+from src.db.models import VehicleMaster, AuctionListing, SQLModel
 from src.data_processing.pdf_parser import extract_vehicles_from_pdf
 from src.data_processing.scraper import enrich_vehicle_data
-from src.utils import normalize_text
+from src.utils import normalize_series
 
-def run_phase1_extract_all_vehicles() -> pd.DataFrame:
+AUCTION_SHEET_SOURCE_KIND = "auction_sheet"
+HEADER_COLUMNS = ["auction_round", "auction_date", "auction_venue", "auction_corner"]
+
+
+def build_listing_records(header_info: dict, vehicles: list, source_file: str) -> pd.DataFrame:
+    """PDF1枚分の解析結果を、ヘッダー情報付きの出品データ (DataFrame) に変換する"""
+    df = pd.DataFrame(vehicles)
+    if df.empty:
+        return df
+    df = df[df['maker'] != 'メーカー'].copy()
+
+    # ▼▼▼ maker, car_name, model_code の3つすべてを正規化 ▼▼▼
+    for col in ['maker', 'car_name', 'model_code']:
+        if col in df.columns:
+            df[col] = normalize_series(df[col])
+
+    for col in HEADER_COLUMNS:
+        df[col] = header_info.get(col, '')
+    # 会場名は落札結果CSV (import_auction_results.py) と同じく正規化して保存し、同じ出品として突き合わせられるようにする
+    # ヘッダーを読み取れなかったシートはファイル名で区別する
+    if header_info.get('auction_venue'):
+        df['auction_venue'] = normalize_series(df['auction_venue'])
+    else:
+        df['auction_venue'] = source_file
+    df['source_file'] = source_file
+    return df
+
+
+def record_processed_sheets(connection, processed_sheets: list):
+    """最後のフェーズまで終わったPDFを取り込み記録 (マニフェスト) に登録する"""
+    for pdf_path, fingerprint, row_count in processed_sheets:
+        record_import(connection, AUCTION_SHEET_SOURCE_KIND, pdf_path, fingerprint, row_count)
+
+
+def run_phase1_extract_new_vehicles():
     """
-    フェーズ1: inputフォルダ内の全PDFを解析し、「重複を含む」全車両データを返す
+    フェーズ1: inputフォルダ内のPDFのうち、まだ取り込んでいないものだけを解析し、
+    出品データ (auctionlisting) に保存したうえで「重複を含む」新規分の車両データを返す
+    戻り値は (車両データ, 処理したPDFの [(パス, 指紋, 件数), ...])。取り込み記録への登録はここでは行わず、
+    フェーズ3の完了時に record_processed_sheets で行う (途中で失敗したPDFは次回もう一度処理される)
     """
-    all_vehicles = []
-    
-    pdf_files = list(config.AUCTION_SHEETS_DIR.glob("*.pdf"))
+    SQLModel.metadata.create_all(engine)
+    pdf_files = sorted(config.AUCTION_SHEETS_DIR.glob("*.pdf"))
     
     if not pdf_files:
         print("警告: data/input/auction_sheets/ ディレクトリにPDFファイルが見つかりません。")
-        return pd.DataFrame()
-
-    print(f"{len(pdf_files)}個のPDFファイルを処理します...")
+        return pd.DataFrame(), []
 
-    for pdf_path in pdf_files:
-        print(f"  - 解析中: {pdf_path.name}")
-        extracted_data = extract_vehicles_from_pdf(pdf_path)
-        all_vehicles.extend(extracted_data)
-
-    if not all_vehicles:
-        print("警告: PDFから車両データを1件も抽出できませんでした。")
-        return pd.DataFrame()
+    with engine.begin() as connection:
+        new_files = []
+        for pdf_path in pdf_files:
+            needed, fingerprint = check_file(connection, AUCTION_SHEET_SOURCE_KIND, pdf_path)
+            if needed:
+                new_files.append((pdf_path, fingerprint))
 
-    df = pd.DataFrame(all_vehicles)
-    df = df[df['maker'] != 'メーカー'].copy()
-    
-    # ▼▼▼ maker, car_name, model_code の3つすべてを正規化 ▼▼▼
-    for col in ['maker', 'car_name', 'model_code']:
-        if col in df.columns:
-            df[col] = df[col].apply(normalize_text)
+    print(f"{len(pdf_files)}個のPDFファイルのうち、新規・変更された{len(new_files)}個を処理します...")
 
-    return df
+    listing_columns = [c for c in AuctionListing.__table__.columns.keys() if c != 'id']
+    new_listings = []
+    processed_sheets = []
+    for pdf_path, fingerprint in new_files:
+        print(f"  - 解析中: {pdf_path.name}")
+        header_info, vehicles = extract_vehicles_from_pdf(pdf_path)
+        df = build_listing_records(header_info, vehicles, pdf_path.name)
+
+        # 出品データは (会場, 開催日, 出品番号) で一意なので、再処理しても重複しない
+        inserted = 0
+        if not df.empty:
+            with engine.begin() as connection:
+                records = df.assign(created_at=datetime.utcnow())
+                records = records[[c for c in listing_columns if c in records.columns]]
+                inserted = insert_or_ignore(connection, AuctionListing.__table__, records.to_dict('records'))
+        print(f"    -> {len(df)}件を抽出 (新規の出品 {inserted}件)")
+        new_listings.append(df)
+        processed_sheets.append((pdf_path, fingerprint, len(df)))
+
+    if not new_listings or all(df.empty for df in new_listings):
+        print("新しく取り込む車両データはありませんでした。")
+        return pd.DataFrame(), processed_sheets
+
+    return pd.concat(new_listings, ignore_index=True), processed_sheets
 
 # run_phase2_enrich_dataは不要になるため削除（または後述のenrich_database.pyに移動）
 
-def run_phase3_update_database(all_vehicles_df: pd.DataFrame, unique_vehicles_df: pd.DataFrame) -> pd.DataFrame:
+def run_phase3_update_database(all_vehicles_df: pd.DataFrame, unique_vehicles_df: pd.DataFrame, processed_sheets: list = None) -> pd.DataFrame:
     """
     フェーズ3: データベースを更新し、落札実績を集計して最終的なリストを返す
+    all_vehicles_df は今回新しく取り込んだ出品データ。出品回数は、その型式についてだけ
+    出品データ全体 (auctionlisting) から集計し直す
+    processed_sheets (フェーズ1の戻り値) は、車種の更新と同じトランザクションで取り込み記録に登録する
+    車種の追加と出品回数の反映は、行ごとのクエリではなく集合演算のSQLでまとめて行う
     """
     print("  - データベースの更新と落札実績の集計を開始します...")
     SQLModel.metadata.create_all(engine)
-    session = SessionLocal()
+    now = datetime.utcnow()
+    vehicle_columns = [c for c in VehicleMaster.__table__.columns.keys() if c != 'id']
 
-    try:
-        # 1. 既存の車種マスターを辞書として一度に読み込む
-        existing_vehicles = {v.model_code: v for v in session.query(VehicleMaster).all()}
-        print(f"  - 既存の車種マスター（{len(existing_vehicles)}件）を読み込みました。")
+    with engine.begin() as connection:
+        # 1. 今回の出品に含まれる型式を一時テーブルに入れる (出品回数を再集計する対象)
+        connection.execute(text("CREATE TEMP TABLE IF NOT EXISTS tmp_listed_model_codes (model_code VARCHAR PRIMARY KEY)"))
+        connection.execute(text("DELETE FROM tmp_listed_model_codes"))
+        listed_codes = [{"model_code": code} for code in all_vehicles_df['model_code'].dropna().unique() if code]
+        if listed_codes:
+            connection.execute(text("INSERT INTO tmp_listed_model_codes (model_code) VALUES (:model_code)"), listed_codes)
 
         # 2. PDF由来のデータをデータベースに追加・更新
-        for record in unique_vehicles_df.to_dict('records'):
-            model_code = record.get('model_code')
-            if not model_code: continue
-            
-            # 既存か新規かチェック
-            vehicle = existing_vehicles.get(model_code)
-            if vehicle:
-                # 既存の場合は出品回数を更新
-                vehicle.updated_at = datetime.utcnow()
-            else:
-                # 新規の場合は追加
-                vehicle = VehicleMaster(**{k: v for k, v in record.items() if k in VehicleMaster.__fields__})
-                session.add(vehicle)
-                existing_vehicles[model_code] = vehicle
-
-        # 3. 落札実績にしかいない車種をデータベースに追加
-        sales_only_query = session.query(
-            SalesHistory.maker, SalesHistory.car_name, SalesHistory.model_code
-        ).distinct()
-        
-        for sale in sales_only_query.all():
-            if sale.model_code not in existing_vehicles:
-                vehicle = VehicleMaster(
-                    maker=sale.maker, car_name=sale.car_name, model_code=sale.model_code, appearance_count=0
-                )
-                session.add(vehicle)
-                existing_vehicles[sale.model_code] = vehicle
-
-        # 4. すべての変更を一度にDBに書き込む
-        session.commit()
-        print("  - 車種マスターの更新が完了しました。")
-
-        # 5. 出品回数を集計して反映
-        appearance_counts = all_vehicles_df.groupby('model_code').size().reset_index(name='appearance_count')
-        for record in appearance_counts.to_dict('records'):
-            vehicle = session.query(VehicleMaster).filter_by(model_code=record['model_code']).first()
-            if vehicle:
-                vehicle.appearance_count = record['appearance_count']
-        session.commit()
-
-        # 6. 最終的な結果を生成
-        sales_counts_df = pd.read_sql("SELECT model_code, COUNT(id) as sales_count FROM saleshistory GROUP BY model_code", engine)
-        final_master_df = pd.read_sql("SELECT * FROM vehiclemaster", engine)
-        final_output_df = pd.merge(final_master_df, sales_counts_df, on='model_code', how='left')
-        final_output_df['sales_count'] = final_output_df['sales_count'].fillna(0).astype(int)
-
-    finally:
-        session.close()
-
-    return final_output_df
\ No newline at end of file
+        # 既存の車種は更新日時だけを進め、新規の型式はまとめて追加する
+        connection.execute(
+            text(
+                "UPDATE vehiclemaster SET updated_at = :now "
+                "WHERE model_code IN (SELECT model_code FROM tmp_listed_model_codes)"
+            ).bindparams(bindparam("now", type_=DateTime())),
+            {"now": now}
+        )
+        new_records = [
+            dict({k: v for k, v in record.items() if k in vehicle_columns}, appearance_count=0, created_at=now, updated_at=now)
+            for record in unique_vehicles_df.to_dict('records') if record.get('model_code')
+        ]
+        added_from_pdf = insert_or_ignore(connection, VehicleMaster.__table__, new_records)
+
+        # 3. 落札実績にしかいない車種を、アンチジョインでまとめて追加
+        added_from_sales = connection.execute(
+            text(
+                "INSERT INTO vehiclemaster (maker, car_name, model_code, appearance_count, created_at, updated_at) "
+                "SELECT MIN(s.maker), MIN(s.car_name), s.model_code, 0, :now, :now "
+                "FROM saleshistory s "
+                "WHERE NOT EXISTS (SELECT 1 FROM vehiclemaster v WHERE v.model_code = s.model_code) "
+                "GROUP BY s.model_code"
+            ).bindparams(bindparam("now", type_=DateTime())),
+            {"now": now}
+        ).rowcount
+        print(f"  - 車種マスターの更新が完了しました。(PDFから新規 {added_from_pdf}件 / 落札実績から新規 {added_from_sales}件)")
+
+        # 4. 対象の型式だけ、出品データ全体から出品回数をSQLで集計して反映
+        connection.execute(text(
+            "UPDATE vehiclemaster SET appearance_count = agg.appearance_count "
+            "FROM (SELECT l.model_code, COUNT(*) AS appearance_count FROM auctionlisting l "
+            "      JOIN tmp_listed_model_codes t ON t.model_code = l.model_code GROUP BY l.model_code) AS agg "
+            "WHERE vehiclemaster.model_code = agg.model_code"
+        ))
+        connection.execute(text("DROP TABLE tmp_listed_model_codes"))
+
+        # 落札件数は、取り込み時に更新している月別の集計から求める (落札実績全体は走査しない)
+        ensure_sales_rollup(connection)
+
+        # ここまで成功したPDFだけを「取り込み済み」にする
+        record_processed_sheets(connection, processed_sheets or [])
+
+    # 5. 最終的な結果を生成
+    sales_counts_df = pd.read_sql("SELECT model_code, SUM(sales_count) as sales_count FROM salesrollup GROUP BY model_code", engine)
+    final_master_df = pd.read_sql("SELECT * FROM vehiclemaster", engine)
+    final_output_df = pd.merge(final_master_df, sales_counts_df, on='model_code', how='left')
+    final_output_df['sales_count'] = final_output_df['sales_count'].fillna(0).astype(int)
+
+    return final_output_df
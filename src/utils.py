@@ -1,5 +1,7 @@
-
 import unicodedata
+from datetime import date
+from functools import lru_cache
+import pandas as pd
 
 def normalize_text(text: str) -> str:
     """
@@ -9,4 +11,41 @@ def normalize_text(text: str) -> str:
         return text
     # NFKC正規化により、全角英数字・記号などを半角に変換
     normalized_text = unicodedata.normalize('NFKC', text)
-    return normalized_text.upper().strip()
\ No newline at end of file
+    return normalized_text.upper().strip()
+
+
+@lru_cache(maxsize=65536)
+def _normalize_text_cached(text: str) -> str:
+    return normalize_text(text)
+
+
+def normalize_series(series: pd.Series) -> pd.Series:
+    """
+    Series の各要素に normalize_text を適用した結果を返す (series.apply(normalize_text) と同じ出力。カテゴリ型は object として返す)
+    メーカー名や型式のように同じ値が何度も現れる列向けに、ユニークな値だけを正規化して全体に展開する
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # カテゴリ型は値が文字列でも dtype が object ではないため、object に戻してから正規化する
+        series = series.astype(object)
+    is_string_dtype = isinstance(series.dtype, pd.StringDtype)
+    if series.dtype != object and not is_string_dtype:
+        # 文字列を含まない列 (数値・日付など) は normalize_text でも値が変わらない
+        return series.copy()
+
+    codes, uniques = pd.factorize(series)
+    normalized_uniques = [
+        _normalize_text_cached(value) if isinstance(value, str) else value for value in uniques
+    ]
+    # 末尾に番兵を置き、欠損値 (codes == -1) もそのまま引けるようにする (すべて欠損値の列では uniques が空になる)
+    result = pd.Series(normalized_uniques + [None], dtype=object).to_numpy()[codes]
+    # 欠損値 (codes == -1) は元の値をそのまま残す
+    missing = codes == -1
+    if missing.any():
+        result[missing] = series.to_numpy()[missing]
+    return pd.Series(result, index=series.index, name=series.name, dtype=object)
+
+
+def month_window_start(as_of: date, months: int) -> str:
+    """as_of の月を含む直近 months か月の、最初の月を "YYYY-MM" で返す (months=1 なら as_of の月)"""
+    index = as_of.year * 12 + (as_of.month - 1) - (months - 1)
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
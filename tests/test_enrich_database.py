@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import enrich_database
+from src.data_processing import scraper
+from src.db.models import SQLModel, VehicleMaster
+
+SPECS = {"engine_model": "2ZR", "drive_type": "FF", "body_type": "セダン", "total_weight_kg": 1300, "engine_weight_kg": 120}
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    test_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(test_engine)
+    monkeypatch.setattr(enrich_database, "engine", test_engine)
+    monkeypatch.setattr(enrich_database, "SessionLocal", sessionmaker(bind=test_engine))
+    monkeypatch.setattr(enrich_database, "CHECKPOINT_PATH", tmp_path / "enrich_checkpoint.json")
+    # キャッシュ統計の表示は本物のDBのキャッシュテーブルを読むため、テストでは表示しない
+    monkeypatch.setattr(enrich_database, "print_cache_stats", lambda: None)
+
+    session = sessionmaker(bind=test_engine)()
+    session.add_all([
+        # 車名とエンジン型式はあるが重量などが欠けている車種も、拡充の対象になる
+        VehicleMaster(model_code="ZRE142", car_name="カローラ", engine_model="2ZR"),
+        VehicleMaster(model_code="NZE141"),
+        VehicleMaster(model_code="ZVW30", car_name="プリウス", **SPECS),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_second_run_reports_completion(db, monkeypatch, capsys):
+    queried = []
+
+    def fake_specs(model_codes):
+        queried.extend(model_codes)
+        return {code: dict(SPECS) for code in model_codes}
+
+    monkeypatch.setattr(scraper, "get_specs_batch_from_llm", fake_specs)
+
+    enrich_database.run_full_enrichment(chunk_size=10)
+    assert sorted(queried) == ["NZE141", "ZRE142"]
+    db.expire_all()
+    assert db.query(VehicleMaster).filter_by(model_code="ZRE142").one().total_weight_kg == 1300
+
+    capsys.readouterr()
+    enrich_database.run_full_enrichment(chunk_size=10)
+    assert "すべての車種にスペック情報が登録済みです" in capsys.readouterr().out
+    assert not enrich_database.CHECKPOINT_PATH.exists()
+    assert sorted(queried) == ["NZE141", "ZRE142"]
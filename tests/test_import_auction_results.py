@@ -0,0 +1,69 @@
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine, select
+from sqlalchemy.pool import StaticPool
+import import_auction_results
+from src.db.models import SQLModel, AuctionListing, AuctionResult, ModelPriceStats
+from src.pipeline import build_listing_records
+
+
+@pytest.fixture
+def db_engine(monkeypatch):
+    test_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(test_engine)
+    monkeypatch.setattr(import_auction_results, "engine", test_engine)
+    return test_engine
+
+
+def write_results_csv(path, rows):
+    pd.DataFrame(rows, columns=['開催日', '会場', '出品番号', '型式', '落札価格']).to_csv(path, index=False, encoding='utf-8-sig')
+    return path
+
+
+def listing_row(venue, auction_date, auction_no, model_code):
+    return {
+        "auction_venue": venue, "auction_date": auction_date, "auction_no": auction_no,
+        "model_code": model_code, "source_file": "sheet.pdf",
+    }
+
+
+def test_new_listings_store_the_normalized_venue():
+    df = build_listing_records(
+        {"auction_venue": "ＵＳＳ　東京", "auction_date": "2025/6/3"},
+        [{"maker": "トヨタ", "car_name": "プリウス", "model_code": "ZVW30", "auction_no": "1001"}],
+        "sheet.pdf",
+    )
+    assert df['auction_venue'].tolist() == import_auction_results.normalize_series(pd.Series(["USS 東京"])).tolist()
+
+
+def test_model_code_is_backfilled_across_venue_spellings(db_engine, tmp_path):
+    with db_engine.begin() as connection:
+        connection.execute(AuctionListing.__table__.insert(), [
+            # 会場名を正規化せずに保存していた頃の出品リストの行
+            listing_row("ＵＳＳ　東京", "2025/6/3", "1001", "ZVW30"),
+            listing_row("USS 名古屋", "2025/6/3", "1002", "NZE141"),
+        ])
+    csv_path = write_results_csv(tmp_path / "results.csv", [
+        ["2025/6/3", "USS 東京", "1001", "", "350,000"],
+        ["2025/6/3", "USS 東京", "1002", "", "200,000"],
+    ])
+
+    assert import_auction_results.import_auction_results(csv_path) == 2
+    with db_engine.connect() as connection:
+        codes = dict(connection.execute(select(AuctionResult.auction_no, AuctionResult.model_code)).all())
+        assert codes == {"1001": "ZVW30", "1002": None}
+        assert connection.execute(select(ModelPriceStats.model_code)).scalars().all() == ["ZVW30"]
+
+
+def test_latest_auction_date_is_compared_as_a_date(db_engine, tmp_path):
+    csv_path = write_results_csv(tmp_path / "results.csv", [
+        ["2025/9/1", "USS 東京", "1001", "ZVW30", "300000"],
+        ["2025/10/1", "USS 東京", "1002", "ZVW30", "320000"],
+        ["2024年12月5日", "USS 東京", "1003", "ZVW30", "280000"],
+    ])
+    import_auction_results.import_auction_results(csv_path)
+    with db_engine.connect() as connection:
+        stats = connection.execute(select(ModelPriceStats).where(ModelPriceStats.model_code == "ZVW30")).one()
+    # 文字列のまま比べると "2025/9/1" が最新になってしまう
+    assert stats.latest_auction_date == "2025-10-01"
+    assert stats.median_price == 300000
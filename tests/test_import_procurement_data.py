@@ -0,0 +1,35 @@
+import pytest
+import pandas as pd
+from datetime import date
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import StaticPool
+from import_procurement_data import insert_procurement_records
+from src.db.models import SalesHistory
+
+ROWS = [
+    {"sale_date": date(2025, 6, 3), "chassis_number": "ZVW30-0001", "model_code": "ZVW30", "maker": "トヨタ", "buyer_name": "A社"},
+    {"sale_date": date(2025, 6, 4), "chassis_number": "ZVW30-0002", "model_code": "ZVW30", "maker": "トヨタ", "buyer_name": "B社"},
+]
+
+
+@pytest.fixture
+def db_engine():
+    test_engine = create_engine("sqlite://", poolclass=StaticPool)
+    SalesHistory.__table__.create(test_engine)
+    return test_engine
+
+
+def test_duplicate_chassis_numbers_are_skipped(db_engine):
+    with db_engine.begin() as connection:
+        assert insert_procurement_records(connection, pd.DataFrame(ROWS[:1]), set()) == (1, 0)
+        # 既存の集合に無い車台番号でも、DBに登録済みなら重複としてスキップする
+        assert insert_procurement_records(connection, pd.DataFrame(ROWS), set()) == (1, 1)
+        assert connection.execute(select(func.count()).select_from(SalesHistory.__table__)).scalar() == 2
+
+
+def test_rows_missing_required_values_raise(db_engine):
+    invalid = [{**ROWS[0], "buyer_name": None}]
+    with pytest.raises(IntegrityError):
+        with db_engine.begin() as connection:
+            insert_procurement_records(connection, pd.DataFrame(invalid), set())
@@ -0,0 +1,80 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine, inspect, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from src import model_code_resolver
+from src.db.models import VehicleMaster, ModelCodeAlias
+from src.model_code_resolver import ModelCodeIndex, resolve_model_code
+
+
+def test_longest_prefix_rejects_digit_suffix():
+    # "SCP100" は "SCP10" の派生ではなく別の型式
+    index = ModelCodeIndex(["SCP10"])
+    assert index.longest_prefix("SCP100") is None
+    assert index.match("SCP100") == (None, None)
+
+
+def test_match_prefers_exact_code_over_shorter_prefix():
+    index = ModelCodeIndex(["SCP10", "SCP100"])
+    assert index.match("SCP100") == ("SCP100", "exact")
+    assert index.match("SCP10") == ("SCP10", "exact")
+
+
+def test_unique_extension_is_opt_in():
+    index = ModelCodeIndex(["ZVW30"])
+    assert index.match("ZVW3") == (None, None)
+    assert index.match("ZVW3", allow_extension=True) == ("ZVW30", "unique_extension")
+
+
+def test_longest_prefix_accepts_separator_and_known_suffix():
+    index = ModelCodeIndex(["ZVW30", "SCP10"])
+    assert index.longest_prefix("ZVW30W") == "ZVW30"
+    assert index.longest_prefix("ZVW30-XX") == "ZVW30"
+    assert index.longest_prefix("SCP10 (改)") == "SCP10"
+    assert index.match("ZVW30W") == ("ZVW30", "canonical_prefix")
+
+
+@pytest.fixture
+def session(monkeypatch):
+    # 型式の索引と別名は、メモリ上のDBに用意した車種から作る
+    test_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    VehicleMaster.__table__.create(test_engine)
+    now = datetime.utcnow()
+    with test_engine.begin() as connection:
+        connection.execute(VehicleMaster.__table__.insert(), [
+            {"maker": "トヨタ", "car_name": "プリウス", "model_code": code, "appearance_count": 1,
+             "created_at": now, "updated_at": now}
+            for code in ["ZVW30", "SCP10", "SCP100"]
+        ])
+    monkeypatch.setattr(model_code_resolver, "engine", test_engine)
+    monkeypatch.setattr(model_code_resolver, "_aliases", None)
+    monkeypatch.setattr(model_code_resolver, "_index_cache", {"key": None, "index": None})
+    session = sessionmaker(bind=test_engine)()
+    yield session
+    session.close()
+
+
+def test_resolve_keeps_code_before_trailing_variant(session):
+    assert resolve_model_code(session, "ZVW30-XX") == ("ZVW30", "canonical_prefix")
+
+
+def test_resolve_strips_only_leading_regulation_prefix(session):
+    assert resolve_model_code(session, "DBA-ZVW30") == ("ZVW30", "prefix_stripped")
+    assert resolve_model_code(session, "DAA-ZVW30-AHXEB") == ("ZVW30", "canonical_prefix")
+
+
+def test_resolve_does_not_guess_from_truncated_code(session):
+    assert resolve_model_code(session, "ZVW3") == (None, None)
+    assert resolve_model_code(session, "SCP1000") == (None, None)
+
+
+def test_resolve_saves_alias_only_when_requested(session):
+    resolve_model_code(session, "DBA-SCP10")
+    # 保存を指定しない場合はメモリ上でだけ覚え、別名テーブルも作らない
+    assert model_code_resolver._aliases["DBA-SCP10"] == "SCP10"
+    assert not inspect(model_code_resolver.engine).has_table(ModelCodeAlias.__tablename__)
+    resolve_model_code(session, "DBA-SCP100", save_aliases=True)
+    with model_code_resolver.engine.connect() as connection:
+        saved = dict(connection.execute(select(ModelCodeAlias.alias, ModelCodeAlias.model_code)).all())
+    assert saved == {"DBA-SCP100": "SCP100"}
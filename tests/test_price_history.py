@@ -0,0 +1,176 @@
+import pytest
+import statistics
+from datetime import date
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from src import estimate_value
+from src.db.models import (
+    SQLModel, ComponentPriceObservation, ComponentPriceAggregate, ComponentPriceMonthly, ComponentValue,
+)
+from src.db.price_history import record_price_observations, retract_source_observations, get_price_stats
+
+ITEM = "エンジン/ミッション"
+PRICE_TABLES = [
+    ComponentPriceObservation.__table__, ComponentPriceAggregate.__table__,
+    ComponentPriceMonthly.__table__, ComponentValue.__table__,
+]
+
+
+@pytest.fixture
+def db_engine():
+    test_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(test_engine, tables=PRICE_TABLES)
+    return test_engine
+
+
+def observation(price, observed_date, source_row, source_file="sales.xlsx", source_hash="hash-a", engine_model="2ZR"):
+    return {
+        "item_name": ITEM, "engine_model": engine_model, "details_tags": "standard",
+        "price": price, "observed_date": observed_date,
+        "source_file": source_file, "source_hash": source_hash, "source_row": source_row,
+    }
+
+
+def aggregate_row(connection, engine_model="2ZR"):
+    agg = ComponentPriceAggregate.__table__.c
+    return connection.execute(select(ComponentPriceAggregate.__table__).where(agg.engine_model == engine_model)).first()
+
+
+def monthly_rows(connection):
+    monthly = ComponentPriceMonthly.__table__.c
+    return {
+        row.month: (row.sample_size, row.price_sum)
+        for row in connection.execute(select(monthly.month, monthly.sample_size, monthly.price_sum))
+    }
+
+
+def market_value(connection, engine_model="2ZR"):
+    value = ComponentValue.__table__.c
+    return connection.execute(select(ComponentValue.__table__).where(value.engine_model == engine_model)).first()
+
+
+def test_record_adds_to_aggregate_and_monthly_incrementally(db_engine):
+    with db_engine.begin() as connection:
+        inserted, groups = record_price_observations(connection, [
+            observation(10000, date(2025, 5, 10), 0),
+            observation(20000, date(2025, 6, 1), 1),
+        ], import_id="run-1")
+    assert (inserted, groups) == (2, 1)
+
+    with db_engine.begin() as connection:
+        inserted, _ = record_price_observations(connection, [
+            observation(30000, date(2025, 6, 20), 0, source_file="sales_07.xlsx", source_hash="hash-b"),
+            observation(99999, date(2025, 4, 1), 1, source_file="sales_07.xlsx", source_hash="hash-b"),
+        ], import_id="run-2")
+        assert inserted == 2
+
+        row = aggregate_row(connection)
+        assert row.sample_size == 4
+        assert row.price_sum == 159999
+        assert row.price_sum_sq == 10000 ** 2 + 20000 ** 2 + 30000 ** 2 + 99999 ** 2
+        # 後から取り込んだ行でも、日付が古ければ最新の単価にはならない
+        assert (row.latest_date, row.latest_price) == (date(2025, 6, 20), 30000)
+        assert monthly_rows(connection) == {
+            "2025-04": (1, 99999), "2025-05": (1, 10000), "2025-06": (2, 50000),
+        }
+        assert market_value(connection).average_price == pytest.approx(159999 / 4)
+
+
+def test_same_content_under_another_name_is_not_counted_twice(db_engine):
+    records = [observation(10000, date(2025, 6, 1), 0), observation(20000, date(2025, 6, 2), 1)]
+    with db_engine.begin() as connection:
+        record_price_observations(connection, records, import_id="run-1")
+    with db_engine.begin() as connection:
+        renamed = [{**record, "source_file": "sales_copy.xlsx"} for record in records]
+        assert retract_source_observations(connection, "sales_copy.xlsx", "hash-a") == 0
+        assert record_price_observations(connection, renamed, import_id="run-2") == (0, 0)
+        assert aggregate_row(connection).sample_size == 2
+
+
+def test_edited_file_replaces_its_previous_observations(db_engine):
+    with db_engine.begin() as connection:
+        record_price_observations(connection, [
+            observation(10000, date(2025, 5, 1), 0),
+            observation(20000, date(2025, 6, 1), 1),
+            observation(50000, date(2025, 6, 1), 0, source_file="other.xlsx", source_hash="hash-o"),
+            observation(7000, date(2025, 6, 1), 2, engine_model="1NZ"),
+        ], import_id="run-1")
+
+    # 同じ名前のファイルを編集 (先頭に1行追加して行がずれた) して取り込み直す
+    edited = [
+        observation(15000, date(2025, 4, 1), 0, source_hash="hash-a2"),
+        observation(10000, date(2025, 5, 1), 1, source_hash="hash-a2"),
+        observation(20000, date(2025, 6, 1), 2, source_hash="hash-a2"),
+    ]
+    with db_engine.begin() as connection:
+        assert retract_source_observations(connection, "sales.xlsx", "hash-a2") == 3
+        record_price_observations(connection, edited, import_id="run-2")
+
+        row = aggregate_row(connection)
+        assert row.sample_size == 4
+        assert row.price_sum == 95000
+        assert (row.latest_date, row.latest_price) == (date(2025, 6, 1), 20000)
+        assert monthly_rows(connection) == {"2025-04": (1, 15000), "2025-05": (1, 10000), "2025-06": (2, 70000)}
+        assert market_value(connection).sample_size == 4
+        # 編集後のファイルに無くなった部品グループは、累計も市場価格も削除される
+        assert aggregate_row(connection, engine_model="1NZ") is None
+        assert market_value(connection, engine_model="1NZ") is None
+
+
+def test_get_price_stats_returns_overall_and_window_statistics(db_engine):
+    with db_engine.begin() as connection:
+        record_price_observations(connection, [
+            observation(10000, date(2024, 1, 15), 0),
+            observation(20000, date(2025, 5, 1), 1),
+            observation(30000, date(2025, 6, 30), 2),
+            # 基準日より後の月は直近の期間に含めない
+            observation(90000, date(2025, 7, 1), 3),
+        ], import_id="run-1")
+
+        stats = get_price_stats(connection, ITEM, "2ZR", months=2, as_of=date(2025, 6, 15))
+        assert stats["sample_size"] == 4
+        assert stats["mean"] == pytest.approx(37500)
+        assert stats["stddev"] == pytest.approx(statistics.pstdev([10000, 20000, 30000, 90000]))
+        assert (stats["latest_date"], stats["latest_price"]) == (date(2025, 7, 1), 90000)
+        assert stats["window_sample_size"] == 2
+        assert stats["window_mean"] == pytest.approx(25000)
+
+        empty_window = get_price_stats(connection, ITEM, "2ZR", months=1, as_of=date(2023, 1, 1))
+        assert (empty_window["window_sample_size"], empty_window["window_mean"]) == (0, None)
+        assert "window_mean" not in get_price_stats(connection, ITEM, "2ZR")
+        assert get_price_stats(connection, ITEM, "1NZ") is None
+
+
+def test_engine_price_uses_recent_window_when_enough_samples(db_engine, monkeypatch):
+    today = date.today()
+    old = date(today.year - 3, 1, 1)
+    with db_engine.begin() as connection:
+        record_price_observations(connection, [
+            observation(100000, old, 0), observation(100000, old, 1), observation(100000, old, 2),
+            observation(40000, today, 3), observation(50000, today, 4),
+        ], import_id="run-1")
+
+    session = Session(db_engine)
+    price_record = session.query(ComponentValue).filter_by(engine_model="2ZR").one()
+    assert price_record.average_price == pytest.approx(78000)
+
+    # 直近の件数が最小件数に満たなければ全期間の平均、満たせば直近の平均
+    monkeypatch.setattr(estimate_value, "COMPONENT_PRICE_WINDOW_MIN_SAMPLES", 3)
+    assert estimate_value.get_recent_market_price(session, price_record) == pytest.approx(78000)
+    monkeypatch.setattr(estimate_value, "COMPONENT_PRICE_WINDOW_MIN_SAMPLES", 2)
+    assert estimate_value.get_recent_market_price(session, price_record) == pytest.approx(45000)
+    session.close()
+
+
+def test_engine_price_falls_back_without_price_history_tables():
+    old_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(old_engine, tables=[ComponentValue.__table__])
+    session = Session(old_engine)
+    price_record = ComponentValue(
+        item_name=ITEM, engine_model="2ZR", latest_price=1, average_price=12345, sample_size=1,
+    )
+    session.add(price_record)
+    session.commit()
+    assert estimate_value.get_recent_market_price(session, price_record) == 12345
+    session.close()
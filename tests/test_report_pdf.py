@@ -0,0 +1,36 @@
+import pytest
+from src import config
+from src.api import report_pdf
+from src.api.report_pdf import build_report_row, layout_sections, render_sections
+
+pypdf = pytest.importorskip("pypdf")
+
+RESULT = {"auction_no": "1001", "model_code": "ZVW30", "breakdown": {"エンジン/ミッション": 40000}}
+
+
+@pytest.fixture
+def sections():
+    rows = [build_report_row({**RESULT, "auction_no": str(i)}, frozenset({"ZVW30"})) for i in range(120)]
+    return [({"auction_venue": "USS 東京"}, rows[:70]), ({"auction_venue": "USS 名古屋"}, rows[70:])]
+
+
+def page_texts(path):
+    return [page.extract_text() for page in pypdf.PdfReader(path).pages]
+
+
+def test_single_worker_does_not_start_a_pool():
+    assert report_pdf.start_render_pool(1) is None
+
+
+def test_pool_rendering_matches_serial_rendering(sections, tmp_path, monkeypatch):
+    serial = page_texts(render_sections(sections, str(tmp_path / "serial.pdf")))
+    assert len(serial) == len(layout_sections(sections))
+
+    monkeypatch.setattr(config, "REPORT_PARALLEL_MIN_PAGES", 2)
+    monkeypatch.setattr(config, "REPORT_PAGES_PER_CHUNK", 1)
+    assert report_pdf.start_render_pool(2) is not None
+    try:
+        parallel = page_texts(render_sections(sections, str(tmp_path / "parallel.pdf")))
+    finally:
+        report_pdf.shutdown_render_pool()
+    assert parallel == serial
@@ -0,0 +1,41 @@
+import csv
+import io
+from openpyxl import load_workbook
+from src.api.report_pdf import REPORT_HEADERS, PAST_PRICE_COLUMN, build_report_row
+from src.api.report_table import TABLE_HEADERS, iter_report_csv, write_report_xlsx
+
+RESULTS = [
+    {
+        "auction_no": "1001", "model_code": "ZVW30", "past_auction_price": 352500.0, "past_auction_sample_size": 12,
+        "breakdown": {"エンジン/ミッション": 40000, "プレス材 (鉄)": 10000},
+    },
+    {"auction_no": "1002", "model_code": "NZE141", "past_auction_price": None, "breakdown": {}},
+]
+TARGETS = frozenset({"ZVW30"})
+
+
+def test_csv_has_numeric_past_price_columns():
+    text = "".join(iter_report_csv(iter(RESULTS), TARGETS)).lstrip("﻿")
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert "過去相場" not in rows[0]
+    assert (rows[0]["過去相場 (中央値)"], rows[0]["過去相場 (件数)"]) == ("352500.0", "12")
+    assert (rows[1]["過去相場 (中央値)"], rows[1]["過去相場 (件数)"]) == ("", "")
+
+
+def test_xlsx_has_numeric_past_price_columns(tmp_path):
+    path = write_report_xlsx(iter(RESULTS), TARGETS, str(tmp_path / "report.xlsx"))
+    sheet = load_workbook(path).active
+    rows = list(sheet.iter_rows(values_only=True))
+    assert list(rows[0]) == TABLE_HEADERS
+    median_col = TABLE_HEADERS.index("過去相場 (中央値)")
+    assert rows[1][median_col:median_col + 2] == (352500, 12)
+    assert rows[2][median_col:median_col + 2] == (None, None)
+    assert sheet.cell(row=2, column=median_col + 1).number_format == "#,##0"
+
+
+def test_pdf_row_keeps_formatted_past_price():
+    cells, is_target = build_report_row(RESULTS[0], TARGETS)
+    assert "352,500 (12件)" in cells
+    assert is_target
+    cells, _ = build_report_row(RESULTS[1], TARGETS)
+    assert cells[[header for header, _ in REPORT_HEADERS].index(PAST_PRICE_COLUMN)] == "-"
@@ -0,0 +1,21 @@
+import pandas as pd
+from src.utils import normalize_series, normalize_text
+
+
+def test_normalize_series_matches_apply_for_object_values():
+    series = pd.Series(["ｔｏｙｏｔａ ", "ＺＶＷ３０", None, "ｔｏｙｏｔａ "])
+    assert normalize_series(series).tolist() == series.apply(normalize_text).tolist()
+
+
+def test_normalize_series_normalizes_categorical_text():
+    series = pd.Series(["ｔｏｙｏｔａ", "ＺＶＷ３０", "ｔｏｙｏｔａ", None], dtype="category")
+    result = normalize_series(series)
+    assert result.tolist()[:3] == ["TOYOTA", "ZVW30", "TOYOTA"]
+    assert pd.isna(result.iloc[3])
+
+
+def test_normalize_series_keeps_all_missing_column():
+    series = pd.Series([None, float("nan")], index=[3, 5], dtype=object)
+    result = normalize_series(series)
+    assert list(result.index) == [3, 5]
+    assert result.isna().all()
@@ -1,14 +1,19 @@
 import pandas as pd
 from pathlib import Path
+from sqlalchemy import select
 from src.db.database import SessionLocal
 from src.db.models import VehicleMaster
+from src.db.bulk import iter_batches, BULK_BATCH_SIZE
 
 # ★★★ インプットとなる更新用CSVファイルへのパス ★★★
 UPDATE_CSV_PATH = Path(__file__).parent / "data" / "input" / "update_weights.csv"
 
+VEHICLE_COLUMNS = set(VehicleMaster.__table__.columns.keys())
+
 def update_database_from_csv():
     """
     CSVファイルの内容に基づいて、データベースを一括更新する
+    対象IDと既存の型式を最初にまとめて読み込み、重複チェックはメモリ上で行う
     """
     print(f"'{UPDATE_CSV_PATH.name}' を使ってデータベースの一括更新を開始します...")
     session = SessionLocal()
@@ -19,44 +24,53 @@ def update_database_from_csv():
         if 'id' not in update_df.columns:
             print("エラー: CSVファイルに更新対象を特定するための'id'列がありません。")
             return
-            
+
+        # --- 1. 既存の ID と型式の対応を一度に読み込む ---
+        model_code_by_id = dict(session.execute(select(VehicleMaster.id, VehicleMaster.model_code)).all())
+        id_by_model_code = {model_code: vehicle_id for vehicle_id, model_code in model_code_by_id.items()}
+
         update_count = 0
         not_found_count = 0
         skipped_count = 0
+        mappings = {}
         
+        # --- 2. CSVの各行をメモリ上で検証し、更新内容を組み立てる ---
         for record in update_df.to_dict('records'):
             target_id = record.get('id')
             if not target_id: continue
 
-            vehicle = session.query(VehicleMaster).filter_by(id=target_id).first()
-            
-            if vehicle:
-                # --- ▼▼▼ ここからが新しい安全装置付きの更新ロジック ▼▼▼ ---
-                
-                # もしCSVにmodel_codeの更新指示があれば、重複チェックを行う
-                if 'model_code' in record and pd.notna(record['model_code']):
-                    new_model_code = record['model_code']
-                    # 変更先のmodel_codeが、自分以外のレコードで既に使われていないか確認
-                    exists = session.query(VehicleMaster).filter(
-                        VehicleMaster.model_code == new_model_code,
-                        VehicleMaster.id != target_id
-                    ).first()
-                    
-                    if exists:
-                        print(f"  - スキップ: ID={target_id} の型式を '{new_model_code}' に変更できません。(ID={exists.id} で既に使用中)")
-                        skipped_count += 1
-                        continue # この行の処理を中断して次に進む
-
-                # 安全チェックをパスしたら、CSVにある列の値を更新
-                for column, value in record.items():
-                    if column != 'id' and hasattr(vehicle, column) and pd.notna(value):
-                        setattr(vehicle, column, value)
-                update_count += 1
-                # --- ▲▲▲ ここまでが新しいロジック ▲▲▲ ---
-            else:
+            if pd.isna(target_id) or int(target_id) not in model_code_by_id:
                 print(f"  - 警告: ID={target_id} のレコードがデータベースに見つかりませんでした。")
                 not_found_count += 1
-                
+                continue
+            target_id = int(target_id)
+
+            # もしCSVにmodel_codeの更新指示があれば、重複チェックを行う
+            # (DB上の既存レコードに加え、CSV内で先に変更された型式とも突き合わせる)
+            if 'model_code' in record and pd.notna(record['model_code']):
+                new_model_code = record['model_code']
+                owner_id = id_by_model_code.get(new_model_code)
+                if owner_id is not None and owner_id != target_id:
+                    print(f"  - スキップ: ID={target_id} の型式を '{new_model_code}' に変更できません。(ID={owner_id} で既に使用中)")
+                    skipped_count += 1
+                    continue # この行の処理を中断して次に進む
+
+                old_model_code = model_code_by_id[target_id]
+                if id_by_model_code.get(old_model_code) == target_id:
+                    del id_by_model_code[old_model_code]
+                id_by_model_code[new_model_code] = target_id
+                model_code_by_id[target_id] = new_model_code
+
+            # 安全チェックをパスしたら、CSVにある列の値を更新対象にする (同じIDが複数行あれば後の行を優先)
+            mapping = mappings.setdefault(target_id, {'id': target_id})
+            for column, value in record.items():
+                if column != 'id' and column in VEHICLE_COLUMNS and pd.notna(value):
+                    mapping[column] = value
+            update_count += 1
+
+        # --- 3. まとめて一括更新する ---
+        for batch in iter_batches(list(mappings.values()), BULK_BATCH_SIZE):
+            session.bulk_update_mappings(VehicleMaster, batch)
         session.commit()
         
         print("\n--- 処理結果 ---")
@@ -74,4 +88,4 @@ def update_database_from_csv():
         session.close()
 
 if __name__ == "__main__":
-    update_database_from_csv()
\ No newline at end of file
+    update_database_from_csv()
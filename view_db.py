@@ -14,8 +14,10 @@ try:
         print("データベースにテーブルが見つかりません。")
     else:
         print("--- データベース内のテーブル一覧 ---")
-        for name in table_names:
-            print(f"- {name}")
+        with engine.connect() as connection:
+            for name in table_names:
+                row_count = connection.execute(text(f'SELECT COUNT(*) FROM "{name}"')).scalar()
+                print(f"- {name} ({row_count:,}件)")
         print("-------------------------------------\n")
 
         # 各テーブルの先頭5件を表示
@@ -25,7 +27,8 @@ try:
         for table_name in table_names:
             try:
                 print(f"--- テーブル名: {table_name} (先頭5件) ---")
-                df = pd.read_sql(f"SELECT * FROM {table_name} LIMIT 5", engine)
+                # 先頭5件だけをSQL側で取り出す (テーブル全体は読み込まない)
+                df = pd.read_sql(f'SELECT * FROM "{table_name}" LIMIT 5', engine)
                 print(df)
                 print("\n")
             except Exception as e: